@@ -0,0 +1,101 @@
+"""
+Benchmark: limite de ancho de banda global (--limit-rate) y prioridades.
+
+Descarga el mismo lote desde un servidor local sin limite propio: primero sin
+limitador, despues con un limite total y por ultimo con el mismo limite y
+algunas filas prioritarias al final del CSV. Comprueba que el total no supera
+el limite, que las prioritarias se adelantan al resto y que reciben mas ancho
+de banda que las normales mientras compiten con ellas.
+
+Uso:
+    python benchmarks/bench_ancho_banda.py [-n 12] [--limite 4M] [--prioritarias 3] [--concurrencia 4]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from fake_media import ServidorMedios, extractor_falso
+
+import descargar_audio
+
+
+def escribir_csv(ruta, num_urls, prioritarias):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write("url,priority\n")
+        for i in range(num_urls):
+            # Las prioritarias van al final: sin prioridades serian las ultimas en empezar
+            prioridad = 3 if i >= num_urls - prioritarias else ''
+            archivo.write(f"https://www.youtube.com/watch?v=band{i:07d},{prioridad}\n")
+
+
+def ejecutar_lote(servidor, args, limite, prioritarias):
+    resultados = []
+    with tempfile.TemporaryDirectory() as output_dir, extractor_falso(servidor):
+        csv_urls = os.path.join(output_dir, 'urls.csv')
+        escribir_csv(csv_urls, args.num_urls, prioritarias)
+        prioridades = {}
+        limitador = descargar_audio.LimitadorAncho(limite) if limite else None
+        politica = descargar_audio.PoliticaSalida('best', transcodificar=False)
+        inicio = time.perf_counter()
+
+        def al_terminar(trabajo):
+            resultados.append((trabajo.prioridad, time.perf_counter() - inicio, trabajo.velocidad_media or 0.0))
+
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            exitosos, _, _ = asyncio.run(descargar_audio.procesar_urls_async(
+                descargar_audio.iterar_urls_csv(csv_urls, prioridades), output_dir,
+                max_concurrent=args.concurrencia, politica=politica, limitador=limitador,
+                prioridades=prioridades, al_terminar=al_terminar,
+            ))
+        duracion = time.perf_counter() - inicio
+    return exitosos, duracion, resultados
+
+
+def media(valores, ancho, escala=1.0, sufijo=''):
+    """Celda de la tabla con la media de los valores ('-' si no hay ninguno)"""
+    if not valores:
+        return f"{'-':>{ancho}}"
+    return f"{statistics.mean(valores) / escala:>{ancho - len(sufijo)}.2f}{sufijo}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Limite de ancho de banda global y prioridades')
+    parser.add_argument('-n', '--num-urls', type=int, default=12)
+    parser.add_argument('--tamano-kb', type=int, default=2048, help='Tamano de cada archivo servido')
+    parser.add_argument('--limite', type=descargar_audio.parsear_tasa, default='4M',
+                        help='Limite total (--limit-rate)')
+    parser.add_argument('--prioritarias', type=int, default=3, help='Filas con prioridad 3 al final del CSV')
+    parser.add_argument('--concurrencia', type=int, default=4, help='Descargas simultaneas')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    configuraciones = [
+        ('sin limite', None, 0),
+        ('limite', args.limite, 0),
+        ('limite + prioridad', args.limite, args.prioritarias),
+    ]
+
+    print(f"Limite: {args.limite / 1e6:.2f} MB/s, {args.num_urls} URLs de {args.tamano_kb} KB, "
+          f"{args.concurrencia} simultaneas")
+    print(f"{'configuracion':<22}{'ok':>4}{'tiempo':>9}{'MB/s':>8}{'fin medio norm.':>17}{'fin medio prio.':>17}"
+          f"{'MB/s norm.':>12}{'MB/s prio.':>12}")
+    with ServidorMedios(tamano=args.tamano_kb * 1024) as servidor:
+        for nombre, limite, prioritarias in configuraciones:
+            exitosos, duracion, resultados = ejecutar_lote(servidor, args, limite, prioritarias)
+            normales = [r for r in resultados if not r[0]]
+            urgentes = [r for r in resultados if r[0]]
+            mb_s = exitosos * servidor.tamano / duracion / 1e6
+            print(f"{nombre:<22}{exitosos:>4}{duracion:>8.2f}s{mb_s:>8.2f}"
+                  f"{media([r[1] for r in normales], 17, sufijo='s')}{media([r[1] for r in urgentes], 17, sufijo='s')}"
+                  f"{media([r[2] for r in normales], 12, 1e6)}{media([r[2] for r in urgentes], 12, 1e6)}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
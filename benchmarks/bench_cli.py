@@ -0,0 +1,215 @@
+"""
+Benchmark de carga del CLI completo (descargar_audio.main) sin acceso a red.
+
+Para cada tamano de CSV (por defecto 10, 100 y 1000 filas) levanta un
+ServidorMedios local y ejecuta main() en un proceso hijo con el extractor
+falso, de modo que RSS, hilos y CPU miden solo al cliente (incluidos sus
+subprocesos de FFmpeg). Cada ejecucion se anade a un archivo JSON Lines y
+se compara con la ultima ejecucion del mismo escenario.
+
+Si FFmpeg esta disponible se sirve audio AAC real de '--segundos-audio'
+segundos; si no, bytes sinteticos de '--tamano-kb' y la conversion se
+sustituye por una copia.
+
+Uso:
+    python benchmarks/bench_cli.py [--filas 10 100 1000] [--latencia 0.05] [--ancho-banda 50]
+                                   [--limite 0] [--tasa-errores 0] [--etiqueta texto]
+                                   [-- opciones adicionales de descargar_audio.py]
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from fake_media import RAIZ_REPO, ServidorExterno, ServidorMedios, extractor_falso, generar_audio_sintetico
+
+import descargar_audio
+
+RESULTADOS_POR_DEFECTO = os.path.join(RAIZ_REPO, 'benchmarks', 'resultados', 'bench_cli.jsonl')
+
+
+def _rss_mb(quien):
+    """Pico de memoria residente en MB (ru_maxrss esta en KB en Linux y en bytes en macOS)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(quien).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def ejecutar_hijo(args, argumentos_cli):
+    """Proceso hijo: ejecuta main() contra el servidor del padre y mide el cliente"""
+    servidor = ServidorExterno(args.url_servidor, args.tamano)
+    hilos_max = [threading.active_count()]
+    parar = threading.Event()
+
+    def muestrear_hilos():
+        while not parar.wait(0.05):
+            hilos_max[0] = max(hilos_max[0], threading.active_count())
+
+    hilo = threading.Thread(target=muestrear_hilos, daemon=True)
+    hilo.start()
+    cpu_inicio = os.times()
+    inicio = time.perf_counter()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo), extractor_falso(servidor):
+        sys.argv = ['descargar_audio.py'] + argumentos_cli
+        codigo = descargar_audio.main()
+    duracion = time.perf_counter() - inicio
+    cpu_fin = os.times()
+    parar.set()
+
+    cpu = sum(cpu_fin[i] - cpu_inicio[i] for i in range(4))  # user, system y sus hijos (FFmpeg)
+    with open(args.resultado, 'w', encoding='utf-8') as f:
+        json.dump({
+            'codigo_salida': codigo,
+            'duracion_s': duracion,
+            'cpu_s': cpu,
+            'rss_pico_mb': _rss_mb(resource.RUSAGE_SELF) if resource else None,
+            'rss_hijos_mb': _rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            'hilos_max': hilos_max[0],
+        }, f)
+    return 0
+
+
+def commit_actual():
+    try:
+        proceso = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ_REPO,
+                                 capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return proceso.stdout.strip() or None
+
+
+def ultimo_registro(ruta, escenario):
+    """Ultima ejecucion guardada del mismo escenario (para comparar)"""
+    anterior = None
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    continue
+                if registro.get('escenario') == escenario:
+                    anterior = registro
+    return anterior
+
+
+def ejecutar_escenario(filas, args, audio, argumentos_extra):
+    escenario = {
+        'filas': filas,
+        'tamano_bytes': len(audio) if audio else args.tamano_kb * 1024,
+        'latencia_s': args.latencia,
+        'ancho_banda_mb_s': args.ancho_banda,
+        'limite_conexiones': args.limite,
+        'tasa_errores': args.tasa_errores,
+        'argumentos': argumentos_extra,
+    }
+    servidor = ServidorMedios(
+        tamano=args.tamano_kb * 1024, audio=audio, latencia=args.latencia,
+        ancho_banda=args.ancho_banda * 1e6 if args.ancho_banda else None,
+        max_simultaneas=args.limite or None, tasa_errores=args.tasa_errores, semilla=filas,
+    )
+    with servidor, tempfile.TemporaryDirectory() as tmp:
+        archivo_csv = os.path.join(tmp, 'urls.csv')
+        with open(archivo_csv, 'w', encoding='utf-8') as f:
+            f.write('URL\n')
+            for i in range(filas):
+                f.write(f"https://www.youtube.com/watch?v=c{filas % 10000:04d}{i:06d}\n")
+        resultado = os.path.join(tmp, 'resultado.json')
+        informe = os.path.join(tmp, 'informe.json')
+        comando = [
+            sys.executable, os.path.abspath(__file__), '--hijo', '--url-servidor', servidor.url_base,
+            '--tamano', str(servidor.tamano), '--resultado', resultado, '--',
+            archivo_csv, '-o', os.path.join(tmp, 'salida'), '--no-cache', '--report', informe,
+        ] + argumentos_extra
+        entorno = dict(os.environ, LOGS_DIR=tmp)
+        subprocess.run(comando, env=entorno, check=True, timeout=args.timeout)
+
+        with open(resultado, 'r', encoding='utf-8') as f:
+            medidas = json.load(f)
+        with open(informe, 'r', encoding='utf-8') as f:
+            resumen = json.load(f)['resumen']
+
+    duracion = medidas['duracion_s']
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_actual(),
+        'etiqueta': args.etiqueta,
+        'escenario': escenario,
+        'codigo_salida': medidas['codigo_salida'],
+        'exitosos': resumen['exitosos'],
+        'fallidos': resumen['fallidos'],
+        'duracion_s': round(duracion, 3),
+        'urls_por_s': round(resumen['exitosos'] / duracion, 3),
+        'mb_por_s': round(servidor.bytes_enviados / duracion / 1e6, 3),
+        'rss_pico_mb': medidas['rss_pico_mb'] and round(medidas['rss_pico_mb'], 1),
+        'rss_hijos_mb': medidas['rss_hijos_mb'] and round(medidas['rss_hijos_mb'], 1),
+        'hilos_max': medidas['hilos_max'],
+        'cpu_pct': round(medidas['cpu_s'] / duracion * 100, 1),
+        'rechazos_429': servidor.rechazos_429,
+        'errores_500': servidor.errores_500,
+        'versiones': resumen['versiones'],
+    }
+
+
+def main():
+    argumentos = sys.argv[1:]
+    argumentos_extra = []
+    if '--' in argumentos:
+        separador = argumentos.index('--')
+        argumentos, argumentos_extra = argumentos[:separador], argumentos[separador + 1:]
+
+    parser = argparse.ArgumentParser(description='Benchmark de carga del CLI con servidor y extractor locales')
+    parser.add_argument('--filas', type=int, nargs='+', default=[10, 100, 1000], help='Tamanos de CSV a probar')
+    parser.add_argument('--tamano-kb', type=int, default=256, help='Tamano de cada archivo sin FFmpeg')
+    parser.add_argument('--segundos-audio', type=int, default=5, help='Duracion del audio real con FFmpeg')
+    parser.add_argument('--latencia', type=float, default=0.05, help='Segundos antes de cada respuesta')
+    parser.add_argument('--ancho-banda', type=float, default=50, help='MB/s totales del servidor (0 = ilimitado)')
+    parser.add_argument('--limite', type=int, default=0, help='Conexiones simultaneas antes de responder 429 (0 = sin limite)')
+    parser.add_argument('--tasa-errores', type=float, default=0.0, help='Fraccion de peticiones que fallan con HTTP 500')
+    parser.add_argument('--timeout', type=float, default=1800, help='Segundos maximos por escenario')
+    parser.add_argument('--etiqueta', default=None, help='Texto libre para identificar la ejecucion')
+    parser.add_argument('--resultados', default=RESULTADOS_POR_DEFECTO, help='Archivo JSON Lines de resultados')
+    # Modo interno: proceso hijo que ejecuta main()
+    parser.add_argument('--hijo', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--url-servidor', help=argparse.SUPPRESS)
+    parser.add_argument('--tamano', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--resultado', help=argparse.SUPPRESS)
+    args = parser.parse_args(argumentos)
+
+    if args.hijo:
+        return ejecutar_hijo(args, argumentos_extra)
+
+    audio = generar_audio_sintetico(args.segundos_audio)
+    os.makedirs(os.path.dirname(os.path.abspath(args.resultados)), exist_ok=True)
+    print(f"{'filas':>6}{'ok':>6}{'fallos':>8}{'tiempo':>10}{'URLs/s':>9}{'MB/s':>8}{'RSS MB':>8}"
+          f"{'hilos':>7}{'CPU %':>7}{'vs. anterior':>14}")
+    for filas in args.filas:
+        registro = ejecutar_escenario(filas, args, audio, argumentos_extra)
+        anterior = ultimo_registro(args.resultados, registro['escenario'])
+        comparacion = ''
+        if anterior and anterior.get('duracion_s'):
+            cambio = (registro['duracion_s'] - anterior['duracion_s']) / anterior['duracion_s'] * 100
+            comparacion = f"{cambio:+.1f}% ({anterior.get('commit') or '?'})"
+        with open(args.resultados, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        print(f"{filas:>6}{registro['exitosos']:>6}{registro['fallidos']:>8}{registro['duracion_s']:>9.2f}s"
+              f"{registro['urls_por_s']:>9.1f}{registro['mb_por_s']:>8.2f}{registro['rss_pico_mb'] or 0:>8.0f}"
+              f"{registro['hilos_max']:>7}{registro['cpu_pct']:>7.0f}{comparacion:>14}")
+    print(f"\nResultados: {args.resultados}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
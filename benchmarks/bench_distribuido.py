@@ -0,0 +1,124 @@
+"""
+Benchmark: cola distribuida con varios trabajadores.
+
+Encola un lote en una cola SQLite y en una cola RESP (ServidorRESP, el
+sustituto local de Redis) y lo procesa con 1, 2 y 4 procesos 'worker'. Cada
+trabajador tiene su propio ServidorMedios con un ancho de banda limitado,
+como si fuera una maquina distinta con su propio enlace, de modo que el
+rendimiento deberia crecer con el numero de trabajadores. Con --matar se
+mata (SIGKILL) un trabajador a mitad del lote: sus URLs vuelven a la cola
+al caducar el arriendo y el lote termina igualmente.
+
+Uso:
+    python benchmarks/bench_distribuido.py [-n 120] [--trabajadores 1 2 4] [--ancho-banda 4]
+                                           [--backends sqlite resp] [--matar 3]
+"""
+import argparse
+import contextlib
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_media import ServidorMedios, ServidorRESP, extractor_falso, generar_audio_sintetico
+
+import descargar_audio
+
+
+def ejecutar_hijo(args):
+    """Proceso hijo: un trabajador con su propio servidor de medios (su 'enlace')"""
+    audio = None
+    if args.audio:
+        with open(args.audio, 'rb') as f:
+            audio = f.read()
+    servidor = ServidorMedios(tamano=args.tamano_kb * 1024, audio=audio, latencia=args.latencia,
+                              ancho_banda=args.ancho_banda * 1e6)
+    with servidor, open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo), extractor_falso(servidor):
+        sys.argv = ['descargar_audio.py', 'worker', '--queue', args.cola, '-o', args.salida, '--no-cache',
+                    '--lease', str(args.arriendo), '--worker-name', args.nombre]
+        return descargar_audio.main()
+
+
+@contextlib.contextmanager
+def abrir_destino(backend, tmp):
+    """URL de una cola vacia del backend indicado"""
+    if backend == 'sqlite':
+        yield f"sqlite:///{os.path.join(tmp, 'cola.db').lstrip('/')}"
+    else:
+        with ServidorRESP() as resp:
+            yield resp.url
+
+
+def ejecutar_escenario(backend, trabajadores, args, ruta_audio):
+    urls = [f"https://www.youtube.com/watch?v=d{backend[0]}{trabajadores:02d}{i:07d}" for i in range(args.num_urls)]
+    with tempfile.TemporaryDirectory() as tmp, abrir_destino(backend, tmp) as destino:
+        cola = descargar_audio.abrir_cola(destino)
+        cola.encolar(urls)
+        entorno = dict(os.environ, LOGS_DIR=tmp)
+        inicio = time.perf_counter()
+        hijos = []
+        for i in range(trabajadores):
+            comando = [
+                sys.executable, os.path.abspath(__file__), '--hijo', '--cola', destino,
+                '--salida', os.path.join(tmp, f'salida{i}'), '--nombre', f'w{i}', '--arriendo', str(args.arriendo),
+                '--tamano-kb', str(args.tamano_kb), '--latencia', str(args.latencia),
+                '--ancho-banda', str(args.ancho_banda),
+            ] + (['--audio', ruta_audio] if ruta_audio else [])
+            hijos.append(subprocess.Popen(comando, env=entorno))
+        caidos = 0
+        if args.matar and trabajadores > 1:
+            time.sleep(args.matar)
+            hijos[0].send_signal(signal.SIGKILL)
+            caidos = 1
+        for hijo in hijos:
+            hijo.wait(timeout=args.timeout)
+        duracion = time.perf_counter() - inicio
+        estado = cola.estado()
+        cola.cerrar()
+    tamano = os.path.getsize(ruta_audio) if ruta_audio else args.tamano_kb * 1024
+    print(f"{backend:<8}{trabajadores:>13}{caidos:>8}{estado['exitosos']:>6}{estado['fallidos']:>8}"
+          f"{estado['en_cola'] + estado['en_curso']:>11}{duracion:>9.2f}s{estado['exitosos'] / duracion:>9.1f}"
+          f"{estado['exitosos'] * tamano / duracion / 1e6:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento de la cola distribuida con 1..N trabajadores')
+    parser.add_argument('-n', '--num-urls', type=int, default=120)
+    parser.add_argument('--trabajadores', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--backends', nargs='+', choices=['sqlite', 'resp'], default=['sqlite', 'resp'])
+    parser.add_argument('--tamano-kb', type=int, default=512, help='Tamano de cada archivo sin FFmpeg')
+    parser.add_argument('--latencia', type=float, default=0.1, help='Segundos antes de cada respuesta')
+    parser.add_argument('--ancho-banda', type=float, default=4, help='MB/s del enlace de cada trabajador')
+    parser.add_argument('--arriendo', type=float, default=5, help='Segundos de arriendo (--lease)')
+    parser.add_argument('--matar', type=float, default=0, help='Matar un trabajador tras N segundos')
+    parser.add_argument('--timeout', type=float, default=600, help='Segundos maximos por escenario')
+    # Modo interno: proceso hijo que ejecuta un trabajador
+    parser.add_argument('--hijo', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--cola', help=argparse.SUPPRESS)
+    parser.add_argument('--salida', help=argparse.SUPPRESS)
+    parser.add_argument('--nombre', help=argparse.SUPPRESS)
+    parser.add_argument('--audio', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        return ejecutar_hijo(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_audio = None
+        audio = generar_audio_sintetico()
+        if audio:
+            ruta_audio = os.path.join(tmp, 'tono.m4a')
+            with open(ruta_audio, 'wb') as f:
+                f.write(audio)
+        print(f"{'backend':<8}{'trabajadores':>13}{'caidos':>8}{'ok':>6}{'fallos':>8}{'sin acabar':>11}"
+              f"{'tiempo':>10}{'URLs/s':>9}{'MB/s':>8}")
+        for backend in args.backends:
+            for trabajadores in args.trabajadores:
+                ejecutar_escenario(backend, trabajadores, args, ruta_audio)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+"""
+Benchmark: invocaciones del extractor por URL en descargar_audio_mp3.
+
+Compara la ruta actual de una sola pasada con la ruta anterior
+(extract_info + download) usando un extractor falso y un servidor local.
+
+Uso:
+    python benchmarks/bench_extracciones.py [-n 20]
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from fake_media import ServidorMedios, ContadorExtracciones, extractor_falso
+
+import yt_dlp
+import descargar_audio
+
+
+def descarga_doble_pasada(url, output_dir):
+    """Reproduce el flujo anterior: extract_info(download=False) + download()"""
+    opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': f'{output_dir}/%(title)s.%(ext)s',
+        'noplaylist': True,
+        'quiet': True,
+        'noprogress': True,
+    }
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.extract_info(url, download=False)
+        ydl.download([url])
+
+
+def medir(nombre, funcion, urls, servidor):
+    contador = ContadorExtracciones()
+    with tempfile.TemporaryDirectory() as output_dir, extractor_falso(servidor, contador):
+        inicio = time.perf_counter()
+        for url in urls:
+            funcion(url, output_dir)
+        duracion = time.perf_counter() - inicio
+    por_url = contador.total / len(urls)
+    print(f"{nombre:<22} extracciones={contador.total:<5} por URL={por_url:.2f}  tiempo={duracion:.2f}s")
+    return por_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cuenta extracciones por URL con un extractor falso')
+    parser.add_argument('-n', '--num-urls', type=int, default=10)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    urls = [f"https://www.youtube.com/watch?v=bench{i:06d}" for i in range(args.num_urls)]
+
+    with ServidorMedios() as servidor:
+        medir('doble pasada (antes)', descarga_doble_pasada, urls, servidor)
+        actual = medir(
+            'una pasada (actual)',
+            lambda url, out: descargar_audio.descargar_audio_mp3(url, out, show_animation=False),
+            urls, servidor,
+        )
+
+    return 0 if actual == 1 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
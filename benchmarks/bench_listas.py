@@ -0,0 +1,65 @@
+"""
+Benchmark: expansion de listas/canales grandes.
+
+Compara la extraccion plana completa (todas las paginas antes de devolver
+nada) con la expansion perezosa de expandir_listas, que entrega la primera
+URL en cuanto llega la primera pagina. Mide el tiempo hasta la primera URL,
+las paginas pedidas en ese momento y la memoria pico.
+
+Uso:
+    python benchmarks/bench_listas.py [-n 3000] [--latencia-pagina 0.2]
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+
+from fake_media import ServidorMedios, extractor_falso
+
+import yt_dlp
+import descargar_audio
+
+
+def expansion_completa(url):
+    """Extraccion plana clasica: devuelve la lista entera de una vez"""
+    opts = {'extract_flat': 'in_playlist', 'quiet': True, 'noprogress': True}
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        for entrada in info['entries']:
+            yield entrada['url']
+
+
+def medir(nombre, generador, contador):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    urls = iter(generador)
+    next(urls)
+    primera = time.perf_counter() - inicio
+    paginas_primera = contador.paginas
+    total = 1 + sum(1 for _ in urls)
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{nombre:<22}{primera:>12.2f}s{paginas_primera:>10}{total:>9}{duracion:>9.2f}s{pico / 1e6:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiempo hasta la primera URL al expandir una lista grande')
+    parser.add_argument('-n', '--num-videos', type=int, default=3000)
+    parser.add_argument('--latencia-pagina', type=float, default=0.2, help='Segundos por pagina de la lista')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    url = f'https://www.youtube.com/playlist?list=FAKE{args.num_videos}'
+
+    print(f"{'modo':<22}{'primera URL':>13}{'paginas':>10}{'videos':>9}{'total':>10}{'memoria MB':>11}")
+    with ServidorMedios() as servidor:
+        with extractor_falso(servidor, latencia_pagina=args.latencia_pagina) as contador:
+            medir('completa (eager)', expansion_completa(url), contador)
+        with extractor_falso(servidor, latencia_pagina=args.latencia_pagina) as contador:
+            medir('perezosa (actual)', descargar_audio.expandir_listas([url]), contador)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""
+Benchmark: descarga de secciones (columnas start/end del CSV, --start/--end).
+
+Sirve un audio sintetico largo desde un servidor local con ancho de banda
+limitado y descarga el mismo lote dos veces: el video completo y solo una
+seccion de cada uno. Compara tiempo, bytes servidos y duracion del audio
+resultante.
+
+Uso:
+    python benchmarks/bench_secciones.py [-n 6] [--segundos 180] [--inicio 90] [--fin 105] [--ancho-banda 4M]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import tempfile
+import time
+
+from fake_media import ServidorMedios, extractor_falso, generar_audio_sintetico
+
+import descargar_audio
+
+
+def ejecutar_lote(servidor, args, seccion):
+    with tempfile.TemporaryDirectory() as output_dir, extractor_falso(servidor):
+        urls = [f"https://www.youtube.com/watch?v=secc{i:07d}" for i in range(args.num_urls)]
+        if seccion:
+            urls = [descargar_audio.url_con_seccion(url, *seccion) for url in urls]
+        politica = descargar_audio.PoliticaSalida('best', transcodificar=False)
+        bytes_antes = servidor.bytes_enviados
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            exitosos, _, _ = asyncio.run(descargar_audio.procesar_urls_async(
+                iter(urls), output_dir, max_concurrent=args.concurrencia, politica=politica,
+            ))
+        duracion = time.perf_counter() - inicio
+        tamano_salida = sum(
+            entrada.stat().st_size for entrada in os.scandir(output_dir)
+            if entrada.is_file() and not entrada.name.startswith('.')
+        )
+    return exitosos, duracion, servidor.bytes_enviados - bytes_antes, tamano_salida
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Descarga de secciones frente al video completo')
+    parser.add_argument('-n', '--num-urls', type=int, default=6)
+    parser.add_argument('--segundos', type=int, default=180, help='Duracion del audio servido')
+    parser.add_argument('--inicio', type=float, default=90.0, help='Inicio de la seccion (s)')
+    parser.add_argument('--fin', type=float, default=105.0, help='Fin de la seccion (s)')
+    parser.add_argument('--ancho-banda', type=descargar_audio.parsear_tasa, default='4M',
+                        help='Ancho de banda total del servidor')
+    parser.add_argument('--concurrencia', type=int, default=2, help='Descargas simultaneas')
+    args = parser.parse_args()
+
+    audio = generar_audio_sintetico(args.segundos)
+    if audio is None:
+        print("FFmpeg no esta disponible: las secciones necesitan FFmpeg")
+        return 1
+
+    logging.getLogger().setLevel(logging.WARNING)
+    seccion = (args.inicio, args.fin)
+    configuraciones = [
+        ('completo', None),
+        (f"seccion {descargar_audio.etiqueta_seccion(seccion)}", seccion),
+    ]
+
+    print(f"{args.num_urls} URLs de {args.segundos}s ({len(audio) / 1e6:.2f} MB), "
+          f"servidor a {args.ancho_banda / 1e6:.2f} MB/s, {args.concurrencia} simultaneas")
+    print(f"{'configuracion':<22}{'ok':>4}{'tiempo':>9}{'MB servidos':>13}{'MB salida':>11}")
+    with ServidorMedios(audio=audio, ancho_banda=args.ancho_banda) as servidor:
+        for nombre, seccion in configuraciones:
+            exitosos, duracion, servidos, tamano_salida = ejecutar_lote(servidor, args, seccion)
+            print(f"{nombre:<22}{exitosos:>4}{duracion:>8.2f}s{servidos / 1e6:>13.2f}{tamano_salida / 1e6:>11.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+"""
+Benchmark: sesiones de yt-dlp reutilizadas frente a una instancia por URL.
+
+Descarga el mismo lote en secuencia creando un YoutubeDL nuevo por URL (el
+comportamiento anterior) y reutilizando la sesion del hilo a traves de un
+ContextoDescarga compartido. Mide el coste por URL y las conexiones TCP que
+acepta el servidor local (keep-alive requiere el handler 'requests' de yt-dlp).
+
+Uso:
+    python benchmarks/bench_sesiones.py [-n 100] [--latencia 0]
+"""
+import argparse
+import contextlib
+import io
+import logging
+import tempfile
+import time
+
+from fake_media import ServidorMedios, extractor_falso
+
+import descargar_audio
+from yt_dlp.networking.common import _REQUEST_HANDLERS
+
+
+def medir(nombre, urls, servidor, compartida):
+    politica = descargar_audio.PoliticaSalida('best', transcodificar=False)
+    conexiones_inicio = servidor.conexiones
+    with tempfile.TemporaryDirectory() as output_dir, extractor_falso(servidor):
+        contexto = descargar_audio.ContextoDescarga(output_dir, politica=politica) if compartida else None
+        inicio = time.perf_counter()
+        exitosos = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, url in enumerate(urls):
+                exitosos += bool(descargar_audio.descargar_audio_mp3(
+                    url, output_dir, f"B{i:03d}", show_animation=False, politica=politica, contexto=contexto,
+                ))
+        duracion = time.perf_counter() - inicio
+        sesiones = contexto.cerrar() if contexto else len(urls)
+    conexiones = servidor.conexiones - conexiones_inicio
+    print(f"{nombre:<24}{exitosos:>5}{duracion:>9.2f}s{duracion / len(urls) * 1000:>10.1f}{sesiones:>10}{conexiones:>12}")
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coste por URL con y sin reutilizar la sesion de yt-dlp')
+    parser.add_argument('-n', '--num-urls', type=int, default=100)
+    parser.add_argument('--tamano-kb', type=int, default=64, help='Tamano de cada archivo servido')
+    parser.add_argument('--latencia', type=float, default=0.0, help='Segundos antes de cada respuesta')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"[INFO] Handlers HTTP de yt-dlp: {', '.join(_REQUEST_HANDLERS)}")
+    if 'Requests' not in _REQUEST_HANDLERS:
+        print("[WARNING] Sin 'requests' instalado no hay keep-alive: pip install 'yt-dlp[default]'")
+
+    print(f"{'modo':<24}{'ok':>5}{'tiempo':>10}{'ms/URL':>10}{'sesiones':>10}{'conexiones':>12}")
+    with ServidorMedios(tamano=args.tamano_kb * 1024, latencia=args.latencia) as servidor:
+        # Calentamiento: importaciones y carga perezosa de extractores
+        medir('calentamiento', ["https://www.youtube.com/watch?v=warm0000000"], servidor, False)
+        urls = [f"https://www.youtube.com/watch?v=ses{i:08d}" for i in range(args.num_urls)]
+        antes = medir('una por URL (antes)', urls, servidor, False)
+        urls = [f"https://www.youtube.com/watch?v=reu{i:08d}" for i in range(args.num_urls)]
+        actual = medir('reutilizada (actual)', urls, servidor, True)
+    print(f"\nAhorro por URL: {(antes - actual) / args.num_urls * 1000:.1f} ms ({(1 - actual / antes) * 100:.0f}%)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,501 @@
+"""
+Infraestructura local para benchmarks sin acceso a red.
+
+Incluye un servidor HTTP que sirve audio sintetico y un extractor falso de
+yt-dlp que resuelve URLs de YouTube hacia ese servidor, contando cuantas
+veces se invoca la extraccion.
+"""
+import os
+import re
+import sys
+import random
+import shutil
+import tempfile
+import time
+import threading
+import contextlib
+import subprocess
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Permitir importar descargar_audio desde la raiz del repositorio
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_REPO not in sys.path:
+    sys.path.insert(0, RAIZ_REPO)
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import OnDemandPagedList
+
+import descargar_audio
+
+
+def generar_audio_sintetico(segundos=5):
+    """
+    Genera un tono AAC real con FFmpeg para que la etapa de conversion
+    trabaje con audio valido. Devuelve None si FFmpeg no esta disponible.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'tono.m4a')
+        subprocess.run(
+            [ffmpeg, '-y', '-nostdin', '-loglevel', 'error', '-f', 'lavfi',
+             '-i', f'sine=frequency=440:duration={segundos}', '-c:a', 'aac', '-b:a', '128k', ruta],
+            check=True,
+        )
+        with open(ruta, 'rb') as f:
+            return f.read()
+
+
+class ServidorMedios:
+    """
+    Servidor HTTP local que sirve archivos de audio sinteticos.
+
+    Puede simular latencia antes de la respuesta, un ancho de banda total
+    compartido por todas las conexiones, un limite de conexiones
+    simultaneas por encima del cual responde HTTP 429 y una fraccion de
+    peticiones que fallan con HTTP 500 (reproducible con 'semilla').
+    Habla HTTP/1.1 con keep-alive y cuenta las conexiones TCP aceptadas.
+    """
+
+    BLOQUE = 16 * 1024
+
+    def __init__(self, tamano=256 * 1024, audio=None, latencia=0.0, ancho_banda=None, max_simultaneas=None,
+                 tasa_errores=0.0, semilla=0):
+        # Si se proporciona audio real se sirve para todos los videos
+        self.audio = audio
+        self.tamano = len(audio) if audio else tamano
+        self.latencia = latencia
+        self.ancho_banda = ancho_banda
+        self.max_simultaneas = max_simultaneas
+        self.tasa_errores = tasa_errores
+        self._azar = random.Random(semilla)
+        self.peticiones = 0
+        self.conexiones = 0
+        self.rechazos_429 = 0
+        self.errores_500 = 0
+        self.bytes_enviados = 0
+        self.activas = 0
+        self.max_activas = 0
+        self._lock = threading.Lock()
+        self._siguiente_envio = 0.0
+        self._servidor = None
+        self._hilo = None
+
+    def _entrar(self):
+        """Registra una conexion; devuelve el codigo de error a responder o None si se atiende"""
+        with self._lock:
+            self.peticiones += 1
+            if self.tasa_errores and self._azar.random() < self.tasa_errores:
+                self.errores_500 += 1
+                return 500
+            if self.max_simultaneas is not None and self.activas >= self.max_simultaneas:
+                self.rechazos_429 += 1
+                return 429
+            self.activas += 1
+            self.max_activas = max(self.max_activas, self.activas)
+            return None
+
+    def _salir(self):
+        with self._lock:
+            self.activas -= 1
+
+    def _esperar_turno(self, num_bytes):
+        """Reparte el ancho de banda total entre todas las conexiones activas"""
+        if not self.ancho_banda:
+            return
+        with self._lock:
+            inicio = max(time.monotonic(), self._siguiente_envio)
+            self._siguiente_envio = inicio + num_bytes / self.ancho_banda
+        espera = inicio - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+    @property
+    def url_base(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def contenido(self, video_id):
+        """Bytes deterministas para un video (mismo ID -> mismo contenido)"""
+        if self.audio:
+            return self.audio
+        semilla = video_id.encode('utf-8') or b'x'
+        repeticiones = self.tamano // len(semilla) + 1
+        return (semilla * repeticiones)[:self.tamano]
+
+    def _crear_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive: los clientes con pool de conexiones reutilizan el socket
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with servidor._lock:
+                    servidor.conexiones += 1
+
+            def do_GET(self):
+                match = re.match(r'^/media/([\w-]+)\.\w+$', self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                error = servidor._entrar()
+                if error:
+                    self.send_error(error)
+                    return
+                try:
+                    if servidor.latencia:
+                        time.sleep(servidor.latencia)
+                    self._enviar(match.group(1))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    servidor._salir()
+
+            def _enviar(self, video_id):
+                datos = servidor.contenido(video_id)
+                inicio, fin = 0, len(datos) - 1
+                rango = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if rango:
+                    inicio = int(rango.group(1))
+                    if rango.group(2):
+                        fin = min(int(rango.group(2)), fin)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {inicio}-{fin}/{len(datos)}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'audio/mp4')
+                self.send_header('Content-Length', str(fin - inicio + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                for posicion in range(inicio, fin + 1, servidor.BLOQUE):
+                    bloque = datos[posicion:min(posicion + servidor.BLOQUE, fin + 1)]
+                    servidor._esperar_turno(len(bloque))
+                    self.wfile.write(bloque)
+                    with servidor._lock:
+                        servidor.bytes_enviados += len(bloque)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), self._crear_handler())
+        self._servidor.daemon_threads = True
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def stop(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class ServidorRESP:
+    """
+    Sustituto local de Redis para la cola distribuida: habla RESP2 e implementa
+    en memoria solo los comandos que usa ColaRESP (cadenas con caducidad,
+    hashes y sorted sets). Un unico lock: cada comando es atomico, como en Redis.
+    """
+
+    def __init__(self):
+        self.datos = {}
+        self.caducidad = {}  # clave -> time.monotonic() en que caduca
+        self.comandos = 0
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"redis://{host}:{puerto}/0"
+
+    def _valor(self, clave, tipo=None):
+        limite = self.caducidad.get(clave)
+        if limite is not None and limite <= time.monotonic():
+            del self.caducidad[clave]
+            self.datos.pop(clave, None)
+        if tipo is not None and clave not in self.datos:
+            self.datos[clave] = tipo()
+        return self.datos.get(clave)
+
+    def ejecutar(self, comando, *args):
+        comando = comando.upper()
+        with self._lock:
+            self.comandos += 1
+            if comando == 'PING':
+                return 'PONG'
+            if comando in ('SELECT', 'AUTH'):
+                return 'OK'
+            if comando == 'GET':
+                return self._valor(args[0])
+            if comando == 'SET':
+                opciones = [a.upper() for a in args[2:]]
+                if 'NX' in opciones and self._valor(args[0]) is not None:
+                    return None
+                self.datos[args[0]] = args[1]
+                self.caducidad.pop(args[0], None)
+                if 'PX' in opciones:
+                    self.caducidad[args[0]] = time.monotonic() + int(args[3 + opciones.index('PX')]) / 1000
+                return 'OK'
+            if comando == 'DEL':
+                borradas = [clave for clave in args if self._valor(clave) is not None]
+                for clave in borradas:
+                    del self.datos[clave]
+                    self.caducidad.pop(clave, None)
+                return len(borradas)
+            if comando == 'PEXPIRE':
+                if self._valor(args[0]) is None:
+                    return 0
+                self.caducidad[args[0]] = time.monotonic() + int(args[1]) / 1000
+                return 1
+            if comando in ('INCR', 'INCRBY'):
+                valor = int(self._valor(args[0]) or 0) + (int(args[1]) if comando == 'INCRBY' else 1)
+                self.datos[args[0]] = str(valor)
+                return valor
+            if comando == 'HSET':
+                h = self._valor(args[0], dict)
+                nuevas = sum(campo not in h for campo in args[1::2])
+                h.update(zip(args[1::2], args[2::2]))
+                return nuevas
+            if comando == 'HSETNX':
+                h = self._valor(args[0], dict)
+                if args[1] in h:
+                    return 0
+                h[args[1]] = args[2]
+                return 1
+            if comando == 'HGET':
+                return (self._valor(args[0]) or {}).get(args[1])
+            if comando == 'HMGET':
+                h = self._valor(args[0]) or {}
+                return [h.get(campo) for campo in args[1:]]
+            if comando == 'HGETALL':
+                return [x for par in (self._valor(args[0]) or {}).items() for x in par]
+            if comando == 'HEXISTS':
+                return int(args[1] in (self._valor(args[0]) or {}))
+            if comando == 'HLEN':
+                return len(self._valor(args[0]) or {})
+            if comando == 'HINCRBY':
+                h = self._valor(args[0], dict)
+                h[args[1]] = str(int(h.get(args[1], 0)) + int(args[2]))
+                return int(h[args[1]])
+            if comando == 'ZADD':
+                z = self._valor(args[0], dict)
+                nx = args[1].upper() == 'NX'
+                pares = args[2:] if nx else args[1:]
+                nuevos = 0
+                for puntuacion, miembro in zip(pares[::2], pares[1::2]):
+                    if miembro in z and nx:
+                        continue
+                    nuevos += miembro not in z
+                    z[miembro] = float(puntuacion)
+                return nuevos
+            if comando == 'ZREM':
+                z = self._valor(args[0]) or {}
+                return sum(z.pop(miembro, None) is not None for miembro in args[1:])
+            if comando == 'ZCARD':
+                return len(self._valor(args[0]) or {})
+            if comando == 'ZRANGE':
+                ordenados = sorted((self._valor(args[0]) or {}).items(), key=lambda par: (par[1], par[0]))
+                inicio, fin = int(args[1]), int(args[2])
+                return [miembro for miembro, _ in ordenados[inicio:None if fin == -1 else fin + 1]]
+            if comando == 'ZRANGEBYSCORE':
+                minimo = float('-inf') if args[1] == '-inf' else float(args[1])
+                maximo = float('inf') if args[2] == '+inf' else float(args[2])
+                return [miembro for miembro, puntuacion in sorted((self._valor(args[0]) or {}).items(),
+                                                                  key=lambda par: (par[1], par[0]))
+                        if minimo <= puntuacion <= maximo]
+            raise ValueError(f"ERR comando no soportado '{comando}'")
+
+    @staticmethod
+    def _codificar(valor):
+        if valor is None:
+            return b'$-1\r\n'
+        if isinstance(valor, Exception):
+            return f"-{valor}\r\n".encode('utf-8')
+        if isinstance(valor, int):
+            return b':%d\r\n' % valor
+        if isinstance(valor, list):
+            return b'*%d\r\n' % len(valor) + b''.join(ServidorRESP._codificar(v) for v in valor)
+        if valor in ('OK', 'PONG'):
+            return f"+{valor}\r\n".encode('utf-8')
+        dato = str(valor).encode('utf-8')
+        return b'$%d\r\n%s\r\n' % (len(dato), dato)
+
+    def _crear_handler(self):
+        servidor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    linea = self.rfile.readline()
+                    if not linea.startswith(b'*'):
+                        return
+                    args = []
+                    for _ in range(int(linea[1:])):
+                        longitud = int(self.rfile.readline()[1:])
+                        args.append(self.rfile.read(longitud + 2)[:-2].decode('utf-8'))
+                    try:
+                        respuesta = servidor.ejecutar(*args)
+                    except (ValueError, IndexError) as e:
+                        respuesta = ValueError(str(e) if str(e).startswith('ERR') else f"ERR {e}")
+                    self.wfile.write(servidor._codificar(respuesta))
+
+        return Handler
+
+    def start(self):
+        self._servidor = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._crear_handler())
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class ServidorExterno:
+    """Referencia a un ServidorMedios que corre en otro proceso (para el extractor falso)"""
+
+    def __init__(self, url_base, tamano):
+        self.url_base = url_base
+        self.tamano = tamano
+
+
+class ContadorExtracciones:
+    """Cuenta las invocaciones del extractor falso por video ID y las paginas de listas pedidas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_video = {}
+        self.paginas = 0
+
+    def registrar(self, video_id):
+        with self._lock:
+            self.por_video[video_id] = self.por_video.get(video_id, 0) + 1
+
+    def registrar_pagina(self):
+        with self._lock:
+            self.paginas += 1
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum(self.por_video.values())
+
+
+# Entradas por pagina de las listas falsas (YouTube sirve del orden de 100)
+TAMANO_PAGINA = 100
+
+
+def crear_extractor_lista_falso(contador, latencia_pagina=0.0):
+    """
+    Crea un InfoExtractor de listas: playlist?list=FAKE<N> es una lista de N
+    videos servida en paginas de TAMANO_PAGINA con 'latencia_pagina' segundos
+    por pagina, como las pestanas de un canal grande.
+    """
+
+    class FakeYoutubeTabIE(InfoExtractor):
+        IE_NAME = 'fakeyoutube:tab'
+        _VALID_URL = r'https?://(?:www\.)?youtube\.com/playlist\?list=(?P<id>FAKE(?P<total>\d+))'
+
+        def _real_extract(self, url):
+            lista_id, total = self._match_valid_url(url).group('id', 'total')
+            total = int(total)
+
+            def pagina(numero):
+                contador.registrar_pagina()
+                if latencia_pagina:
+                    time.sleep(latencia_pagina)
+                inicio = numero * TAMANO_PAGINA
+                for i in range(inicio, min(inicio + TAMANO_PAGINA, total)):
+                    video_id = f"list{i:07d}"
+                    yield self.url_result(f'https://www.youtube.com/watch?v={video_id}', 'FakeYoutube', video_id)
+
+            return self.playlist_result(OnDemandPagedList(pagina, TAMANO_PAGINA), lista_id, f'Lista {lista_id}')
+
+    return FakeYoutubeTabIE
+
+
+def crear_extractor_falso(servidor, contador):
+    """Crea un InfoExtractor que resuelve URLs de YouTube hacia el servidor local"""
+
+    class FakeYoutubeIE(InfoExtractor):
+        IE_NAME = 'fakeyoutube'
+        _VALID_URL = r'https?://(?:www\.)?(?:youtube\.com/(?:watch\?v=|shorts/)|youtu\.be/)(?P<id>[\w-]{11})'
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            contador.registrar(video_id)
+            return {
+                'id': video_id,
+                'title': f'Video de prueba {video_id}',
+                'duration': 180,
+                'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+                'formats': [{
+                    'format_id': '140',
+                    'url': f'{servidor.url_base}/media/{video_id}.m4a',
+                    'ext': 'm4a',
+                    'acodec': 'mp4a.40.2',
+                    'vcodec': 'none',
+                    'abr': 128,
+                    'filesize': servidor.tamano,
+                }],
+            }
+
+    return FakeYoutubeIE
+
+
+def _copiar_sin_ffmpeg(origen, destino, *args, **kwargs):
+    """Sustituto de la conversion cuando FFmpeg no esta instalado"""
+    shutil.copyfile(origen, destino)
+
+
+@contextlib.contextmanager
+def extractor_falso(servidor, contador=None, latencia_pagina=0.0):
+    """
+    Sustituye temporalmente yt_dlp.YoutubeDL por una subclase que registra los
+    extractores falsos (videos y listas) antes que los predeterminados. Si FFmpeg no esta
+    disponible la conversion se sustituye por una copia para que el
+    pipeline termine igualmente.
+    """
+    contador = contador or ContadorExtracciones()
+    extractores = [crear_extractor_falso(servidor, contador), crear_extractor_lista_falso(contador, latencia_pagina)]
+    original = yt_dlp.YoutubeDL
+    transcodificar_original = descargar_audio.transcodificar_audio
+
+    class YoutubeDLFalso(original):
+        def add_default_info_extractors(self):
+            for extractor in extractores:
+                self.add_info_extractor(extractor())
+            super().add_default_info_extractors()
+
+    yt_dlp.YoutubeDL = YoutubeDLFalso
+    if shutil.which('ffmpeg') is None:
+        descargar_audio.transcodificar_audio = _copiar_sin_ffmpeg
+    try:
+        yield contador
+    finally:
+        yt_dlp.YoutubeDL = original
+        descargar_audio.transcodificar_audio = transcodificar_original
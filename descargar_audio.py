@@ -1,16 +1,53 @@
-import yt_dlp
 import os
 import sys
 import argparse
 import csv
+import hashlib
+import json
+import re
+import shutil
+import errno
+import socket
+import sqlite3
+import subprocess
 from pathlib import Path
-import asyncio
+from urllib.parse import urlparse, parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
 import concurrent.futures
-from threading import Lock, Thread, Event
+import itertools
+import heapq
+import contextlib
+import importlib
+import threading
+import math
+import random
+from array import array
+from threading import Lock, Thread, Event, current_thread, main_thread
 import time
 import logging
+import logging.handlers
+import queue
+import atexit
+import signal
+from collections import deque
 from datetime import datetime
 
+class _ModuloPerezoso:
+    """Importa un modulo la primera vez que se accede a uno de sus atributos"""
+    
+    def __init__(self, nombre):
+        self._nombre = nombre
+        self._modulo = None
+    
+    def __getattr__(self, atributo):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        return getattr(self._modulo, atributo)
+
+# 'import yt_dlp' tarda del orden de 200 ms y asyncio (con ssl) unos 40 ms:
+# --help, --version y el cliente de 'serve' no los necesitan
+yt_dlp = _ModuloPerezoso('yt_dlp')
+asyncio = _ModuloPerezoso('asyncio')
+
 # Fix Windows console encoding issues
 def setup_console_encoding():
     """Configure console for Unicode output on Windows"""
@@ -63,13 +100,48 @@ def safe_print(*args, **kwargs):
 # Initialize console encoding
 setup_console_encoding()
 
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro como una linea JSON (para agregadores de logs)"""
+    
+    TRABAJO_RE = re.compile(r'^\[([\w-]+)\] ')
+    
+    def format(self, record):
+        mensaje = record.getMessage()
+        registro = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'thread': record.threadName,
+            'msg': mensaje,
+        }
+        # Los mensajes de cada descarga empiezan por su ID ([T01], [S03]...)
+        trabajo = self.TRABAJO_RE.match(mensaje)
+        if trabajo:
+            registro['job'] = trabajo.group(1)
+        if record.exc_info:
+            registro['exc'] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False)
+
 # Configure logging
-def setup_logging():
-    """Configure logging to file with timestamp"""
-    # Skip if logging is already configured
+def setup_logging(formato_json=False, max_bytes=0, copias=5):
+    """
+    Configure logging to file with timestamp.
+    
+    Los hilos de trabajo solo encolan cada registro (QueueHandler); un hilo
+    de fondo (QueueListener) los formatea y escribe al archivo, de modo que
+    las descargas nunca esperan a la E/S del log.
+    
+    :param formato_json: Escribir cada registro como una linea JSON
+    :param max_bytes: Tamano a partir del cual se rota el archivo (0 = sin rotacion)
+    :param copias: Numero de archivos rotados que se conservan
+    :return: Ruta del archivo de log o None si el logging ya estaba configurado
+    """
+    global log_listener
+    # Skip if logging is already configured (apart from our import-time console default)
     root_logger = logging.getLogger()
-    if root_logger.handlers:
+    if any(handler is not _handler_por_defecto for handler in root_logger.handlers):
         return None
+    if _handler_por_defecto in root_logger.handlers:
+        root_logger.removeHandler(_handler_por_defecto)
     
     logs_dir = os.environ.get('LOGS_DIR', '.')
     
@@ -78,14 +150,25 @@ def setup_logging():
     
     log_filename = os.path.join(logs_dir, 'youtube_downloader.log')
     
-    # Configure logging (mode='a' to append instead of truncate)
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_filename, mode='a', encoding='utf-8'),
-        ]
-    )
+    # Handler real (mode='a' to append instead of truncate), con rotacion opcional por tamano
+    if max_bytes:
+        handler = logging.handlers.RotatingFileHandler(
+            log_filename, mode='a', maxBytes=max_bytes, backupCount=copias, encoding='utf-8')
+    else:
+        handler = logging.FileHandler(log_filename, mode='a', encoding='utf-8')
+    if formato_json:
+        handler.setFormatter(FormateadorJSON())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    
+    # Los llamadores solo encolan; el listener escribe en segundo plano
+    cola = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(cola))
+    root_logger.setLevel(logging.INFO)
+    log_listener = logging.handlers.QueueListener(cola, handler, respect_handler_level=True)
+    log_listener.start()
+    # Vaciar la cola al salir para no perder los ultimos registros
+    atexit.register(log_listener.stop)
     
     # Log session start
     logging.info("="*50)
@@ -96,17 +179,25 @@ def setup_logging():
 
 # Initialize logging only when module is run directly (not imported)
 log_file = None
+log_listener = None
 
-# Always ensure basic logging is configured
+# Always ensure basic logging is configured (setup_logging lo sustituye por el archivo de log)
+_handler_por_defecto = None
 if not logging.getLogger().handlers:
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    _handler_por_defecto = logging.getLogger().handlers[0]
 
 # Thread-safe printing lock
 print_lock = Lock()
 
+# Panel de progreso activo; se borra antes de imprimir cualquier otro mensaje
+panel_progreso = None
+
 def thread_safe_print(*args, **kwargs):
     """Thread-safe version of safe_print"""
     with print_lock:
+        if panel_progreso is not None:
+            panel_progreso.borrar()
         safe_print(*args, **kwargs)
 
 def log_warning(message):
@@ -122,92 +213,734 @@ def log_error(message):
     logging.error(message)
     thread_safe_print(f"[ERROR] {message}")
 
-class ProgressAnimation:
-    """Animated progress indicator for console"""
+def formatear_duracion(segundos):
+    """Formatea segundos como H:MM:SS o M:SS"""
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}:{minutos:02d}:{segundos:02d}" if horas else f"{minutos}:{segundos:02d}"
+
+class PanelProgreso:
+    """
+    Renderizador unico del progreso de todas las descargas.
     
-    def __init__(self, message="Procesando"):
-        self.message = message
-        self.is_running = False
-        self.thread = None
+    Los progress hooks solo sustituyen su fila en una tabla compartida, sin
+    esperar a nadie; un unico hilo la dibuja a una frecuencia limitada. En
+    una terminal se redibuja una fila por descarga activa mas una linea de
+    totales (MB/s y ETA); si la salida no es una terminal (p.ej. logs de
+    Docker) se imprime una linea de resumen periodica.
+    """
+    
+    FRAMES = ['|', '/', '-', '\\']
+    MAX_FILAS = 10
+    
+    def __init__(self, intervalo=0.25, intervalo_sin_tty=10.0, salida=None, es_tty=None):
+        self.salida = salida or sys.stdout
+        if es_tty is None:
+            es_tty = hasattr(self.salida, 'isatty') and self.salida.isatty()
+        self.es_tty = es_tty
+        self.intervalo = intervalo if es_tty else intervalo_sin_tty
+        self.filas = {}
+        self.completados = 0
+        self.fallidos = 0
+        self.limitador = None  # LimitadorAncho cuyo estado se muestra en la linea de totales
+        self._contadores_lock = Lock()
+        self._lineas_dibujadas = 0
+        self._frame = 0
         self.stop_event = Event()
-        self.frames = ['|', '/', '-', '\\']
-        self.current_frame = 0
-        
+        self.thread = None
+        if es_tty and sys.platform.startswith('win'):
+            # Activa las secuencias ANSI en la consola clasica de Windows 10+
+            os.system('')
+    
+    def actualizar(self, url_id, estado, descargados=None, total=None, velocidad=None):
+        """Sustituye la fila de una descarga (asignacion atomica, sin locks)"""
+        self.filas[url_id] = (estado, descargados, total, velocidad)
+    
+    def terminar(self, url_id, exito=None):
+        """Retira la fila de una descarga; exito=None si se cancelo"""
+        self.filas.pop(url_id, None)
+        if exito is None:
+            return
+        with self._contadores_lock:
+            if exito:
+                self.completados += 1
+            else:
+                self.fallidos += 1
+    
+    def _totales(self, filas):
+        """Velocidad agregada (bytes/s) y ETA de las descargas activas"""
+        velocidad = sum(fila[3] or 0 for fila in filas)
+        pendiente = sum(fila[2] - fila[1] for fila in filas if fila[1] is not None and fila[2])
+        eta = pendiente / velocidad if velocidad else None
+        return velocidad, eta
+    
+    def _linea_resumen(self, filas):
+        velocidad, eta = self._totales(filas)
+        linea = (f"{len(filas)} en curso, {self.completados} completadas, {self.fallidos} fallidas, "
+                 f"{velocidad / 1e6:.2f} MB/s")
+        if eta is not None:
+            linea += f", ETA {formatear_duracion(eta)}"
+        if self.limitador is not None:
+            linea += f", {self.limitador.describir()}"
+        return linea
+    
+    def _linea_descarga(self, url_id, fila, frame):
+        estado, descargados, total, velocidad = fila
+        linea = f"{frame} [{url_id}] {estado}"
+        if descargados is not None:
+            if total:
+                linea += f" {descargados / total * 100:5.1f}% de {total / 1e6:.1f} MB"
+            else:
+                linea += f" {descargados / 1e6:.1f} MB"
+        if velocidad:
+            linea += f" a {velocidad / 1e6:.2f} MB/s"
+        return linea
+    
+    def borrar(self):
+        """Borra el panel de la terminal (llamar con print_lock adquirido)"""
+        if self._lineas_dibujadas:
+            # Subir al inicio del panel y borrar hasta el final de la pantalla
+            self.salida.write(f"\x1b[{self._lineas_dibujadas}F\x1b[J")
+            self.salida.flush()
+            self._lineas_dibujadas = 0
+    
+    def _dibujar(self):
+        """Redibuja el panel completo en la terminal"""
+        filas = list(self.filas.items())
+        frame = self.FRAMES[self._frame]
+        self._frame = (self._frame + 1) % len(self.FRAMES)
+        lineas = [self._linea_descarga(url_id, fila, frame) for url_id, fila in filas[:self.MAX_FILAS]]
+        if len(filas) > self.MAX_FILAS:
+            lineas.append(f"  ... y {len(filas) - self.MAX_FILAS} mas")
+        if lineas:
+            lineas.append(f"[STATS] {self._linea_resumen([fila for _, fila in filas])}")
+        with print_lock:
+            self.borrar()
+            if lineas:
+                self.salida.write('\n'.join(lineas) + '\n')
+                self.salida.flush()
+                self._lineas_dibujadas = len(lineas)
+    
     def _animate(self):
-        """Run the animation in a separate thread"""
-        while not self.stop_event.is_set():
-            with print_lock:
-                frame = self.frames[self.current_frame]
-                print(f"\r{frame} {self.message}...", end='', flush=True)
-                self.current_frame = (self.current_frame + 1) % len(self.frames)
-            time.sleep(0.2)
+        """Bucle del hilo renderizador"""
+        while not self.stop_event.wait(self.intervalo):
+            try:
+                if self.es_tty:
+                    self._dibujar()
+                elif self.filas:
+                    filas = list(self.filas.values())
+                    thread_safe_print(f"[PROCESS] {self._linea_resumen(filas)}")
+            except (OSError, ValueError):
+                # Salida cerrada o no disponible: dejar de dibujar
+                return
     
     def start(self):
-        """Start the animation"""
-        if not self.is_running:
-            self.is_running = True
+        """Inicia el hilo renderizador y lo registra como panel activo"""
+        global panel_progreso
+        if self.thread is None:
+            panel_progreso = self
             self.stop_event.clear()
-            self.thread = Thread(target=self._animate, daemon=True)
+            self.thread = Thread(target=self._animate, name='progreso', daemon=True)
             self.thread.start()
+        return self
     
     def stop(self):
-        """Stop the animation"""
-        if self.is_running:
+        """Detiene el hilo renderizador y borra el panel"""
+        global panel_progreso
+        if self.thread is not None:
             self.stop_event.set()
-            self.is_running = False
-            if self.thread:
-                self.thread.join(timeout=1)
+            self.thread.join(timeout=1)
+            self.thread = None
             with print_lock:
-                print("\r" + " " * (len(self.message) + 10) + "\r", end='', flush=True)
+                self.borrar()
+            if panel_progreso is self:
+                panel_progreso = None
+
+# Patron para extraer el ID de video de las variantes de URL de YouTube
+YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([\w-]{11})'
+)
+
+def extraer_video_id(url):
+    """
+    Obtiene el ID de video de una URL de YouTube sin acceder a la red.
     
-    def update_message(self, new_message):
-        """Update the animation message"""
-        self.message = new_message
+    :param url: URL del video
+    :return: ID de 11 caracteres o None si la URL no es reconocible
+    """
+    match = YOUTUBE_ID_RE.search(url or '')
+    return match.group(1) if match else None
 
-def leer_urls_csv(archivo_csv):
+# Parametros de seguimiento publicitario (ademas de utm_*): se quitan en cualquier sitio
+PARAMETROS_SEGUIMIENTO = {'fbclid', 'gclid', 'dclid', 'msclkid'}
+# Parametros que en YouTube no cambian el contenido (marca de tiempo, origen...); en otros
+# sitios los mismos nombres pueden elegir otro recurso, asi que solo se quitan en YouTube
+PARAMETROS_IGNORADOS_YOUTUBE = {'si', 'feature', 'pp', 't', 'ab_channel', 'app', 'ref'}
+
+def es_host_youtube(host):
+    """Indica si un host (sin puerto) es de YouTube"""
+    host = host.lower()
+    return host == 'youtu.be' or any(host == dominio or host.endswith('.' + dominio)
+                                     for dominio in ('youtube.com', 'youtube-nocookie.com'))
+
+# Seccion pedida de un video, como fragmento propio de la URL: #seccion=inicio,fin (segundos).
+# No se usa '#t=' porque los enlaces compartidos de YouTube ya lo llevan (empezar a reproducir ahi)
+SECCION_RE = re.compile(r'#seccion=(\d+(?:\.\d+)?)?(?:,(\d+(?:\.\d+)?))?$')
+
+def parsear_tiempo(texto):
     """
-    Lee URLs desde un archivo CSV.
+    Convierte un instante como '90', '90.5', '1:30' o '1:02:03' a segundos.
     
-    :param archivo_csv: Ruta al archivo CSV
-    :return: Lista de URLs válidas
+    :raises ValueError: Si el texto no es un instante valido
+    """
+    partes = texto.strip().split(':')
+    if len(partes) > 3 or not all(re.fullmatch(r'\d+(?:\.\d+)?', parte) for parte in partes):
+        raise ValueError(f"instante invalido: '{texto}' (ejemplos: 90, 1:30, 1:02:03)")
+    segundos = 0.0
+    for parte in partes:
+        segundos = segundos * 60 + float(parte)
+    return segundos
+
+def _segundos_en_url(segundos):
+    return f"{segundos:f}".rstrip('0').rstrip('.')
+
+def seccion_de_url(url):
     """
-    urls = []
+    Seccion pedida en una URL (ver url_con_seccion).
     
-    try:
-        with open(archivo_csv, 'r', encoding='utf-8', newline='') as file:
-            # Leer todo el contenido y analizar
-            content = file.read().strip()
-            file.seek(0)
-            
-            # Detectar si es probable que tenga encabezados
-            lines = content.split('\n')
-            has_header = False
+    :return: Tupla (inicio, fin) en segundos (fin None = hasta el final) o None para el video completo
+    """
+    coincidencia = SECCION_RE.search(url or '')
+    if not coincidencia or not any(coincidencia.groups()):
+        return None
+    inicio, fin = coincidencia.groups()
+    return float(inicio or 0), float(fin) if fin else None
+
+def url_sin_seccion(url):
+    """URL sin el fragmento de seccion, tal como se le pasa a yt-dlp"""
+    return SECCION_RE.sub('', url)
+
+def url_con_seccion(url, inicio=0.0, fin=None):
+    """
+    Anade a una URL la seccion a descargar como fragmento '#seccion=inicio,fin'.
+    
+    La seccion viaja con la URL por todo el pipeline (deduplicacion, diario,
+    cola distribuida), asi que dos secciones del mismo video son trabajos distintos.
+    
+    :param url: URL del video (sin seccion)
+    :param inicio: Segundo inicial
+    :param fin: Segundo final o None para llegar al final del video
+    :return: URL con la seccion, o la misma URL si la seccion es el video completo
+    """
+    if not inicio and fin is None:
+        return url
+    return (f"{url}#seccion={_segundos_en_url(inicio) if inicio else ''}"
+            f"{f',{_segundos_en_url(fin)}' if fin is not None else ''}")
+
+def etiqueta_seccion(seccion):
+    """Seccion para nombres de archivo, sin ':' (no vale en Windows): (90, 165) -> '1m30s-2m45s'"""
+    def instante(segundos):
+        horas, resto = divmod(int(segundos), 3600)
+        minutos, segundos = divmod(resto, 60)
+        if horas:
+            return f"{horas}h{minutos:02d}m{segundos:02d}s"
+        return f"{minutos}m{segundos:02d}s" if minutos else f"{segundos}s"
+    inicio, fin = seccion
+    return f"{instante(inicio)}-{instante(fin) if fin is not None else 'fin'}"
+
+def normalizar_url(url):
+    """
+    Forma canonica de una URL para detectar duplicados.
+    
+    Los videos de YouTube (watch?v=, youtu.be/, /shorts/, /embed/, con &t= o
+    parametros de seguimiento) se reducen a https://www.youtube.com/watch?v=ID.
+    Para el resto se normalizan esquema y host y se quitan el fragmento y los
+    parametros de seguimiento (utm_*, fbclid...); los propios de YouTube
+    (si, t, feature...) solo en URLs de YouTube, como las de listas. La
+    seccion pedida (ver url_con_seccion) se conserva.
+    
+    :param url: URL tal como aparece en el CSV
+    :return: URL canonica
+    """
+    url = url.strip()
+    seccion = seccion_de_url(url)
+    video_id = extraer_video_id(url)
+    if video_id:
+        canonica = f"https://www.youtube.com/watch?v={video_id}"
+    else:
+        partes = urlsplit(url)
+        ignorados = PARAMETROS_SEGUIMIENTO
+        if es_host_youtube(partes.hostname or ''):
+            ignorados = PARAMETROS_SEGUIMIENTO | PARAMETROS_IGNORADOS_YOUTUBE
+        consulta = [(clave, valor) for clave, valor in parse_qsl(partes.query, keep_blank_values=True)
+                    if clave.lower() not in ignorados and not clave.lower().startswith('utm_')]
+        # Solo el host es insensible a mayusculas: usuario y puerto se conservan
+        usuario, arroba, servidor = partes.netloc.rpartition('@')
+        canonica = urlunsplit((partes.scheme.lower(), usuario + arroba + servidor.lower(), partes.path or '/',
+                               urlencode(consulta), ''))
+    return url_con_seccion(canonica, *seccion) if seccion else canonica
+
+def clave_video(url):
+    """Clave de deduplicacion: ID de YouTube (mas la seccion, si la hay) o, si no lo hay, la URL canonica"""
+    video_id = extraer_video_id(url)
+    if not video_id:
+        return normalizar_url(url)
+    seccion = seccion_de_url(url)
+    return url_con_seccion(video_id, *seccion) if seccion else video_id
+
+def expiracion_urls_stream(info):
+    """
+    Calcula cuando caducan las URLs de stream de un info dict.
+    
+    YouTube firma las URLs de googlevideo con un parametro 'expire' (epoch).
+    
+    :param info: Info dict extraido por yt-dlp
+    :return: Epoch de la primera expiracion o None si no se conoce
+    """
+    expiraciones = []
+    for formato in info.get('formats') or []:
+        valores = parse_qs(urlparse(formato.get('url') or '').query).get('expire')
+        if valores and valores[0].isdigit():
+            expiraciones.append(int(valores[0]))
+    return min(expiraciones) if expiraciones else None
+
+class CacheMetadatos:
+    """Cache persistente (SQLite) de info dicts por ID de video, con TTL y expulsion LRU"""
+    
+    # Campos voluminosos que no se necesitan para descargar el audio
+    CAMPOS_EXCLUIDOS = ('automatic_captions', 'subtitles', 'thumbnails', 'heatmap')
+    # Margen de seguridad antes de que caduquen las URLs de stream (segundos)
+    MARGEN_EXPIRACION = 300
+    
+    def __init__(self, directorio, ttl=6 * 3600, max_entradas=5000):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = Lock()
+        
+        Path(directorio).mkdir(parents=True, exist_ok=True)
+        self.ruta = os.path.join(directorio, 'metadatos.sqlite3')
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entradas ('
+            'video_id TEXT PRIMARY KEY, info TEXT NOT NULL, '
+            'expira REAL NOT NULL, ultimo_acceso REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_acceso ON entradas (ultimo_acceso)')
+    
+    def obtener(self, video_id):
+        """Devuelve el info dict cacheado o None si no existe o ha caducado"""
+        ahora = time.time()
+        with self._lock:
+            fila = self._conn.execute(
+                'SELECT info, expira FROM entradas WHERE video_id = ?', (video_id,)
+            ).fetchone()
+            if fila is None or fila[1] <= ahora:
+                if fila is not None:
+                    self._conn.execute('DELETE FROM entradas WHERE video_id = ?', (video_id,))
+                self.fallos += 1
+                return None
+            self._conn.execute(
+                'UPDATE entradas SET ultimo_acceso = ? WHERE video_id = ?', (ahora, video_id)
+            )
+            self.aciertos += 1
+        return json.loads(fila[0])
+    
+    def guardar(self, video_id, info):
+        """Guarda un info dict ya saneado (serializable a JSON)"""
+        ahora = time.time()
+        expira = ahora + self.ttl
+        expiracion_stream = expiracion_urls_stream(info)
+        if expiracion_stream is not None:
+            expira = min(expira, expiracion_stream - self.MARGEN_EXPIRACION)
+        if expira <= ahora:
+            return
+        
+        datos = {k: v for k, v in info.items() if k not in self.CAMPOS_EXCLUIDOS}
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?)',
+                (video_id, json.dumps(datos, ensure_ascii=False), expira, ahora)
+            )
+            # Expulsar las entradas menos usadas recientemente por encima del limite
+            self._conn.execute(
+                'DELETE FROM entradas WHERE video_id IN ('
+                'SELECT video_id FROM entradas ORDER BY ultimo_acceso DESC LIMIT -1 OFFSET ?)',
+                (self.max_entradas,)
+            )
+    
+    def invalidar(self, video_id):
+        """Elimina una entrada (p. ej. si sus URLs de stream ya no son validas)"""
+        with self._lock:
+            self._conn.execute('DELETE FROM entradas WHERE video_id = ?', (video_id,))
+    
+    def cerrar(self):
+        """Cierra la conexion a la base de datos"""
+        with self._lock:
+            self._conn.close()
+
+def calcular_checksum(ruta, bloque=1024 * 1024):
+    """Calcula el SHA-256 de un archivo leyendolo por bloques"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for datos in iter(lambda: f.read(bloque), b''):
+            sha.update(datos)
+    return sha.hexdigest()
+
+class IndiceDescargas:
+    """Indice de descargas completadas (JSON Lines) guardado en el directorio de salida"""
+    
+    NOMBRE_ARCHIVO = '.descargas_completadas.jsonl'
+    
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.ruta = os.path.join(output_dir, self.NOMBRE_ARCHIVO)
+        self.entradas = {}
+        self.propietarios = {}  # Ruta relativa -> video que la ocupa
+        self._lock = Lock()
+        self._cargar()
+    
+    def _cargar(self):
+        """Carga el indice; la ultima linea de cada video prevalece"""
+        if not os.path.exists(self.ruta):
+            return
+        lineas = 0
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                lineas += 1
+                try:
+                    entrada = json.loads(linea)
+                    self.entradas[entrada['video_id']] = entrada
+                    self.propietarios[os.path.normcase(entrada['ruta'])] = entrada['video_id']
+                except (ValueError, KeyError):
+                    log_warning(f"Linea corrupta en el indice de descargas ignorada: {linea.strip()[:80]}")
+        # Compactar si hay muchas entradas obsoletas acumuladas
+        if lineas > 2 * len(self.entradas) + 100:
+            self._compactar()
+    
+    def _compactar(self):
+        temporal = self.ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for entrada in self.entradas.values():
+                f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+        os.replace(temporal, self.ruta)
+    
+    def registrar(self, video_id, ruta_archivo, duracion=None):
+        """
+        Registra una descarga completada calculando tamano y checksum.
+        
+        :param video_id: Clave del video (ID normalizado o URL)
+        :param ruta_archivo: Ruta del archivo final
+        :param duracion: Duracion del audio en segundos
+        """
+        stat = os.stat(ruta_archivo)
+        entrada = {
+            'video_id': video_id,
+            'ruta': os.path.relpath(ruta_archivo, self.output_dir),
+            'tamano': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'duracion': duracion,
+            'sha256': calcular_checksum(ruta_archivo),
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self.entradas[video_id] = entrada
+            self.propietarios[os.path.normcase(entrada['ruta'])] = video_id
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+    
+    def propietario(self, ruta_archivo):
+        """Video registrado con esa ruta de salida (o None si no consta)"""
+        return self.propietarios.get(os.path.normcase(os.path.relpath(ruta_archivo, self.output_dir)))
+    
+    def verificar(self, video_id, checksum_completo=False):
+        """
+        Comprueba si un video ya esta descargado y su archivo sigue intacto.
+        
+        Si el tamano y la fecha de modificacion coinciden se confia en el
+        archivo; solo se recalcula el checksum si la fecha cambio o si se pide
+        una verificacion completa.
+        
+        :param video_id: Clave del video
+        :param checksum_completo: Recalcular siempre el checksum
+        :return: Ruta del archivo existente o None si hay que descargarlo
+        """
+        entrada = self.entradas.get(video_id)
+        if not entrada:
+            return None
+        ruta_archivo = os.path.join(self.output_dir, entrada['ruta'])
+        try:
+            stat = os.stat(ruta_archivo)
+        except OSError:
+            return None
+        if stat.st_size != entrada['tamano']:
+            return None
+        if checksum_completo or stat.st_mtime_ns != entrada.get('mtime_ns'):
+            try:
+                if calcular_checksum(ruta_archivo) != entrada['sha256']:
+                    return None
+            except OSError:
+                return None
+        return ruta_archivo
+
+class DiarioLote:
+    """
+    Diario append-only (JSON Lines) con el estado de cada URL del lote.
+    
+    Las escrituras se agrupan y se sincronizan a disco (fsync) por lotes,
+    cada cierto numero de registros o de segundos, para sobrevivir a una
+    caida del proceso sin pagar un fsync por cada cambio de estado.
+    """
+    
+    NOMBRE_ARCHIVO = '.diario_lote.jsonl'
+    ESTADOS = ('queued', 'extracting', 'downloading', 'converting', 'done', 'failed')
+    
+    def __init__(self, ruta, reanudar=False, registros_por_lote=50, intervalo=1.0):
+        self.ruta = ruta
+        self.registros_por_lote = registros_por_lote
+        self.intervalo = intervalo
+        self.estados = self._cargar() if reanudar else {}
+        self._pendientes = []
+        self._lock = Lock()
+        self._parar = Event()
+        
+        Path(os.path.dirname(ruta) or '.').mkdir(parents=True, exist_ok=True)
+        self._archivo = open(ruta, 'a' if reanudar else 'w', encoding='utf-8')
+        self._hilo = Thread(target=self._sincronizar_periodicamente, daemon=True)
+        self._hilo.start()
+    
+    def _cargar(self):
+        """Lee el diario existente; el ultimo estado de cada URL prevalece"""
+        estados = {}
+        if not os.path.exists(self.ruta):
+            return estados
+        linea = b'\n'
+        with open(self.ruta, 'rb') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                    estados[registro['url']] = registro['estado']
+                except (ValueError, KeyError):
+                    # Una linea truncada al final indica una caida durante la escritura
+                    continue
+            tamano = f.tell()
+        if not linea.endswith(b'\n'):
+            # Descartar la linea a medias: si no, el siguiente registro se pegaria a ella
+            os.truncate(self.ruta, tamano - len(linea))
+        return estados
+    
+    def marcar(self, url, estado, **extra):
+        """Registra un cambio de estado de una URL"""
+        registro = {'url': url, 'estado': estado, 't': round(time.time(), 3)}
+        registro.update(extra)
+        with self._lock:
+            self.estados[url] = estado
+            self._pendientes.append(json.dumps(registro, ensure_ascii=False) + '\n')
+            lleno = len(self._pendientes) >= self.registros_por_lote
+        if lleno:
+            self.sincronizar()
+    
+    def sincronizar(self):
+        """Escribe los registros pendientes y hace fsync"""
+        with self._lock:
+            if not self._pendientes or self._archivo.closed:
+                return
+            self._archivo.writelines(self._pendientes)
+            self._pendientes = []
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+    
+    def _sincronizar_periodicamente(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.sincronizar()
+            except OSError as e:
+                log_warning(f"No se pudo sincronizar el diario del lote: {e}")
+    
+    def cerrar(self):
+        """Detiene la sincronizacion periodica y vuelca lo pendiente"""
+        self._parar.set()
+        self._hilo.join(timeout=self.intervalo + 1)
+        self.sincronizar()
+        with self._lock:
+            self._archivo.close()
+
+def es_url_valida(valor):
+    """Indica si una celda del CSV contiene una URL http(s)"""
+    return valor.startswith('http://') or valor.startswith('https://')
+
+# Nombres aceptados para las columnas especiales del encabezado del CSV
+COLUMNAS_PRIORIDAD = ('priority', 'prioridad')
+# Filas retenidas como mucho para adelantar las prioritarias (ver _ordenar_por_prioridad)
+VENTANA_PRIORIDAD = 1000
+COLUMNAS_INICIO = ('start', 'inicio')
+COLUMNAS_FIN = ('end', 'fin')
+
+def _filas_csv(archivo_csv):
+    """
+    Genera las filas con contenido de un CSV, sin el encabezado.
+    
+    Las columnas especiales del encabezado (prioridad e inicio/fin de la
+    seccion a descargar) se separan de las celdas con URLs. Las filas con una
+    seccion invalida se saltan: descargar el video completo en su lugar
+    podria costar horas de audio.
+    
+    :param archivo_csv: Ruta al archivo CSV
+    :return: Generador de (numero de fila, celdas no vacias, prioridad, seccion); la
+             prioridad es None si el encabezado no tiene columna de prioridad y la
+             seccion (inicio, fin) es None si la fila no pide ninguna
+    """
+    with open(archivo_csv, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        primera_fila = True
+        columnas = {}
+        
+        for row_num, row in enumerate(reader, start=1):
+            celdas = [(celda or '').strip() for celda in row]
+            if not any(celdas):  # Saltar filas vacias
+                continue
             
-            if lines and len(lines) > 1:
-                first_line = lines[0].strip()
-                # Si la primera línea parece ser un encabezado (no una URL)
-                if not (first_line.startswith('http://') or first_line.startswith('https://')):
-                    has_header = True
+            # Detectar encabezado: primera fila sin ninguna URL
+            if primera_fila:
+                primera_fila = False
+                if not any(es_url_valida(celda) for celda in celdas):
+                    for i, nombre in enumerate(celda.lower() for celda in celdas):
+                        for campo, nombres in (('prioridad', COLUMNAS_PRIORIDAD), ('inicio', COLUMNAS_INICIO),
+                                               ('fin', COLUMNAS_FIN)):
+                            if nombre in nombres:
+                                columnas.setdefault(campo, i)
+                    continue
             
-            reader = csv.reader(file)
+            valores = {campo: celdas[i] if i < len(celdas) else '' for campo, i in columnas.items()}
+            celdas = [celda for i, celda in enumerate(celdas) if celda and i not in columnas.values()]
             
-            if has_header:
-                next(reader)  # Saltar encabezado
+            prioridad = None
+            if 'prioridad' in columnas:
+                prioridad = 0
+                if valores['prioridad']:
+                    try:
+                        prioridad = max(0, int(valores['prioridad']))
+                    except ValueError:
+                        log_warning(f"Fila {row_num}: prioridad invalida '{valores['prioridad']}' (se usa 0)")
             
-            for row_num, row in enumerate(reader, start=1):
-                if not row:  # Saltar filas vacías
+            seccion = None
+            if valores.get('inicio') or valores.get('fin'):
+                try:
+                    inicio = parsear_tiempo(valores['inicio']) if valores.get('inicio') else 0.0
+                    fin = parsear_tiempo(valores['fin']) if valores.get('fin') else None
+                    if fin is not None and fin <= inicio:
+                        raise ValueError(f"el fin ({valores['fin']}) no es posterior al inicio")
+                    seccion = (inicio, fin)
+                except ValueError as e:
+                    log_warning(f"Fila {row_num}: seccion invalida, fila ignorada ({e})")
                     continue
-                    
-                # Tomar la primera columna como URL
-                url = row[0].strip() if row[0] else None
-                
-                if url and (url.startswith('http://') or url.startswith('https://')):
-                    urls.append(url)
-                    safe_print(f"[NOTE] URL {len(urls)}: {url}")
-                    log_info(f"URL {len(urls)} agregada: {url}")
-                elif url:
-                    log_warning(f"Fila {row_num}: URL invalida '{url}' (ignorada)")
-                    
+            yield row_num, celdas, prioridad, seccion
+
+def _ordenar_por_prioridad(filas, ventana=VENTANA_PRIORIDAD):
+    """
+    Adelanta las filas prioritarias en una sola pasada con un monticulo acotado.
+    
+    Se retienen como mucho 'ventana' filas y se entrega siempre la de mayor
+    prioridad (a igual prioridad, la primera leida): una fila urgente adelanta
+    a las 'ventana' filas anteriores y a todas las posteriores, sin leer el
+    archivo dos veces ni guardar sus filas urgentes en memoria.
+    
+    :param filas: Generador de filas de _filas_csv
+    :param ventana: Filas retenidas como mucho
+    :return: Generador de las mismas filas reordenadas
+    """
+    monticulo = []
+    for fila in filas:
+        heapq.heappush(monticulo, (-fila[2], fila[0], fila))
+        if len(monticulo) > ventana:
+            yield heapq.heappop(monticulo)[2]
+    while monticulo:
+        yield heapq.heappop(monticulo)[2]
+
+def iterar_urls_csv(archivo_csv, prioridades=None, seccion=None):
+    """
+    Genera las URLs de un archivo CSV fila a fila, sin cargarlo en memoria.
+    
+    Se leen todas las celdas de cada fila (puede haber varias URLs por fila).
+    Si la primera fila no contiene ninguna URL se trata como encabezado. Si el
+    encabezado tiene una columna 'priority' (o 'prioridad'), las filas con
+    prioridad mayor que 0 se adelantan al resto, de mayor a menor, dentro de
+    una ventana acotada (ver _ordenar_por_prioridad). Las columnas
+    'start' y 'end' (o 'inicio' y 'fin') piden solo una seccion del video.
+    
+    :param archivo_csv: Ruta al archivo CSV
+    :param prioridades: Dict opcional (clave del video -> prioridad) donde anotar las URLs prioritarias
+    :param seccion: Seccion (inicio, fin) por defecto para las filas que no piden ninguna (--start/--end)
+    :return: Generador de URLs validas (en forma canonica, ver normalizar_url; con la seccion
+             como fragmento, ver url_con_seccion)
+    """
+    filas = _filas_csv(archivo_csv)
+    primera = next(filas, None)
+    if primera is None:
+        return
+    filas = itertools.chain([primera], filas)
+    if primera[2] is not None:
+        # Con columna de prioridad: una sola lectura, reordenada con memoria acotada
+        filas = _ordenar_por_prioridad(filas)
+    
+    for row_num, celdas, prioridad, seccion_fila in filas:
+        for celda in celdas:
+            if es_url_valida(celda):
+                # Solo las columnas o --start/--end piden una seccion (la columna manda)
+                url = url_sin_seccion(normalizar_url(celda))
+                if seccion_fila or seccion:
+                    url = url_con_seccion(url, *(seccion_fila or seccion))
+                if prioridad and prioridades is not None:
+                    prioridades[clave_video(url)] = prioridad
+                yield url
+            else:
+                log_warning(f"Fila {row_num}: URL invalida '{celda}' (ignorada)")
+
+def filtrar_urls(urls, omitidas, indice=None, verificar_checksums=False, diario=None):
+    """
+    Filtra en streaming las URLs repetidas, ya completadas (diario) o ya descargadas (indice).
+    
+    :param urls: Iterable de URLs (se normalizan aqui)
+    :param omitidas: Dict de contadores 'existentes', 'completadas' y 'duplicadas' a actualizar
+    :param indice: IndiceDescargas cuyos videos intactos se omiten (--skip-existing) o None
+    :param verificar_checksums: Recalcular el checksum de los archivos del indice
+    :param diario: DiarioLote reanudado cuyas URLs completadas se omiten (--resume) o None
+    :return: Generador de URLs pendientes
+    """
+    # Claves ya vistas en este lote: el mismo video solo se programa una vez
+    vistas = set()
+    for url in urls:
+        url = normalizar_url(url)
+        clave = clave_video(url)
+        if clave in vistas:
+            omitidas['duplicadas'] += 1
+            log_info(f"Omitida (duplicada en el lote): {url}")
+            continue
+        vistas.add(clave)
+        if diario is not None and diario.estados.get(url) == 'done':
+            omitidas['completadas'] += 1
+            continue
+        if indice is not None:
+            existente = indice.verificar(clave, verificar_checksums)
+            if existente:
+                omitidas['existentes'] += 1
+                log_info(f"Omitido (ya descargado): {url} -> {existente}")
+                continue
+        yield url
+
+def leer_urls_csv(archivo_csv):
+    """
+    Lee todas las URLs de un archivo CSV en una lista.
+    
+    Para archivos grandes es preferible iterar_urls_csv, que no materializa la lista.
+    
+    :param archivo_csv: Ruta al archivo CSV
+    :return: Lista de URLs válidas
+    """
+    try:
+        urls = list(iterar_urls_csv(archivo_csv))
     except FileNotFoundError:
         safe_print(f"[ERROR] No se pudo encontrar el archivo: {archivo_csv}")
         return []
@@ -218,215 +951,3405 @@ def leer_urls_csv(archivo_csv):
     safe_print(f"\n[STATS] Se encontraron {len(urls)} URLs validas para procesar.\n")
     return urls
 
-def progress_hook(url_id, animation=None):
+def url_de_entrada(entrada):
+    """
+    Obtiene la URL descargable de una entrada de lista extraida en modo plano.
+    
+    :param entrada: Entrada de 'entries' (normalmente de _type 'url')
+    :return: URL del video o de la sublista, o None si no se puede determinar
+    """
+    url = entrada.get('url') or entrada.get('webpage_url')
+    if entrada.get('ie_key') == 'Youtube' and entrada.get('id') and not (url or '').startswith('http'):
+        # Algunas entradas planas de YouTube solo traen el ID
+        url = f"https://www.youtube.com/watch?v={entrada['id']}"
+    return url
+
+def _entradas_de_lista(ydl, url, profundidad):
+    """
+    Recorre de forma perezosa las entradas de una lista o canal.
+    
+    Con process=False yt-dlp devuelve 'entries' como generador o lista
+    paginada: cada pagina se pide a medida que se consumen las entradas.
+    """
+    info = ydl.extract_info(url, download=False, process=False)
+    if info.get('_type', 'video') not in ('playlist', 'multi_video'):
+        # No era una lista: se descarga la URL original tal cual
+        yield url
+        return
+    
+    titulo = info.get('title') or url
+    thread_safe_print(f"[PROCESS] Expandiendo lista: {titulo}")
+    total = 0
+    for entrada in info.get('entries') or []:
+        if not entrada:
+            continue
+        url_entrada = url_de_entrada(entrada)
+        if not url_entrada:
+            continue
+        # Canales: cada pestana (videos, shorts, directos) es a su vez una lista
+        es_sublista = entrada.get('_type') == 'playlist' or entrada.get('ie_key') == 'YoutubeTab'
+        if es_sublista and profundidad > 0 and not extraer_video_id(url_entrada):
+            yield from _entradas_de_lista(ydl, url_entrada, profundidad - 1)
+            continue
+        total += 1
+        yield url_entrada
+    log_info(f"Lista expandida: {titulo} ({total} entradas)")
+
+def expandir_listas(urls, profundidad=2):
+    """
+    Sustituye en streaming cada URL de lista o canal por las URLs de sus videos.
+    
+    Usa extraccion plana (extract_flat): no se piden los metadatos completos
+    de cada video, solo las paginas de la lista, y cada pagina se pide cuando
+    el planificador necesita mas URLs. Las URLs que ya identifican un video
+    (incluidas watch?v=...&list=...) pasan sin coste adicional.
+    
+    :param urls: Iterable de URLs (p.ej. iterar_urls_csv)
+    :param profundidad: Niveles de sublistas a seguir (canal -> pestana -> videos)
+    :return: Generador de URLs de video
+    """
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'quiet': True,
+        'noprogress': True,
+    }
+    ydl = None
+    try:
+        for url in urls:
+            if extraer_video_id(url):
+                yield url
+                continue
+            if ydl is None:
+                ydl = yt_dlp.YoutubeDL(ydl_opts)
+            seccion = seccion_de_url(url)
+            try:
+                for entrada in _entradas_de_lista(ydl, url_sin_seccion(url), profundidad):
+                    # La seccion pedida para una lista se aplica a cada uno de sus videos
+                    yield url_con_seccion(entrada, *seccion) if seccion else entrada
+            except (yt_dlp.utils.DownloadError, yt_dlp.utils.ExtractorError) as e:
+                log_error(f"No se pudo expandir la lista {url}: {e}")
+    finally:
+        if ydl is not None:
+            ydl.close()
+
+# Registro del progreso en el log: como mucho cada N% o cada T segundos por descarga
+LOG_PROGRESO_PASO = 10
+LOG_PROGRESO_INTERVALO = 5.0
+
+def progress_hook(url_id, progreso=None, cancelacion=None, trabajo=None, limitador=None):
     """Factory function to create thread-specific progress hooks"""
+    # Ultimo porcentaje e instante registrados en el log (por descarga)
+    ultimo_log = {'porcentaje': None, 'instante': 0.0}
+    # Bytes ya contabilizados en el limitador de ancho de banda
+    contabilizados = {'bytes': None}
+    
     def hook(d):
         """Hook para mostrar el progreso de descarga de manera segura y thread-safe"""
+        # Abortar la descarga en curso si se pidio cancelar el lote
+        if cancelacion is not None and cancelacion.is_set():
+            raise yt_dlp.utils.DownloadCancelled(f"[{url_id}] Descarga cancelada por el usuario")
         if d['status'] == 'downloading':
-            percent = d.get('_percent_str', 'N/A')
-            speed = d.get('_speed_str', 'N/A')
-            log_info(f"[{url_id}] Descargando... {percent} a {speed}")
-            if animation:
-                animation.update_message(f"[{url_id}] Descargando {percent}")
+            if limitador is not None:
+                # El primer bloque solo fija la referencia (una descarga reanudada ya trae bytes)
+                descargados = d.get('downloaded_bytes') or 0
+                if contabilizados['bytes'] is not None:
+                    peso = 1 + (trabajo.prioridad if trabajo is not None else 0)
+                    limitador.consumir(url_id, descargados - contabilizados['bytes'], peso, cancelacion)
+                contabilizados['bytes'] = descargados
+            if trabajo is not None:
+                trabajo.registrar_progreso(d)
+            if progreso:
+                progreso.actualizar(url_id, 'descargando', d.get('downloaded_bytes'),
+                                    d.get('total_bytes') or d.get('total_bytes_estimate'), d.get('speed'))
+            # Muestrear: yt-dlp llama al hook por cada bloque descargado
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            porcentaje = d.get('downloaded_bytes', 0) / total * 100 if total else None
+            ahora = time.monotonic()
+            if (ultimo_log['porcentaje'] is None
+                    or (porcentaje is not None and porcentaje - ultimo_log['porcentaje'] >= LOG_PROGRESO_PASO)
+                    or ahora - ultimo_log['instante'] >= LOG_PROGRESO_INTERVALO):
+                ultimo_log['porcentaje'] = porcentaje if porcentaje is not None else 0.0
+                ultimo_log['instante'] = ahora
+                percent = d.get('_percent_str', 'N/A')
+                speed = d.get('_speed_str', 'N/A')
+                log_info(f"[{url_id}] Descargando... {percent} a {speed}")
         elif d['status'] == 'finished':
+            if limitador is not None:
+                limitador.terminar(url_id)
+            if trabajo is not None:
+                trabajo.bytes_descargados = d.get('total_bytes') or d.get('downloaded_bytes') or 0
             log_info(f"[{url_id}] Descarga terminada: {d.get('filename', 'archivo')}")
-            if animation:
-                animation.update_message(f"[{url_id}] Convirtiendo a MP3")
+            if progreso:
+                progreso.actualizar(url_id, 'descarga terminada')
         elif d['status'] == 'error':
             log_error(f"[{url_id}] Error durante la descarga")
     return hook
 
-def descargar_audio_mp3(url_youtube, output_dir='.', url_id=None, show_animation=True):
+def ruta_final_descarga(info):
+    """
+    Obtiene la ruta real del archivo escrito por yt-dlp tras el post-procesado.
+    
+    :param info: Info dict devuelto por process_ie_result
+    :return: Ruta del archivo final o None si no se pudo determinar
     """
-    Descarga el audio de un video de YouTube y lo guarda en formato MP3.
+    for descarga in reversed(info.get('requested_downloads') or []):
+        if descarga.get('filepath'):
+            return descarga['filepath']
+    return info.get('filepath') or info.get('_filename')
 
-    :param url_youtube: La URL del video de YouTube.
-    :param output_dir: Directorio donde guardar el archivo (por defecto: directorio actual)
-    :param url_id: Identificador para el hilo de descarga (para logging thread-safe)
-    :param show_animation: Mostrar animacion de progreso
-    :return: Ruta del archivo MP3 creado o None si hay error
+# Campo del info dict con la seccion pedida (ver rangos_de_descarga)
+CAMPO_SECCION = 'seccion_pedida'
+
+def con_seccion(info, seccion):
+    """Copia del info dict con la seccion a descargar (el mismo dict si es el video completo)"""
+    return dict(info, **{CAMPO_SECCION: seccion}) if seccion else info
+
+def rangos_de_descarga(info, ydl):
     """
+    Callback 'download_ranges' de yt-dlp: la seccion pedida o el video completo.
     
-    # Generar ID si no se proporciona
-    if url_id is None:
-        url_id = f"URL-{hash(url_youtube) % 1000:03d}"
+    Con una seccion yt-dlp descarga con FFmpeg, que salta al inicio con
+    peticiones HTTP de rango (o elige solo los fragmentos DASH/HLS
+    necesarios) y se detiene al llegar al fin, en lugar de bajar todo el audio.
+    """
+    seccion = info.get(CAMPO_SECCION)
+    if not seccion:
+        return [{}]
+    inicio, fin = seccion
+    return [{'start_time': inicio, 'end_time': fin if fin is not None else info.get('duration') or math.inf}]
+
+def obtener_info(ydl, url_youtube, cache=None, video_id=None):
+    """
+    Obtiene el info dict sin procesar, consultando primero la cache de metadatos.
     
-    # Crear animacion de progreso
-    animation = None
-    if show_animation:
-        animation = ProgressAnimation(f"[{url_id}] Iniciando descarga")
-        animation.start()
+    :param ydl: Instancia de YoutubeDL
+    :param url_youtube: URL del video
+    :param cache: CacheMetadatos opcional
+    :param video_id: ID normalizado del video (clave de la cache)
+    :return: Tuple (info, desde_cache)
+    """
+    if cache and video_id:
+        info = cache.obtener(video_id)
+        if info is not None:
+            return info, True
     
-    # Log inicio de descarga
-    log_info(f"[{url_id}] Iniciando descarga de: {url_youtube}")
+    info = ydl.extract_info(url_youtube, download=False, process=False)
+    if cache and video_id and info.get('_type', 'video') == 'video':
+        cache.guardar(video_id, ydl.sanitize_info(info, remove_private_keys=True))
+    return info, False
+
+class PoliticaSalida:
+    """
+    Decide el formato de salida de cada descarga y si el audio original puede
+    copiarse tal cual (remultiplexado sin decodificar) o hay que recodificarlo.
+    """
     
-    # [SETTINGS] Opciones de yt-dlp
-    ydl_opts = {
-        # [MUSIC] Formato del post-procesamiento (extraer audio)
-        'format': 'bestaudio/best',  
-        'postprocessors': [{
-            # [PROCESS] Post-procesador para convertir el archivo
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '320', # Calidad de audio (320 kbps es alta)
-        }],
-        # [FOLDER] Plantilla del nombre de archivo. %(title)s es el titulo del video.
-        # yt-dlp aniadira automaticamente la extension .mp3
-        'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
-        # [INFO] Mostrar progreso
-        'progress_hooks': [progress_hook(url_id, animation)],
-        # [WARNING] Desactivar listas de reproduccion si se pega una URL de lista
-        'noplaylist': True,
-        # [QUIET] Silenciar salida de youtube-dl excepto errores
-        'quiet': True  # Silenciar para que solo se vea nuestra animacion
+    FORMATOS = ('mp3', 'm4a', 'opus', 'best')
+    # Codec que exige cada formato de salida explicito
+    CODEC_POR_FORMATO = {'mp3': 'mp3', 'm4a': 'aac', 'opus': 'opus'}
+    # Contenedor natural de cada codec cuando se conserva el original ('best')
+    CONTENEDOR_POR_CODEC = {'aac': 'm4a', 'opus': 'opus', 'vorbis': 'ogg', 'mp3': 'mp3', 'flac': 'flac'}
+    # Formatos de yt-dlp preferidos: los que se pueden copiar sin recodificar
+    SELECTOR_PREFERIDO = {
+        'mp3': 'bestaudio[acodec^=mp3]',
+        'm4a': 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]',
+        'opus': 'bestaudio[acodec=opus]',
+        'best': 'bestaudio/best',
     }
-
-    try:
-        # Crear directorio de salida si no existe
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
+    
+    def __init__(self, formato='mp3', transcodificar=True):
+        if formato not in self.FORMATOS:
+            raise ValueError(f"Formato de salida no soportado: {formato}")
+        self.formato = formato
+        self.transcodificar = transcodificar
+        # Estadisticas de la etapa de conversion (compartidas entre hilos)
+        self.copias = 0
+        self.tiempo_copias = 0.0
+        self.transcodificaciones = 0
+        self.tiempo_transcodificaciones = 0.0
+        self._lock = Lock()
+    
+    @property
+    def selector_formato(self):
+        """Selector de formato para yt-dlp; sin recodificacion no hay alternativa"""
+        selector = self.SELECTOR_PREFERIDO[self.formato]
+        if self.transcodificar and self.formato != 'best':
+            selector += '/bestaudio/best'
+        return selector
+    
+    @staticmethod
+    def codec_de_audio(info):
+        """
+        Normaliza el codec de audio del formato descargado.
         
-        if animation:
-            animation.update_message(f"[{url_id}] Obteniendo informacion del video")
+        :param info: Info dict devuelto por process_ie_result
+        :return: 'aac', 'opus', 'vorbis', 'mp3', 'flac' o None si no se reconoce
+        """
+        descarga = (info.get('requested_downloads') or [info])[-1]
+        acodec = (descarga.get('acodec') or info.get('acodec') or '').lower()
+        if acodec.startswith('mp4a') or acodec == 'aac':
+            return 'aac'
+        for codec in ('opus', 'vorbis', 'mp3', 'flac'):
+            if acodec.startswith(codec):
+                return codec
+        # Sin acodec fiable: deducirlo de la extension (webm puede ser opus o vorbis)
+        extension = descarga.get('ext') or info.get('ext')
+        return {'m4a': 'aac', 'opus': 'opus', 'ogg': 'vorbis', 'mp3': 'mp3', 'flac': 'flac'}.get(extension)
+    
+    def planificar(self, info):
+        """
+        Decide la extension final y si basta con copiar el flujo de audio.
         
-        # [START] Ejecutar la descarga
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Obtener metadatos para verificar el nombre del archivo
-            info = ydl.extract_info(url_youtube, download=False)
-            title = info.get('title', 'audio')
-            log_info(f"[{url_id}] Titulo del video: {title}")
-            
-            # Limpiar caracteres problematicos del nombre de archivo
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            final_filename = os.path.join(output_dir, f"{safe_title}.mp3")
-            
-            if animation:
-                animation.update_message(f"[{url_id}] Descargando audio")
-            
-            # Ahora forzamos la descarga real
-            ydl.download([url_youtube])
+        :param info: Info dict devuelto por process_ie_result
+        :return: Tuple (extension, copiar)
+        :raises ValueError: Si hace falta recodificar y esta desactivado (--no-transcode)
+        """
+        codec = self.codec_de_audio(info)
+        if self.formato == 'best':
+            if codec in self.CONTENEDOR_POR_CODEC:
+                return self.CONTENEDOR_POR_CODEC[codec], True
+            extension = 'mp3'
+        elif codec == self.CODEC_POR_FORMATO[self.formato]:
+            return self.formato, True
+        else:
+            extension = self.formato
+        if not self.transcodificar:
+            raise ValueError(f"El audio original ({codec or 'codec desconocido'}) no se puede "
+                             f"guardar como {extension} sin recodificar")
+        return extension, False
+    
+    def registrar(self, copia, segundos):
+        """Acumula el tiempo de una conversion para el resumen final"""
+        with self._lock:
+            if copia:
+                self.copias += 1
+                self.tiempo_copias += segundos
+            else:
+                self.transcodificaciones += 1
+                self.tiempo_transcodificaciones += segundos
 
-        # Detener animacion y mostrar exito
-        if animation:
-            animation.stop()
+class SesionesYoutubeDL:
+    """
+    Instancias de YoutubeDL de larga duracion, una por hilo de trabajo.
+    
+    Crear un YoutubeDL por URL repite la carga de extractores, la cookie jar
+    y las cabeceras, y abre conexiones nuevas (TCP/TLS) para cada video. Cada
+    hilo reutiliza la suya y con ella el pool de conexiones keep-alive hacia
+    los mismos hosts. El unico progress hook registrado reenvia al hook del
+    trabajo actual, que se cambia en cada descarga.
+    """
+    
+    def __init__(self, opciones):
+        self.opciones = opciones
+        self.creadas = 0
+        self._local = threading.local()
+        self._pila = contextlib.ExitStack()
+        self._lock = Lock()
+    
+    def obtener(self, hook=None):
+        """
+        Devuelve el YoutubeDL del hilo actual con 'hook' como progress hook.
         
-        thread_safe_print(f"[SUCCESS] [{url_id}] '{title}' -> MP3 completado")
-        log_info(f"[{url_id}] Descarga completada exitosamente: {final_filename}")
-        return final_filename
+        :param hook: Progress hook del trabajo que va a usar la sesion
+        :return: Instancia de YoutubeDL exclusiva de este hilo
+        """
+        local = self._local
+        if getattr(local, 'ydl', None) is None:
+            # El hook se guarda en un contenedor (no en el thread-local) porque
+            # yt-dlp puede llamarlo desde hilos de descarga de fragmentos
+            local.hook_actual = {}
+            hook_actual = local.hook_actual
+            
+            def despachar(d):
+                if hook_actual.get('hook'):
+                    hook_actual['hook'](d)
+            
+            local.ydl = yt_dlp.YoutubeDL(dict(self.opciones, progress_hooks=[despachar]))
+            with self._lock:
+                self._pila.enter_context(local.ydl)
+                self.creadas += 1
+        local.hook_actual['hook'] = hook
+        return local.ydl
+    
+    def cerrar(self):
+        """Cierra todas las instancias (llamar cuando los hilos han terminado)"""
+        with self._lock:
+            self._pila.close()
 
-    except yt_dlp.utils.DownloadError as e:
-        if animation:
-            animation.stop()
-        error_msg = f"Error de descarga para {url_youtube}: {str(e)}"
-        log_error(f"[{url_id}] {error_msg}")
-        return None
-    except Exception as e:
-        if animation:
-            animation.stop()
-        error_msg = f"Error inesperado procesando {url_youtube}: {str(e)}"
-        log_error(f"[{url_id}] {error_msg}")
-        return None
+MB = 1024 * 1024
 
-async def procesar_url_async(url, output_dir, url_id, executor):
+def estimar_tamano_audio(info):
     """
-    Procesa una URL de forma asincrona usando un ThreadPoolExecutor.
+    Estima, antes de descargar, cuanto ocupara el audio segun los metadatos.
     
-    :param url: URL del video de YouTube
-    :param output_dir: Directorio de salida
-    :param url_id: Identificador unico para el hilo
-    :param executor: ThreadPoolExecutor instance
-    :return: Tuple (url, resultado, exito)
-    """
-    loop = asyncio.get_event_loop()
+    Se toma el mayor de los formatos solo audio (o de todos si no hay
+    ninguno): el selector suele elegir el mejor, asi que la estimacion es
+    conservadora. Sin tamano declarado se calcula con bitrate x duracion.
     
-    try:
-        # Ejecutar la descarga en un hilo separado con animacion
-        resultado = await loop.run_in_executor(
-            executor, 
-            descargar_audio_mp3, 
-            url, 
-            output_dir, 
-            url_id,
-            True  # show_animation
-        )
-        
-        exito = resultado is not None
-        return (url, resultado, exito, url_id)
-        
-    except Exception as e:
-        error_msg = f"Error procesando {url}: {str(e)}"
-        log_error(f"[{url_id}] {error_msg}")
-        return (url, None, False, url_id)
+    :param info: Info dict devuelto por extract_info (sin descargar)
+    :return: Bytes estimados o None si los metadatos no lo permiten
+    """
+    formatos = info.get('formats') or [info]
+    solo_audio = [f for f in formatos if f.get('vcodec') == 'none']
+    duracion = info.get('duration')
+    tamanos = []
+    for formato in solo_audio or formatos:
+        tamano = formato.get('filesize') or formato.get('filesize_approx')
+        bitrate = formato.get('abr') or formato.get('tbr')
+        if not tamano and bitrate and duracion:
+            tamano = bitrate * duracion * 125  # kbps -> bytes
+        if tamano:
+            tamanos.append(tamano)
+    return int(max(tamanos)) if tamanos else None
 
-async def procesar_urls_async(urls, output_dir, max_concurrent=3):
+class AlmacenSalida:
     """
-    Procesa multiples URLs de forma asincrona con un limite de concurrencia.
+    Donde y como se escriben los archivos de un lote.
     
-    :param urls: Lista de URLs a procesar
-    :param output_dir: Directorio de salida
-    :param max_concurrent: Numero maximo de descargas simultaneas (default: 3)
-    :return: Tuple (exitosos, fallidos, resultados)
+    - Staging: los .part de yt-dlp y la salida de FFmpeg se escriben en un
+      directorio aparte (un SSD local o tmpfs, por ejemplo); el directorio
+      final solo recibe archivos terminados, movidos de forma atomica.
+    - Sharding opcional: con N niveles cada archivo va a output_dir/ab/cd/...
+      segun el hash de su clave, para no acumular miles de entradas en un
+      mismo directorio.
+    - Admision por espacio libre: antes de descargar, cada trabajo reserva lo
+      que espera escribir segun sus metadatos (el original en staging y el
+      archivo final en la salida; si estan en el mismo disco se suman). Si no
+      cabe junto a lo reservado por los trabajos en curso y el margen, espera
+      a que terminen; si no hay ninguno en curso falla sin gastar ancho de banda.
     """
-    total_urls = len(urls)
-    exitosos = 0
-    fallidos = 0
-    resultados = []
     
-    thread_safe_print(f"[START] Procesamiento asincrono: {total_urls} URL(s), max {max_concurrent} hilos")
-    log_info(f"Iniciando procesamiento asincrono de {total_urls} URLs con hasta {max_concurrent} hilos simultaneos")
+    NOMBRE_STAGING = '.staging'
+    MARGEN_POR_DEFECTO = 200 * MB
     
-    # Crear un ThreadPoolExecutor con el numero maximo de hilos
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+    def __init__(self, output_dir='.', staging_dir=None, niveles_shard=0, margen=MARGEN_POR_DEFECTO):
+        self.output_dir = output_dir
+        self.staging_dir = staging_dir or os.path.join(output_dir, self.NOMBRE_STAGING)
+        self.niveles_shard = niveles_shard
+        self.margen = margen
+        # Estadisticas de admision (compartidas entre hilos)
+        self.esperas = 0
+        self.rechazos = 0
+        self._reservado = {}  # dispositivo -> bytes reservados por los trabajos en curso
+        self._reservas = {}   # trabajo -> [(dispositivo, bytes)]
+        self._condicion = threading.Condition()
+    
+    def directorio_destino(self, clave):
+        """
+        Directorio final de un video: output_dir o, con sharding, un
+        subdirectorio por cada par de caracteres del hash de su clave.
+        
+        :param clave: Clave del video (ver clave_video)
+        :return: Ruta del directorio (puede no existir todavia)
+        """
+        if not self.niveles_shard:
+            return self.output_dir
+        resumen = hashlib.sha1(clave.encode('utf-8')).hexdigest()
+        niveles = (resumen[2 * i:2 * i + 2] for i in range(self.niveles_shard))
+        return os.path.join(self.output_dir, *niveles)
+    
+    @staticmethod
+    def _dispositivo(directorio):
+        """Sistema de archivos de un directorio (o de su primer ancestro existente)"""
+        ruta = os.path.abspath(directorio)
+        while not os.path.exists(ruta) and os.path.dirname(ruta) != ruta:
+            ruta = os.path.dirname(ruta)
+        return os.stat(ruta).st_dev, ruta
+    
+    def necesidades(self, info, politica):
+        """
+        Bytes que se espera escribir en staging y en la salida.
         
-        # Crear tareas asincronas para cada URL
-        tasks = []
-        for i, url in enumerate(urls, 1):
-            url_id = f"T{i:02d}"
-            log_info(f"Creando tarea {url_id} para: {url}")
-            task = procesar_url_async(url, output_dir, url_id, executor)
-            tasks.append(task)
+        :param info: Info dict sin descargar
+        :param politica: PoliticaSalida del lote
+        :return: Dict directorio -> bytes (vacio si los metadatos no dan tamanos)
+        """
+        descarga = estimar_tamano_audio(info)
+        if not descarga:
+            return {}
+        duracion = info.get('duration')
+        seccion = info.get(CAMPO_SECCION)
+        if seccion and duracion:
+            # Solo se descarga (y se convierte) la seccion pedida
+            inicio, fin = seccion
+            fraccion = max(0.0, min(fin if fin is not None else duracion, duracion) - inicio) / duracion
+            descarga = int(descarga * fraccion)
+            duracion *= fraccion
+        salida = descarga
+        if politica.transcodificar and politica.formato in CODIFICADORES and duracion:
+            # Si acaba recodificado, el archivo final puede superar al original
+            salida = max(salida, int(duracion * int(CODIFICADORES[politica.formato][1]) * 125))
+        return {self.staging_dir: descarga, self.output_dir: salida}
+    
+    def reservar(self, trabajo, necesidades, cancelacion=None):
+        """
+        Admite un trabajo si hay espacio para lo que va a escribir; si lo
+        ocupan otros trabajos en curso, espera a que lo liberen.
         
-        thread_safe_print(f"[PROCESS] Ejecutando {len(tasks)} tareas en paralelo...")
+        :param trabajo: TrabajoDescarga que va a descargar
+        :param necesidades: Dict directorio -> bytes (ver necesidades)
+        :param cancelacion: threading.Event opcional; si se activa se deja de esperar
+        :raises OSError: (ENOSPC) si no cabe ni sin otros trabajos en curso
+        """
+        por_disco = {}
+        for directorio, nbytes in necesidades.items():
+            disco, ruta = self._dispositivo(directorio)
+            por_disco[disco] = (ruta, por_disco.get(disco, (ruta, 0))[1] + nbytes)
+        if not por_disco:
+            return
         
-        try:
-            # Ejecutar todas las tareas de forma concurrente
-            completed_tasks = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Procesar resultados
-            for i, result in enumerate(completed_tasks, 1):
-                if isinstance(result, Exception):
-                    fallidos += 1
-                    error_msg = f"Tarea {i} fallo con excepcion: {result}"
-                    log_error(error_msg)
-                    resultados.append((urls[i-1], None, False, f"T{i:02d}"))
-                else:
-                    url, archivo, exito, url_id = result
-                    if exito:
-                        exitosos += 1
-                        # Solo mostrar el resultado final, los detalles van al log
-                        log_info(f"{url_id} - Exito: {url}")
-                    else:
-                        fallidos += 1
-                        # Los errores ya se loggearon en la funcion individual
-                        pass
-                    resultados.append(result)
+        with self._condicion:
+            esperando = False
+            while True:
+                falta = None
+                for disco, (ruta, nbytes) in por_disco.items():
+                    libre = shutil.disk_usage(ruta).free - self._reservado.get(disco, 0) - self.margen
+                    if libre < nbytes:
+                        falta = (ruta, nbytes, libre)
+                        break
+                if falta is None:
+                    break
+                if cancelacion is not None and cancelacion.is_set():
+                    # La descarga se abortara en el progress hook; no reservar nada
+                    return
+                ruta, nbytes, libre = falta
+                if not self._reservas:
+                    self.rechazos += 1
+                    raise OSError(errno.ENOSPC, f"Espacio insuficiente en {ruta}: se necesitan "
+                                                f"{nbytes / MB:.0f} MB y hay {max(libre, 0) / MB:.0f} MB "
+                                                f"libres ademas del margen de {self.margen / MB:.0f} MB")
+                if not esperando:
+                    esperando = True
+                    self.esperas += 1
+                    log_warning(f"[{trabajo.url_id}] Espacio justo en {ruta} ({nbytes / MB:.0f} MB necesarios): "
+                                f"esperando a que terminen otras descargas")
+                self._condicion.wait(1.0)
             
-        except KeyboardInterrupt:
-            thread_safe_print(f"\n[PAUSE] Procesamiento interrumpido por el usuario.")
-            log_info("Procesamiento interrumpido por el usuario")
-            # Cancelar tareas pendientes
-            for task in tasks:
-                if not task.done():
-                    task.cancel()
+            for disco, (_, nbytes) in por_disco.items():
+                self._reservado[disco] = self._reservado.get(disco, 0) + nbytes
+            self._reservas[trabajo] = [(disco, nbytes) for disco, (_, nbytes) in por_disco.items()]
+    
+    def liberar(self, trabajo):
+        """Devuelve el espacio reservado por un trabajo (idempotente)"""
+        with self._condicion:
+            for disco, nbytes in self._reservas.pop(trabajo, ()):
+                self._reservado[disco] -= nbytes
+            self._condicion.notify_all()
+
+def parsear_tasa(texto):
+    """
+    Convierte una tasa como '500K', '4M' o '1.5M' (bytes por segundo, sufijos
+    binarios como en yt-dlp -r) a bytes por segundo.
+    
+    :raises argparse.ArgumentTypeError: Si el texto no es una tasa valida
+    """
+    coincidencia = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?(?:/s)?\s*', texto, re.IGNORECASE)
+    if not coincidencia or float(coincidencia.group(1)) <= 0:
+        raise argparse.ArgumentTypeError(f"tasa invalida: '{texto}' (ejemplos: 500K, 4M, 1.5M)")
+    multiplicador = 1024 ** ' kmg'.index(coincidencia.group(2).lower() or ' ')
+    return int(float(coincidencia.group(1)) * multiplicador)
+
+class LimitadorAncho:
+    """
+    Limite de ancho de banda global del proceso (token bucket) repartido
+    entre las descargas activas.
+    
+    Los progress hooks de todas las descargas consumen del mismo cubo los
+    bytes recibidos en cada bloque y esperan mientras este en deficit, asi que
+    el total no supera la tasa aunque cambie el numero de descargas. Cuando
+    varias compiten, el turno se da por tiempo virtual de fin ponderado (fair
+    queueing): cada una recibe una parte proporcional a su peso (1 + su
+    prioridad). El ancho de banda que una descarga no usa queda para las demas.
+    """
+    
+    def __init__(self, bytes_por_segundo):
+        self.tasa = float(bytes_por_segundo)
+        # Rafaga maxima y tamano de bloque de yt-dlp: con bloques pequenos la
+        # espera se reparte en muchos tramos cortos en lugar de pocos largos
+        self.capacidad = max(self.tasa / 4, 64 * 1024)
+        self.bloque = int(min(max(self.tasa / 50, 16 * 1024), 1024 * 1024))
+        self.tokens = self.capacidad
+        self.bytes = 0
+        self.espera_total = 0.0
+        self._ultimo = time.monotonic()
+        self._reloj = 0.0      # Tiempo virtual del ultimo turno servido
+        self._virtual = {}     # descarga -> tiempo virtual de fin de su ultimo turno
+        self._turnos = {}      # descarga -> tiempo virtual del turno que espera
+        self._uso = {}         # descarga -> (peso, instante del ultimo bloque)
+        self._condicion = threading.Condition()
+    
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+    
+    def consumir(self, descarga, nbytes, peso=1, cancelacion=None):
+        """
+        Descuenta los bytes de un bloque recibido, esperando el turno de la descarga si hace falta.
+        
+        :param descarga: Identificador de la descarga (url_id)
+        :param nbytes: Bytes recibidos desde la llamada anterior
+        :param peso: Parte relativa del ancho de banda (1 + prioridad)
+        :param cancelacion: threading.Event opcional; si se activa se deja de esperar
+        """
+        if nbytes <= 0:
+            return
+        inicio = time.monotonic()
+        with self._condicion:
+            etiqueta = max(self._virtual.get(descarga, 0.0), self._reloj) + nbytes / peso
+            self._virtual[descarga] = etiqueta
+            self._turnos[descarga] = etiqueta
+            self._uso[descarga] = (peso, inicio)
+            try:
+                while cancelacion is None or not cancelacion.is_set():
+                    self._rellenar()
+                    if etiqueta <= min(self._turnos.values()):
+                        if self.tokens > 0:
+                            break
+                        # Primero en la cola: esperar a que el cubo salga del deficit
+                        self._condicion.wait(min(-self.tokens / self.tasa, 0.5))
+                    else:
+                        self._condicion.wait(0.5)
+                # Se permite deficit: el bloque ya se recibio y lo pagan los siguientes
+                self.tokens -= nbytes
+                self.bytes += nbytes
+                self._reloj = max(self._reloj, etiqueta)
+            finally:
+                del self._turnos[descarga]
+                self.espera_total += time.monotonic() - inicio
+                # Olvidar descargas inactivas: su tiempo virtual ya no cuenta
+                for otra, (_, instante) in list(self._uso.items()):
+                    if inicio - instante > 5 and otra not in self._turnos:
+                        del self._uso[otra]
+                        self._virtual.pop(otra, None)
+                self._condicion.notify_all()
+    
+    def terminar(self, descarga):
+        """Olvida una descarga terminada (ya no cuenta como activa)"""
+        with self._condicion:
+            self._uso.pop(descarga, None)
+            self._virtual.pop(descarga, None)
+    
+    def describir(self):
+        """Estado del limitador para el panel de progreso"""
+        ahora = time.monotonic()
+        activas = [peso for peso, instante in list(self._uso.values()) if ahora - instante < 2]
+        texto = f"limite {self.tasa / 1e6:.2f} MB/s"
+        if activas:
+            texto += f" entre {len(activas)} (pesos {'/'.join(str(p) for p in sorted(activas, reverse=True))})"
+        return texto
+
+class ContextoDescarga:
+    """Recursos compartidos por todas las descargas de un lote"""
+    
+    def __init__(self, output_dir='.', cache=None, indice=None, diario=None, cancelacion=None,
+                 almacen=None, politica=None, progreso=None, limitador=None):
+        self.output_dir = output_dir
+        self.progreso = progreso
+        self.politica = politica or PoliticaSalida()
+        # Staging, sharding y admision por espacio libre
+        self.almacen = almacen or AlmacenSalida(output_dir)
+        # Limite de ancho de banda compartido por todas las descargas (o None)
+        self.limitador = limitador
+        # Area de trabajo donde se deja el audio original antes de convertirlo
+        self.staging_dir = self.almacen.staging_dir
+        self.cache = cache
+        self.indice = indice
+        self.diario = diario
+        self.cancelacion = cancelacion
+        # Nombres de salida reservados en este lote (ruta -> clave del video)
+        self.destinos = {}
+        self._destinos_lock = Lock()
+        self._sesiones = None
+    
+    def opciones_yt_dlp(self):
+        """Opciones de yt-dlp comunes a todas las descargas del lote"""
+        opciones = {
+            # [MUSIC] Preferir un audio que se pueda copiar sin recodificar; la conversion se hace en otra etapa
+            'format': self.politica.selector_formato,
+            # [FOLDER] Nombre por ID (y seccion) en staging: estable entre ejecuciones para reanudar .part
+            'outtmpl': os.path.join(self.staging_dir, '%(id)s%(section_start&.{}|)s%(section_end&-{}|)s.%(ext)s'),
+            # Solo la seccion pedida en la URL, si la hay (ver url_con_seccion)
+            'download_ranges': rangos_de_descarga,
+            # [WARNING] Desactivar listas de reproduccion si se pega una URL de lista
+            'noplaylist': True,
+            # [PROCESS] Reanudar archivos .part de ejecuciones interrumpidas
+            'continuedl': True,
+            # [QUIET] Silenciar salida de youtube-dl excepto errores
+            'quiet': True,  # Silenciar para que solo se vea nuestro panel de progreso
+            'noprogress': True,
+        }
+        if self.limitador:
+            # Bloques de tamano fijo: el hook (y con el el limitador) se llama con regularidad
+            opciones.update(buffersize=self.limitador.bloque, noresizebuffer=True)
+        return opciones
+    
+    @property
+    def sesiones(self):
+        """Sesiones de yt-dlp por hilo, creadas al primer uso"""
+        if self._sesiones is None:
+            with self._destinos_lock:
+                if self._sesiones is None:
+                    self._sesiones = SesionesYoutubeDL(self.opciones_yt_dlp())
+        return self._sesiones
+    
+    def cerrar(self):
+        """
+        Cierra las sesiones de yt-dlp (y sus conexiones persistentes).
+        
+        :return: Numero de instancias de YoutubeDL que se crearon
+        """
+        if self._sesiones is None:
+            return 0
+        sesiones, self._sesiones = self._sesiones, None
+        sesiones.cerrar()
+        return sesiones.creadas
+    
+    def _destino_ocupado(self, ruta, clave):
+        propietario = self.destinos.get(os.path.normcase(os.path.abspath(ruta)))
+        if propietario is not None:
+            return propietario != clave
+        # Archivo de una ejecucion anterior: solo es de otro video si el indice lo dice
+        if self.indice and os.path.exists(ruta):
+            propietario = self.indice.propietario(ruta)
+            return propietario is not None and propietario != clave
+        return False
+    
+    def reservar_destino(self, ruta, clave, sufijo):
+        """
+        Reserva un nombre de salida para un video. Si otro video distinto ya lo
+        usa (mismo titulo saneado), se anade el ID al nombre: 'Titulo [ID].mp3'.
+        
+        :param ruta: Ruta de salida deseada
+        :param clave: Clave del video (ver clave_video)
+        :param sufijo: Texto a anadir en caso de colision (normalmente el ID)
+        :return: Ruta reservada
+        """
+        base, extension = os.path.splitext(ruta)
+        with self._destinos_lock:
+            candidata = ruta
+            intento = 1
+            while self._destino_ocupado(candidata, clave):
+                candidata = f"{base} [{sufijo}]{extension}" if intento == 1 else f"{base} [{sufijo}] ({intento}){extension}"
+                intento += 1
+            self.destinos[os.path.normcase(os.path.abspath(candidata))] = clave
+        return candidata
+    
+    def marcar(self, trabajo, estado, **extra):
+        """Registra el estado de un trabajo en el diario del lote (si lo hay)"""
+        if self.diario:
+            self.diario.marcar(trabajo.url, estado, **extra)
+
+class TrabajoDescarga:
+    """Estado de una URL a lo largo de las etapas del pipeline (red -> conversion)"""
+    
+    def __init__(self, url, url_id):
+        self.url = url
+        self.url_id = url_id
+        self.video_id = extraer_video_id(url)
+        self.clave = clave_video(url)
+        self.seccion = seccion_de_url(url)  # (inicio, fin) a descargar o None para el video completo
+        self.compartido_con = None  # url_id del trabajo identico cuyo resultado se reutilizo
+        self.prioridad = 0          # Columna de prioridad del CSV: turno y parte del ancho de banda
+        self.titulo = None
+        self.duracion = None
+        self.ruta_origen = None   # Audio original descargado en el area de staging
+        self.ruta_destino = None  # Ruta final prevista en el directorio de salida
+        self.archivo = None       # Archivo final ya convertido
+        self.copiar = False       # True si el audio original se guarda sin recodificar
+        self.tiempo_conversion = None
+        self.bytes_descargados = 0
+        self.error = None
+        # Metricas de la URL: duracion de cada fase (segundos), velocidades y reintentos
+        self.inicio = time.perf_counter()
+        self.tiempos = {}
+        self.velocidad_maxima = 0.0
+        self.reintentos = 0
+        self._inicio_descarga = None
+    
+    @property
+    def exito(self):
+        return self.archivo is not None
+    
+    def compartir_resultado(self, otro):
+        """Adopta el resultado de un trabajo identico que ya estaba en curso"""
+        self.compartido_con = otro.url_id
+        self.titulo = otro.titulo
+        self.duracion = otro.duracion
+        self.ruta_destino = otro.ruta_destino
+        self.archivo = otro.archivo
+        self.copiar = otro.copiar
+        self.error = otro.error
+    
+    def iniciar_fase(self, fase):
+        """Marca el inicio de una fase; devuelve una funcion que registra su duracion"""
+        inicio = time.perf_counter()
+        if fase == 'descarga':
+            self._inicio_descarga = inicio
+        def terminar():
+            self.tiempos[fase] = time.perf_counter() - inicio
+        return terminar
+    
+    def registrar_progreso(self, d):
+        """Actualiza tiempo hasta el primer byte y velocidad maxima desde un progress hook"""
+        if self._inicio_descarga is None:
+            return
+        if 'primer_byte' not in self.tiempos and d.get('downloaded_bytes'):
+            self.tiempos['primer_byte'] = time.perf_counter() - self._inicio_descarga
+        self.velocidad_maxima = max(self.velocidad_maxima, d.get('speed') or 0.0)
+    
+    @property
+    def velocidad_media(self):
+        """Bytes por segundo durante la fase de descarga"""
+        duracion = self.tiempos.get('descarga')
+        return self.bytes_descargados / duracion if duracion else None
+
+def descargar_audio_original(trabajo, contexto, show_animation=True):
+    """
+    Etapa de red: obtiene los metadatos y descarga el mejor audio disponible
+    al area de staging, sin convertirlo.
+    
+    :param trabajo: TrabajoDescarga a completar
+    :param contexto: ContextoDescarga del lote
+    :param show_animation: Actualizar la fila de la descarga en el panel de progreso del contexto
+    :return: True si el audio original quedo descargado
+    """
+    url_id = trabajo.url_id
+    
+    # Las filas del panel de progreso compartido se actualizan desde aqui y desde el hook
+    progreso = contexto.progreso if show_animation else None
+    if progreso:
+        progreso.actualizar(url_id, 'iniciando')
+    
+    # Log inicio de descarga
+    log_info(f"[{url_id}] Iniciando descarga de: {trabajo.url}")
+    
+    try:
+        # Crear directorio de staging si no existe
+        Path(contexto.staging_dir).mkdir(parents=True, exist_ok=True)
+        
+        if progreso:
+            progreso.actualizar(url_id, 'obteniendo informacion')
+        
+        # [START] Ejecutar la descarga
+        # Sesion de yt-dlp reutilizada por este hilo; el hook del trabajo se enchufa para esta descarga
+        ydl = contexto.sesiones.obtener(progress_hook(url_id, progreso, contexto.cancelacion, trabajo,
+                                                      contexto.limitador))
+        # Extraer metadatos una sola vez (o reutilizarlos de la cache)
+        contexto.marcar(trabajo, 'extracting')
+        terminar = trabajo.iniciar_fase('extraccion')
+        info, desde_cache = obtener_info(ydl, url_sin_seccion(trabajo.url), contexto.cache, trabajo.video_id)
+        terminar()
+        title = info.get('title') or 'audio'
+        log_info(f"[{url_id}] Titulo del video: {title}{' (cache)' if desde_cache else ''}")
+        
+        if trabajo.seccion:
+            # [MUSIC] Solo la seccion pedida: se descarga y se convierte unicamente ese tramo
+            if not shutil.which('ffmpeg'):
+                raise RuntimeError("Descargar una seccion requiere FFmpeg en el PATH")
+            if info.get('duration') and trabajo.seccion[0] >= info['duration']:
+                raise RuntimeError(f"La seccion empieza ({trabajo.seccion[0]:g}s) despues del final del video "
+                                   f"({info['duration']}s)")
+            log_info(f"[{url_id}] Seccion: {etiqueta_seccion(trabajo.seccion)}")
+            if contexto.limitador:
+                # FFmpeg descarga por su cuenta y solo informa al terminar: el limite no le llega
+                log_warning(f"[{url_id}] --limit-rate no se aplica a la descarga de secciones (la hace FFmpeg)")
+            info = con_seccion(info, trabajo.seccion)
+        
+        # [FOLDER] Admision: no empezar a descargar si lo esperado no cabe en disco
+        if progreso:
+            progreso.actualizar(url_id, 'comprobando espacio')
+        contexto.almacen.reservar(trabajo, contexto.almacen.necesidades(info, contexto.politica), contexto.cancelacion)
+        
+        if progreso:
+            progreso.actualizar(url_id, 'descargando')
+        
+        # Descargar desde el info dict ya resuelto (sin segunda extraccion)
+        contexto.marcar(trabajo, 'downloading')
+        terminar = trabajo.iniciar_fase('descarga')
+        try:
+            info = ydl.process_ie_result(info, download=True)
+        except yt_dlp.utils.DownloadError as e:
+            if not desde_cache:
+                raise
+            # Las URLs cacheadas pueden haber sido revocadas: re-extraer una vez
+            log_warning(f"[{url_id}] Fallo con metadatos cacheados ({e}), re-extrayendo")
+            trabajo.reintentos += 1
+            contexto.cache.invalidar(trabajo.video_id)
+            info, _ = obtener_info(ydl, url_sin_seccion(trabajo.url), contexto.cache, trabajo.video_id)
+            terminar = trabajo.iniciar_fase('descarga')
+            info = ydl.process_ie_result(con_seccion(info, trabajo.seccion), download=True)
+        terminar()
+        
+        trabajo.titulo = info.get('title') or title
+        trabajo.duracion = info.get('duration')
+        if trabajo.seccion and trabajo.duracion:
+            inicio, fin = trabajo.seccion
+            trabajo.duracion = min(fin if fin is not None else trabajo.duracion, trabajo.duracion) - inicio
+        trabajo.ruta_origen = ruta_final_descarga(info)
+        # Copiar o recodificar segun el codec realmente descargado
+        extension, trabajo.copiar = contexto.politica.planificar(info)
+        # Nombre final con el mismo saneado que yt-dlp aplica a %(title)s (en su subdirectorio si hay sharding)
+        plantilla_final = os.path.join(contexto.almacen.directorio_destino(trabajo.clave), '%(title)s.%(ext)s')
+        base = os.path.splitext(ydl.prepare_filename(info, outtmpl=plantilla_final))[0]
+        if trabajo.seccion:
+            base += f" ({etiqueta_seccion(trabajo.seccion)})"
+        ruta_destino = f"{base}.{extension}"
+        # Dos videos distintos con el mismo titulo no pueden compartir archivo
+        trabajo.ruta_destino = contexto.reservar_destino(ruta_destino, trabajo.clave, info.get('id') or trabajo.url_id)
+    
+        log_info(f"[{url_id}] Audio original descargado: {trabajo.ruta_origen}")
+        if progreso:
+            progreso.actualizar(url_id, 'esperando conversion')
+        return True
+    
+    except yt_dlp.utils.DownloadCancelled:
+        # El diario conserva el ultimo estado para poder reanudar con --resume
+        log_warning(f"[{url_id}] Descarga cancelada: {trabajo.url}")
+        contexto.almacen.liberar(trabajo)
+        return False
+    except yt_dlp.utils.DownloadError as e:
+        trabajo.error = str(e)
+        log_error(f"[{url_id}] Error de descarga para {trabajo.url}: {trabajo.error}")
+        contexto.marcar(trabajo, 'failed', error=trabajo.error)
+        contexto.almacen.liberar(trabajo)
+        return False
+    except Exception as e:
+        trabajo.error = str(e)
+        log_error(f"[{url_id}] Error inesperado procesando {trabajo.url}: {trabajo.error}")
+        contexto.marcar(trabajo, 'failed', error=trabajo.error)
+        contexto.almacen.liberar(trabajo)
+        # Ya descargado pero inservible (p. ej. --no-transcode sin formato compatible): no dejarlo en staging
+        if trabajo.ruta_origen:
+            with contextlib.suppress(OSError):
+                os.remove(trabajo.ruta_origen)
+            trabajo.ruta_origen = None
+        return False
+
+# Codificador y bitrate por defecto (kbps) de cada formato de salida
+CODIFICADORES = {'mp3': ('libmp3lame', '320'), 'm4a': ('aac', '256'), 'opus': ('libopus', '160')}
+
+def mover_atomico(origen, destino):
+    """
+    Mueve un archivo a su ruta final sin que nunca se vea a medio escribir.
+    
+    En el mismo sistema de archivos basta con renombrar. Si el origen esta en
+    otro disco (staging en un SSD local o tmpfs) se copia antes a un temporal
+    oculto junto al destino y se renombra al terminar la copia.
+    
+    :param origen: Archivo terminado
+    :param destino: Ruta final
+    """
+    try:
+        os.replace(origen, destino)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
             raise
+    directorio, nombre = os.path.split(destino)
+    temporal = os.path.join(directorio, f".{nombre}.tmp")
+    try:
+        shutil.copyfile(origen, temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporal)
+        raise
+    os.remove(origen)
+
+def ejecutar_ffmpeg(origen, destino, argumentos_audio, directorio_temporal=None):
+    """
+    Ejecuta FFmpeg sobre un archivo de audio escribiendo el resultado de forma atomica.
+    
+    Se escribe primero a un archivo temporal (en staging si se indica, si no
+    junto al destino) para que una conversion interrumpida nunca deje un
+    archivo truncado con el nombre final.
+    
+    :param origen: Archivo de audio original
+    :param destino: Ruta del archivo a generar
+    :param argumentos_audio: Argumentos de codec de FFmpeg para el flujo de audio
+    :param directorio_temporal: Directorio para la salida temporal (normalmente el staging)
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError("FFmpeg no encontrado en el PATH")
+    
+    base, extension = os.path.splitext(destino)
+    if directorio_temporal:
+        temporal = os.path.join(directorio_temporal,
+                                f"{os.path.splitext(os.path.basename(origen))[0]}.salida{extension}")
+    else:
+        temporal = f"{base}.temp{extension}"
+    comando = [
+        ffmpeg, '-y', '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-i', origen, '-vn', *argumentos_audio, temporal,
+    ]
+    proceso = subprocess.run(comando, capture_output=True, text=True, errors='replace')
+    if proceso.returncode != 0:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        detalle = proceso.stderr.strip().splitlines()[-1:] or [f"codigo {proceso.returncode}"]
+        raise RuntimeError(f"FFmpeg fallo: {detalle[0]}")
+    mover_atomico(temporal, destino)
+
+def transcodificar_audio(origen, destino, calidad=None, formato='mp3', directorio_temporal=None):
+    """
+    Recodifica un archivo de audio (decodificacion + codificacion con perdidas).
+    
+    :param origen: Archivo de audio original
+    :param destino: Ruta del archivo a generar
+    :param calidad: Bitrate en kbps (por defecto, el del formato: 320 kbps en MP3)
+    :param formato: Formato de salida ('mp3', 'm4a' u 'opus')
+    :param directorio_temporal: Directorio para la salida temporal de FFmpeg
+    """
+    codificador, bitrate = CODIFICADORES[formato]
+    ejecutar_ffmpeg(origen, destino, ['-codec:a', codificador, '-b:a', f'{calidad or bitrate}k'], directorio_temporal)
+
+def copiar_flujo_audio(origen, destino, directorio_temporal=None):
+    """
+    Guarda el audio original sin decodificarlo. Si el contenedor ya es el de
+    destino basta con mover el archivo; si no, FFmpeg lo remultiplexa.
+    
+    :param origen: Archivo de audio original
+    :param destino: Ruta del archivo a generar
+    :param directorio_temporal: Directorio para la salida temporal de FFmpeg
+    """
+    if os.path.splitext(origen)[1].lower() != os.path.splitext(destino)[1].lower():
+        ejecutar_ffmpeg(origen, destino, ['-codec:a', 'copy'], directorio_temporal)
+        return
+    mover_atomico(origen, destino)
+
+def convertir_audio(trabajo, contexto):
+    """
+    Etapa de conversion: guarda el audio en el formato de salida (copiando el
+    flujo original o recodificandolo), libera el staging y registra la descarga.
+    
+    :param trabajo: TrabajoDescarga con el audio original ya descargado
+    :param contexto: ContextoDescarga del lote
+    :return: True si el archivo final quedo escrito
+    """
+    url_id = trabajo.url_id
+    formato = os.path.splitext(trabajo.ruta_destino)[1].lstrip('.')
+    modo = 'copiado sin recodificar' if trabajo.copiar else 'transcodificado'
+    contexto.marcar(trabajo, 'converting')
+    if contexto.progreso:
+        contexto.progreso.actualizar(url_id, 'copiando' if trabajo.copiar else 'convirtiendo')
+    log_info(f"[{url_id}] {'Copiando' if trabajo.copiar else 'Convirtiendo'} a {formato.upper()}: "
+             f"{trabajo.ruta_origen}")
+    
+    try:
+        Path(os.path.dirname(trabajo.ruta_destino) or '.').mkdir(parents=True, exist_ok=True)
+        inicio = time.perf_counter()
+        if trabajo.copiar:
+            copiar_flujo_audio(trabajo.ruta_origen, trabajo.ruta_destino, contexto.staging_dir)
+        else:
+            transcodificar_audio(trabajo.ruta_origen, trabajo.ruta_destino, formato=formato,
+                                 directorio_temporal=contexto.staging_dir)
+        trabajo.tiempo_conversion = time.perf_counter() - inicio
+        trabajo.tiempos['postproceso'] = trabajo.tiempo_conversion
+        contexto.politica.registrar(trabajo.copiar, trabajo.tiempo_conversion)
+        if os.path.exists(trabajo.ruta_origen):
+            os.remove(trabajo.ruta_origen)
+        trabajo.archivo = trabajo.ruta_destino
+        
+        if contexto.indice:
+            try:
+                contexto.indice.registrar(trabajo.clave, trabajo.archivo, trabajo.duracion)
+            except OSError as e:
+                # El archivo ya esta publicado: sin su entrada solo se pierde --skip-existing para este video
+                log_warning(f"[{url_id}] No se pudo registrar en el indice de descargas: {e}")
+        
+        contexto.marcar(trabajo, 'done', archivo=trabajo.archivo)
+        thread_safe_print(f"[SUCCESS] [{url_id}] '{trabajo.titulo}' -> {formato.upper()} completado "
+                          f"({modo} en {trabajo.tiempo_conversion:.2f}s)")
+        log_info(f"[{url_id}] Descarga completada exitosamente: {trabajo.archivo} "
+                 f"({modo} en {trabajo.tiempo_conversion:.3f}s)")
+        return True
+    
+    except (OSError, RuntimeError) as e:
+        # Un fallo tras publicar (p. ej. al anotarlo en el diario) tampoco cuenta como exito
+        trabajo.archivo = None
+        trabajo.error = str(e)
+        log_error(f"[{url_id}] Error convirtiendo {trabajo.url}: {trabajo.error}")
+        contexto.marcar(trabajo, 'failed', error=trabajo.error)
+        return False
+    finally:
+        contexto.almacen.liberar(trabajo)
+
+def descargar_audio_mp3(url_youtube, output_dir='.', url_id=None, show_animation=True, cache=None,
+                        indice=None, diario=None, cancelacion=None, politica=None, informe=None, contexto=None,
+                        reintentos=None, almacen=None, limitador=None):
+    """
+    Descarga el audio de un video de YouTube y lo guarda en formato MP3 (u otro segun la politica de salida).
+    
+    Ejecuta en secuencia la etapa de red y la de conversion; el modo
+    asincrono las ejecuta en pools independientes. Los errores de red
+    transitorios se reintentan tras una espera exponencial, y no se despacha
+    a un host con el circuito abierto (ver DisyuntorHosts).
+
+    :param url_youtube: La URL del video de YouTube.
+    :param output_dir: Directorio donde guardar el archivo (por defecto: directorio actual)
+    :param url_id: Identificador para el hilo de descarga (para logging thread-safe)
+    :param show_animation: Mostrar animacion de progreso
+    :param cache: CacheMetadatos opcional para evitar re-extraer metadatos
+    :param indice: IndiceDescargas opcional donde registrar la descarga completada
+    :param diario: DiarioLote opcional donde registrar el estado de la URL
+    :param cancelacion: threading.Event opcional; si se activa, la descarga se aborta
+    :param politica: PoliticaSalida opcional (por defecto, MP3 recodificado)
+    :param informe: InformeEjecucion opcional donde anotar las metricas de la URL
+    :param contexto: ContextoDescarga compartido entre llamadas para reutilizar la sesion de yt-dlp
+                     (si se pasa, output_dir/cache/indice/diario/cancelacion/politica/almacen/limitador
+                     se toman de el)
+    :param reintentos: PoliticaReintentos opcional (por defecto, 3 reintentos)
+    :param almacen: AlmacenSalida opcional (staging, sharding y admision por espacio libre)
+    :param limitador: LimitadorAncho opcional (limite de ancho de banda)
+    :return: Ruta del archivo de audio creado o None si hay error
+    """
+    
+    # Generar ID si no se proporciona
+    if url_id is None:
+        url_id = f"URL-{hash(url_youtube) % 1000:03d}"
+    
+    progreso = PanelProgreso().start() if show_animation else None
+    propio = contexto is None
+    if propio:
+        contexto = ContextoDescarga(output_dir, cache, indice, diario, cancelacion, almacen, politica=politica,
+                                    limitador=limitador)
+    contexto.progreso = progreso
+    if progreso:
+        progreso.limitador = contexto.limitador
+    reintentos = reintentos or PoliticaReintentos()
+    disyuntor = reintentos.disyuntor
+    trabajo = TrabajoDescarga(url_youtube, url_id)
+    host = disyuntor.host_de(url_youtube)
+    try:
+        while True:
+            # Circuito abierto para el host: esperar a que se pueda despachar
+            espera, permiso = disyuntor.permiso(host)
+            while espera > 0:
+                if progreso:
+                    progreso.actualizar(url_id, f'{host} en pausa')
+                time.sleep(espera)
+                espera, permiso = disyuntor.permiso(host)
+            descargado = descargar_audio_original(trabajo, contexto, show_animation)
+            cancelado = contexto.cancelacion is not None and contexto.cancelacion.is_set()
+            disyuntor.registrar(host, permiso, None if cancelado else disyuntor.resultado_de(trabajo))
+            if descargado:
+                convertir_audio(trabajo, contexto)
+                break
+            if cancelado or not reintentos.debe_reintentar(trabajo):
+                break
+            espera = reintentos.programar(trabajo)
+            thread_safe_print(f"[PROCESS] [{url_id}] Error transitorio, reintento "
+                              f"{trabajo.reintentos}/{reintentos.max_reintentos} en {espera:.1f}s")
+            if progreso:
+                progreso.actualizar(url_id, f'esperando reintento {trabajo.reintentos}')
+            time.sleep(espera)
+            trabajo.error = None
+            if contexto.cache and trabajo.video_id:
+                contexto.cache.invalidar(trabajo.video_id)
+    finally:
+        contexto.almacen.liberar(trabajo)
+        contexto.progreso = None
+        if progreso:
+            progreso.stop()
+        if propio:
+            contexto.cerrar()
+    reintentos.registrar(trabajo)
+    if informe:
+        informe.registrar(trabajo)
+    return trabajo.archivo
+
+def version_ffmpeg():
+    """Primera linea de 'ffmpeg -version' o None si FFmpeg no esta disponible"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    try:
+        proceso = subprocess.run([ffmpeg, '-version'], capture_output=True, text=True, errors='replace', timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return (proceso.stdout.splitlines() or [None])[0]
+
+def percentil(ordenados, p):
+    """Percentil por rango mas cercano de una secuencia ya ordenada"""
+    if not ordenados:
+        return None
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+class InformeEjecucion:
+    """
+    Informe de rendimiento de un lote: metricas por URL y agregados
+    (media, p50/p95/p99) exportables a JSON o CSV con --report.
+    
+    Las filas por URL se escriben a un archivo temporal a medida que terminan
+    y solo se guardan en memoria los valores numericos de cada metrica, de
+    modo que el informe de un CSV enorme no depende de la RAM.
+    """
+    
+    CAMPOS = (
+        'url', 'url_id', 'video_id', 'estado', 'error', 'extraccion_s', 'primer_byte_s', 'descarga_s',
+        'postproceso_s', 'total_s', 'bytes_descargados', 'velocidad_media_bps', 'velocidad_maxima_bps',
+        'reintentos', 'conversion', 'tamano_final',
+    )
+    METRICAS = ('extraccion_s', 'primer_byte_s', 'descarga_s', 'postproceso_s', 'total_s',
+                'velocidad_media_bps', 'tamano_final')
+    PERCENTILES = (50, 95, 99)
+    
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.formato = 'csv' if ruta.lower().endswith('.csv') else 'json'
+        self.exitosos = 0
+        self.fallidos = 0
+        self.cancelados = 0
+        self.bytes_totales = 0
+        self.inicio = time.time()
+        self._inicio_reloj = time.perf_counter()
+        self._valores = {metrica: array('d') for metrica in self.METRICAS}
+        self._lock = Lock()
+        Path(os.path.dirname(os.path.abspath(ruta))).mkdir(parents=True, exist_ok=True)
+        self._ruta_filas = f"{ruta}.filas.tmp"
+        self._filas = open(self._ruta_filas, 'w', encoding='utf-8')
+    
+    def registrar(self, trabajo):
+        """Anade la fila de una URL terminada (con exito, fallida o cancelada)"""
+        if trabajo.exito:
+            estado = 'done'
+        elif trabajo.error:
+            estado = 'failed'
+        else:
+            estado = 'cancelled'
+        tamano_final = None
+        if trabajo.archivo and os.path.exists(trabajo.archivo):
+            tamano_final = os.path.getsize(trabajo.archivo)
+        fila = {
+            'url': trabajo.url,
+            'url_id': trabajo.url_id,
+            'video_id': trabajo.video_id,
+            'estado': estado,
+            'error': trabajo.error,
+            'extraccion_s': trabajo.tiempos.get('extraccion'),
+            'primer_byte_s': trabajo.tiempos.get('primer_byte'),
+            'descarga_s': trabajo.tiempos.get('descarga'),
+            'postproceso_s': trabajo.tiempos.get('postproceso'),
+            'total_s': time.perf_counter() - trabajo.inicio,
+            'bytes_descargados': trabajo.bytes_descargados,
+            'velocidad_media_bps': trabajo.velocidad_media,
+            'velocidad_maxima_bps': trabajo.velocidad_maxima or None,
+            'reintentos': trabajo.reintentos,
+            'conversion': ('copia' if trabajo.copiar else 'transcodificacion') if trabajo.exito else None,
+            'tamano_final': tamano_final,
+        }
+        with self._lock:
+            if estado == 'done':
+                self.exitosos += 1
+                # Los percentiles describen las descargas completas
+                for metrica in self.METRICAS:
+                    if fila[metrica] is not None:
+                        self._valores[metrica].append(fila[metrica])
+            elif estado == 'failed':
+                self.fallidos += 1
+            else:
+                self.cancelados += 1
+            self.bytes_totales += trabajo.bytes_descargados or 0
+            self._filas.write(json.dumps(fila, ensure_ascii=False) + '\n')
+    
+    def resumen(self):
+        """Agregados del lote: recuentos, MB/s totales y percentiles de cada metrica"""
+        duracion = time.perf_counter() - self._inicio_reloj
+        metricas = {}
+        for metrica, valores in self._valores.items():
+            ordenados = sorted(valores)
+            if not ordenados:
+                continue
+            metricas[metrica] = {
+                'n': len(ordenados),
+                'media': sum(ordenados) / len(ordenados),
+                **{f'p{p}': percentil(ordenados, p) for p in self.PERCENTILES},
+                'max': ordenados[-1],
+            }
+        return {
+            'inicio': datetime.fromtimestamp(self.inicio).isoformat(timespec='seconds'),
+            'duracion_s': duracion,
+            'exitosos': self.exitosos,
+            'fallidos': self.fallidos,
+            'cancelados': self.cancelados,
+            'bytes_totales': self.bytes_totales,
+            'mb_por_segundo': self.bytes_totales / duracion / 1e6 if duracion else None,
+            'urls_por_minuto': self.exitosos / duracion * 60 if duracion else None,
+            'versiones': {
+                'python': sys.version.split()[0],
+                'yt_dlp': yt_dlp.version.__version__,
+                'ffmpeg': version_ffmpeg(),
+            },
+            'metricas': metricas,
+        }
+    
+    def guardar(self):
+        """
+        Escribe el informe final.
+        
+        JSON: un objeto con 'resumen' y la lista 'urls'. CSV: una fila por URL
+        en la ruta indicada y el resumen en '<ruta sin extension>.resumen.csv'.
+        
+        :return: Resumen agregado del lote
+        """
+        resumen = self.resumen()
+        with self._lock:
+            self._filas.close()
+        try:
+            with open(self._ruta_filas, 'r', encoding='utf-8') as filas:
+                if self.formato == 'json':
+                    with open(self.ruta, 'w', encoding='utf-8') as f:
+                        f.write('{"resumen": ')
+                        json.dump(resumen, f, ensure_ascii=False, indent=2)
+                        f.write(',\n"urls": [')
+                        for i, linea in enumerate(filas):
+                            f.write((',\n' if i else '\n') + linea.rstrip('\n'))
+                        f.write('\n]}\n')
+                else:
+                    with open(self.ruta, 'w', newline='', encoding='utf-8') as f:
+                        escritor = csv.DictWriter(f, fieldnames=self.CAMPOS)
+                        escritor.writeheader()
+                        for linea in filas:
+                            escritor.writerow(json.loads(linea))
+                    with open(f"{os.path.splitext(self.ruta)[0]}.resumen.csv", 'w', newline='',
+                              encoding='utf-8') as f:
+                        escritor = csv.writer(f)
+                        escritor.writerow(['metrica', 'valor'])
+                        for clave, valor in resumen.items():
+                            if isinstance(valor, dict):
+                                for subclave, subvalor in valor.items():
+                                    if isinstance(subvalor, dict):
+                                        for estadistico, numero in subvalor.items():
+                                            escritor.writerow([f'{subclave}.{estadistico}', numero])
+                                    else:
+                                        escritor.writerow([f'{clave}.{subclave}', subvalor])
+                            else:
+                                escritor.writerow([clave, valor])
+        finally:
+            os.remove(self._ruta_filas)
+        return resumen
+
+def _siguiente_lote(iterador, tamano):
+    """Extrae hasta 'tamano' elementos de un iterador (se ejecuta en un hilo)"""
+    if hasattr(iterador, 'siguiente_lote'):
+        # Fuente continua (modo servidor): entrega lo disponible sin esperar a llenar el lote
+        return iterador.siguiente_lote(tamano)
+    return list(itertools.islice(iterador, tamano))
+
+# Errores HTTP con los que el servidor indica que estamos enviando demasiadas peticiones
+LIMITACION_RE = re.compile(r'HTTP Error (?:429|403)')
+
+def es_error_de_limitacion(error):
+    """Indica si un mensaje de error corresponde a throttling del servidor (HTTP 429/403)"""
+    return bool(error) and LIMITACION_RE.search(error) is not None
+
+# Errores que no se arreglan reintentando (se comprueban antes que los transitorios)
+ERROR_PERMANENTE_RE = re.compile(
+    r'HTTP Error (?:400|401|404|410)|Video unavailable|Private video|has been removed|'
+    r'not available in your country|Unsupported URL|is not a valid URL|copyright|'
+    r'Sign in to confirm your age|members-only|Requested format is not available',
+    re.IGNORECASE,
+)
+# Throttling, errores del servidor y fallos de red
+ERROR_TRANSITORIO_RE = re.compile(
+    r'HTTP Error (?:403|408|429|5\d\d)|timed out|Connection (?:reset|refused|aborted)|'
+    r'Remote end closed|IncompleteRead|Temporary failure|Network is unreachable|'
+    r'Name or service not known|getaddrinfo failed|did not get any data blocks',
+    re.IGNORECASE,
+)
+
+def clasificar_error(error):
+    """
+    Clasifica el mensaje de error de una descarga.
+    
+    :param error: Mensaje de error (trabajo.error)
+    :return: 'transitorio' si reintentar puede funcionar, 'permanente' en otro caso
+             (los errores desconocidos se consideran permanentes para no repetirlos sin fin)
+    """
+    if not error or ERROR_PERMANENTE_RE.search(error):
+        return 'permanente'
+    if ERROR_TRANSITORIO_RE.search(error):
+        return 'transitorio'
+    return 'permanente'
+
+class DisyuntorHosts:
+    """
+    Circuit breaker por host.
+    
+    Tras 'umbral' respuestas HTTP 429/403 seguidas de un mismo host el
+    circuito se abre y no se despachan descargas a ese host durante
+    'enfriamiento' segundos. Al cumplirse el plazo queda semiabierto y solo
+    se despacha una descarga de prueba: si termina bien lo cierra y si
+    recibe otro 429/403 lo reabre con el doble de espera, hasta
+    'enfriamiento_maximo'. Los resultados de descargas despachadas antes de
+    la ultima apertura no cambian el estado, y los fallos ajenos a la
+    limitacion (404, video privado...) no cuentan como exitos.
+    """
+    
+    # Segundos entre comprobaciones mientras la descarga de prueba sigue en curso
+    ESPERA_SONDA = 1.0
+    
+    def __init__(self, umbral=3, enfriamiento=10.0, enfriamiento_maximo=120.0):
+        self.umbral = max(1, umbral)
+        self.enfriamiento = enfriamiento
+        self.enfriamiento_maximo = enfriamiento_maximo
+        self.aperturas = {}  # host -> veces que se abrio el circuito
+        self._hosts = {}     # host -> {'fallos', 'abierto_hasta', 'enfriamiento', 'apertura', 'sonda'}
+        self._lock = Lock()
+    
+    @staticmethod
+    def host_de(url):
+        return (urlsplit(str(url)).hostname or '').lower()
+    
+    @staticmethod
+    def resultado_de(trabajo):
+        """Resultado de la etapa de red de un trabajo, tal como lo espera registrar()"""
+        if es_error_de_limitacion(trabajo.error):
+            return 'limitado'
+        return 'fallo' if trabajo.error else 'exito'
+    
+    def _estado(self, host):
+        return self._hosts.setdefault(host, {'fallos': 0, 'abierto_hasta': None, 'enfriamiento': self.enfriamiento,
+                                             'apertura': 0, 'sonda': False})
+    
+    def espera(self, host):
+        """Segundos que faltan para poder despachar al host (0 si el circuito esta cerrado)"""
+        with self._lock:
+            estado = self._hosts.get(host)
+            if not estado or estado['abierto_hasta'] is None:
+                return 0.0
+            return max(0.0, estado['abierto_hasta'] - time.monotonic())
+    
+    def permiso(self, host):
+        """
+        Pide permiso para despachar una descarga al host.
+        
+        :return: Tuple (espera, permiso). Si 'espera' es mayor que 0 el circuito esta
+                 abierto (o su descarga de prueba sigue en curso) y hay que volver a
+                 pedirlo pasado ese tiempo; si no, 'permiso' se pasa a registrar()
+        """
+        with self._lock:
+            estado = self._estado(host)
+            if estado['abierto_hasta'] is not None:
+                restante = estado['abierto_hasta'] - time.monotonic()
+                if restante > 0:
+                    return restante, None
+                if estado['sonda']:
+                    return self.ESPERA_SONDA, None
+                # Semiabierto: esta descarga es la unica de prueba
+                estado['sonda'] = True
+            return 0.0, estado['apertura']
+    
+    def registrar(self, host, permiso, resultado):
+        """
+        Anota el resultado de una descarga despachada al host.
+        
+        :param host: Host de la URL
+        :param permiso: Valor devuelto por permiso() al despacharla
+        :param resultado: 'exito', 'limitado' (el servidor respondio 429/403), 'fallo'
+                          (cualquier otro error: no cierra el circuito ni cuenta como 429) o
+                          None si la descarga no llego a un resultado (cancelada)
+        """
+        with self._lock:
+            estado = self._estado(host)
+            if permiso != estado['apertura']:
+                # Despachada antes de la ultima apertura: no dice nada del estado actual
+                return
+            # Con el circuito abierto solo se despacha la descarga de prueba
+            semiabierto = estado['abierto_hasta'] is not None
+            estado['sonda'] = False
+            if resultado == 'exito':
+                if semiabierto:
+                    log_info(f"Circuito cerrado para {host}")
+                estado.update(fallos=0, abierto_hasta=None, enfriamiento=self.enfriamiento)
+                return
+            if resultado != 'limitado':
+                return
+            estado['fallos'] += 1
+            if not semiabierto and estado['fallos'] < self.umbral:
+                return
+            if semiabierto:
+                estado['enfriamiento'] = min(self.enfriamiento_maximo, estado['enfriamiento'] * 2)
+            estado['abierto_hasta'] = time.monotonic() + estado['enfriamiento']
+            estado['apertura'] += 1
+            self.aperturas[host] = self.aperturas.get(host, 0) + 1
+            espera = estado['enfriamiento']
+        log_warning(f"Circuito abierto para {host}: {estado['fallos']} respuestas 429/403, "
+                    f"pausa de {espera:.0f}s")
+        thread_safe_print(f"[PAUSE] {host} limita las peticiones: pausa de {espera:.0f}s antes de seguir")
+
+class PoliticaReintentos:
+    """
+    Reintentos de la etapa de red con espera exponencial y jitter.
+    
+    Solo se reintentan los errores transitorios (ver clasificar_error). La
+    espera del reintento n es aleatoria entre la mitad y el total de
+    base * 2^(n-1) segundos, con tope en 'espera_maxima', para que las
+    descargas que fallaron juntas no vuelvan a la vez. Incluye el
+    circuit breaker por host y cuenta los resultados para el resumen.
+    """
+    
+    def __init__(self, max_reintentos=3, base=2.0, espera_maxima=60.0, disyuntor=None):
+        self.max_reintentos = max(0, max_reintentos)
+        self.base = base
+        self.espera_maxima = espera_maxima
+        self.disyuntor = disyuntor or DisyuntorHosts()
+        self.programados = 0
+        self.recuperados = 0
+        self.agotados = 0
+        self.permanentes = 0
+        self._azar = random.Random()
+    
+    def debe_reintentar(self, trabajo):
+        """Indica si el fallo de red de 'trabajo' merece otro intento"""
+        return (not trabajo.exito and trabajo.ruta_origen is None and not trabajo.compartido_con
+                and trabajo.reintentos < self.max_reintentos and clasificar_error(trabajo.error) == 'transitorio')
+    
+    def espera(self, intento):
+        """Segundos antes del reintento numero 'intento' (1, 2, ...)"""
+        tope = min(self.espera_maxima, self.base * 2 ** (intento - 1))
+        return tope / 2 + self._azar.uniform(0, tope / 2)
+    
+    def programar(self, trabajo):
+        """Cuenta un nuevo intento de 'trabajo' y devuelve la espera en segundos"""
+        trabajo.reintentos += 1
+        self.programados += 1
+        espera = self.espera(trabajo.reintentos)
+        log_warning(f"[{trabajo.url_id}] Error transitorio ({trabajo.error}); reintento "
+                    f"{trabajo.reintentos}/{self.max_reintentos} en {espera:.1f}s")
+        return espera
+    
+    def registrar(self, trabajo):
+        """Anota el resultado final de un trabajo para el resumen"""
+        if trabajo.compartido_con:
+            return
+        if trabajo.exito:
+            if trabajo.reintentos:
+                self.recuperados += 1
+        elif trabajo.error:
+            if clasificar_error(trabajo.error) == 'transitorio':
+                self.agotados += 1
+            else:
+                self.permanentes += 1
+    
+    def resumen(self):
+        """Linea de resumen o None si no hubo nada que reintentar"""
+        if not (self.programados or self.agotados or self.disyuntor.aperturas):
+            return None
+        partes = [f"{self.programados} programados", f"{self.recuperados} URLs recuperadas",
+                  f"{self.agotados} agotadas"]
+        if self.disyuntor.aperturas:
+            hosts = ', '.join(f"{host} x{veces}" for host, veces in self.disyuntor.aperturas.items())
+            partes.append(f"circuito abierto: {hosts}")
+        return ', '.join(partes)
+
+class ControladorConcurrencia:
+    """
+    Control AIMD (aumento aditivo, reduccion multiplicativa) del numero de
+    descargas activas.
+    
+    Tras cada ronda de descargas completadas (tantas como el limite actual)
+    se suma una descarga mas si el rendimiento agregado mejoro y la CPU no
+    esta saturada; si el ultimo aumento no mejoro el rendimiento se deshace.
+    Un HTTP 429/403 reduce el limite a la mitad.
+    """
+    
+    # Mejora minima de rendimiento para considerar util el ultimo aumento
+    MEJORA_MINIMA = 1.05
+    # Segundos minimos entre dos reducciones por throttling
+    ESPERA_TRAS_RECORTE = 2.0
+    
+    def __init__(self, minimo, maximo, inicial=None, umbral_cpu=0.9):
+        self.minimo = max(1, minimo)
+        self.maximo = max(self.minimo, maximo)
+        self.limite = min(self.maximo, max(self.minimo, inicial or 2))
+        self.umbral_cpu = umbral_cpu
+        self.activos = 0
+        self.limite_alcanzado = self.limite
+        self.ajustes = 0
+        self._condicion = None
+        self._rendimiento_previo = None
+        self._ultimo_recorte = 0.0
+        self._reiniciar_ventana()
+        self._cpu_previa = (self._tiempo_cpu(), time.monotonic())
+    
+    @property
+    def adaptativo(self):
+        return self.minimo < self.maximo
+    
+    def _reiniciar_ventana(self):
+        self._completadas = 0
+        self._bytes = 0
+        self._inicio_ventana = time.monotonic()
+    
+    @staticmethod
+    def _tiempo_cpu():
+        tiempos = os.times()
+        # Incluye los subprocesos de FFmpeg ya terminados
+        return tiempos.user + tiempos.system + tiempos.children_user + tiempos.children_system
+    
+    def uso_cpu(self):
+        """Fraccion de CPU usada (0-1 por nucleo disponible) desde la ultima medicion"""
+        cpu_anterior, instante_anterior = self._cpu_previa
+        cpu, instante = self._tiempo_cpu(), time.monotonic()
+        self._cpu_previa = (cpu, instante)
+        transcurrido = instante - instante_anterior
+        if transcurrido <= 0:
+            return None
+        return (cpu - cpu_anterior) / transcurrido / (os.cpu_count() or 1)
+    
+    def _ajustar(self, nuevo_limite, motivo):
+        nuevo_limite = min(self.maximo, max(self.minimo, nuevo_limite))
+        if nuevo_limite != self.limite:
+            log_info(f"Concurrencia ajustada: {self.limite} -> {nuevo_limite} ({motivo})")
+            self.limite = nuevo_limite
+            self.limite_alcanzado = max(self.limite_alcanzado, nuevo_limite)
+            self.ajustes += 1
+    
+    async def adquirir(self):
+        """Espera hasta que haya hueco bajo el limite actual"""
+        if self._condicion is None:
+            self._condicion = asyncio.Condition()
+        async with self._condicion:
+            await self._condicion.wait_for(lambda: self.activos < self.limite)
+            self.activos += 1
+    
+    async def liberar(self, trabajo=None):
+        """Libera el hueco de una descarga terminada y ajusta el limite segun su resultado"""
+        self.activos -= 1
+        if trabajo is not None and self.adaptativo:
+            self.registrar(trabajo.bytes_descargados, es_error_de_limitacion(trabajo.error))
+        async with self._condicion:
+            self._condicion.notify_all()
+    
+    def registrar(self, bytes_descargados, limitado=False):
+        """Incorpora el resultado de una descarga a la ventana actual"""
+        ahora = time.monotonic()
+        if limitado:
+            if ahora - self._ultimo_recorte >= self.ESPERA_TRAS_RECORTE:
+                self._ultimo_recorte = ahora
+                self._ajustar(self.limite // 2, "throttling HTTP 429/403")
+            self._rendimiento_previo = None
+            self._reiniciar_ventana()
+            return
+        
+        self._completadas += 1
+        self._bytes += bytes_descargados
+        if self._completadas < self.limite:
+            return
+        
+        # Fin de ronda: decidir el siguiente limite
+        duracion = max(ahora - self._inicio_ventana, 1e-6)
+        rendimiento = self._bytes / duracion
+        cpu = self.uso_cpu()
+        if cpu is not None and cpu > self.umbral_cpu:
+            self._ajustar(self.limite - 1, f"CPU al {cpu:.0%}")
+            self._rendimiento_previo = None
+        elif self._rendimiento_previo is not None and rendimiento < self._rendimiento_previo * self.MEJORA_MINIMA:
+            # El ultimo aumento no mejoro el rendimiento: el enlace esta saturado
+            self._ajustar(self.limite - 1, f"sin mejora de rendimiento ({rendimiento / 1e6:.1f} MB/s)")
+            self._rendimiento_previo = None
+        else:
+            self._rendimiento_previo = rendimiento
+            self._ajustar(self.limite + 1, f"aumento aditivo ({rendimiento / 1e6:.1f} MB/s)")
+        self._reiniciar_ventana()
+
+class PlanificadorDescargas:
+    """
+    Pipeline asincrono de dos etapas con colas acotadas.
+    
+    Un pool de trabajadores de red consume los elementos de forma perezosa y,
+    si hay etapa de conversion, entrega cada descarga a un pool de conversion
+    independiente sin esperar a que termine. Como mucho 'tamano_cola'
+    elementos esperan en cada cola y los resultados se entregan a medida que
+    terminan. Los fallos transitorios de red vuelven a la cola tras una espera
+    (sin ocupar un trabajador mientras tanto) y no se despacha a un host con
+    el circuito abierto. Los elementos en cola se despachan por prioridad y,
+    a igual prioridad, por orden de llegada. Admite un drenaje ordenado (no
+    admitir mas trabajo y esperar al que esta en curso) y una cancelacion que
+    aborta tambien las descargas.
+    """
+    
+    _FIN = object()
+    
+    def __init__(self, max_concurrent, tamano_cola=None, controlador=None, reintentos=None, cancelacion=None,
+                 prioridad=None):
+        # Sin controlador la concurrencia es fija
+        self.controlador = controlador or ControladorConcurrencia(max_concurrent, max_concurrent, max_concurrent)
+        self.reintentos = reintentos or PoliticaReintentos()
+        self.max_concurrent = self.controlador.maximo
+        self.tamano_cola = tamano_cola or self.max_concurrent * 2
+        # Event de threading: lo consultan los hilos de descarga (puede activarse desde fuera)
+        self.cancelacion = cancelacion or Event()
+        # Funcion url -> prioridad (mayor = antes); sin ella se respeta el orden de llegada
+        self.prioridad = prioridad or (lambda url: 0)
+        self.drenando = False
+        self.en_curso = 0
+    
+    def drenar(self):
+        """Deja de admitir trabajo nuevo; lo que esta en curso termina normalmente"""
+        self.drenando = True
+    
+    def cancelar(self):
+        """Drena y ademas aborta las descargas en curso"""
+        self.drenando = True
+        self.cancelacion.set()
+    
+    async def _esperar(self, segundos):
+        """Duerme 'segundos' o hasta que empiece el drenaje; devuelve False si se interrumpio"""
+        limite = time.monotonic() + segundos
+        while not self.drenando:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return True
+            await asyncio.sleep(min(restante, 0.5))
+        return False
+    
+    async def ejecutar(self, elementos, descargar, convertir=None, max_conversiones=1, compartir=None):
+        """
+        Ejecuta el pipeline sobre cada elemento con concurrencia acotada por etapa.
+        
+        :param elementos: Iterable (posiblemente un generador) de URLs
+        :param descargar: Corrutina (elemento, numero, trabajo=None) -> TrabajoDescarga (etapa de red);
+                          en un reintento recibe el trabajo que fallo
+        :param convertir: Corrutina opcional TrabajoDescarga -> TrabajoDescarga (etapa de conversion)
+        :param max_conversiones: Conversiones simultaneas
+        :param compartir: Funcion opcional (elemento, numero) -> corrutina que espera el resultado
+                          de un trabajo identico ya en curso, o None si hay que descargarlo. La
+                          espera no ocupa trabajador ni hueco de concurrencia: el trabajo en curso
+                          puede necesitarlos para sus reintentos
+        :return: Generador asincrono de trabajos, en orden de finalizacion
+        """
+        loop = asyncio.get_running_loop()
+        cola = asyncio.PriorityQueue(maxsize=self.tamano_cola)
+        conversiones = asyncio.Queue(maxsize=max_conversiones * 2)
+        terminados = asyncio.Queue()
+        disyuntor = self.reintentos.disyuntor
+        # Elementos admitidos cuya etapa de red no ha terminado (incluye reintentos en espera)
+        pendientes = 0
+        entrada_agotada = False
+        sin_pendientes = asyncio.Event()
+        
+        def completar():
+            nonlocal pendientes
+            pendientes -= 1
+            if entrada_agotada and pendientes == 0:
+                sin_pendientes.set()
+        
+        def en_cola(*elemento):
+            # Mayor prioridad primero; a igual prioridad, el numero de llegada desempata
+            return (-self.prioridad(elemento[0]), elemento[1]), elemento
+        
+        async def productor():
+            nonlocal pendientes, entrada_agotada
+            iterador = iter(elementos)
+            numero = 0
+            try:
+                while not self.drenando:
+                    lote = await loop.run_in_executor(None, _siguiente_lote, iterador, self.max_concurrent)
+                    if not lote:
+                        break
+                    for elemento in lote:
+                        numero += 1
+                        pendientes += 1
+                        await cola.put(en_cola(elemento, numero))
+            finally:
+                entrada_agotada = True
+                if pendientes == 0:
+                    sin_pendientes.set()
+        
+        async def esperar_compartido(espera):
+            # Fuera de los trabajadores, como los reintentos
+            trabajo = await espera
+            completar()
+            await terminados.put(trabajo)
+        
+        async def reintentar(elemento, trabajo, espera):
+            # Espera fuera de los trabajadores: el resto del lote sigue avanzando
+            if await self._esperar(espera):
+                await cola.put(en_cola(elemento[0], elemento[1], trabajo))
+            else:
+                # Drenaje durante la espera: el trabajo termina con su ultimo error
+                completar()
+                await terminados.put(trabajo)
+        
+        async def aplazar(elemento, espera):
+            # Host en pausa: el elemento espera fuera de los trabajadores y vuelve a la cola,
+            # asi los trabajos de otros hosts siguen avanzando
+            if await self._esperar(espera):
+                await cola.put(en_cola(*elemento))
+            else:
+                # Drenaje durante la espera: se descarta como lo no iniciado
+                completar()
+                if len(elemento) > 2:
+                    await terminados.put(elemento[2])
+        
+        async def trabajador_red():
+            while True:
+                _, elemento = await cola.get()
+                if elemento is self._FIN:
+                    break
+                host = disyuntor.host_de(elemento[0])
+                await self.controlador.adquirir()
+                if self.drenando or self.cancelacion.is_set():
+                    # Encolado pero no iniciado: se descarta (queda pendiente en el diario)
+                    await self.controlador.liberar()
+                    completar()
+                    if len(elemento) > 2:
+                        # Reintento no iniciado: cuenta con su ultimo error
+                        await terminados.put(elemento[2])
+                    continue
+                espera = compartir(*elemento) if compartir is not None and len(elemento) == 2 else None
+                if espera is not None:
+                    # Identico a uno en curso: devolver el hueco y esperar su resultado aparte
+                    await self.controlador.liberar()
+                    tareas.append(asyncio.ensure_future(esperar_compartido(espera)))
+                    continue
+                espera, permiso = disyuntor.permiso(host)
+                if espera > 0:
+                    # Circuito abierto (o con su descarga de prueba en curso): devolver el hueco
+                    await self.controlador.liberar()
+                    tareas.append(asyncio.ensure_future(aplazar(elemento, espera)))
+                    continue
+                self.en_curso += 1
+                trabajo = None
+                try:
+                    trabajo = await descargar(*elemento)
+                finally:
+                    self.en_curso -= 1
+                    await self.controlador.liberar(trabajo)
+                    # Sin resultado propio (cancelada o compartida) solo se libera la descarga de prueba
+                    valido = trabajo is not None and not trabajo.compartido_con and not self.cancelacion.is_set()
+                    disyuntor.registrar(host, permiso, disyuntor.resultado_de(trabajo) if valido else None)
+                if not self.drenando and self.reintentos.debe_reintentar(trabajo):
+                    espera = self.reintentos.programar(trabajo)
+                    tareas.append(asyncio.ensure_future(reintentar(elemento, trabajo, espera)))
+                    continue
+                completar()
+                if convertir is not None and trabajo.ruta_origen is not None:
+                    # La cola acotada frena la red si la conversion se queda atras
+                    await conversiones.put(trabajo)
+                else:
+                    await terminados.put(trabajo)
+        
+        async def trabajador_conversion():
+            while True:
+                trabajo = await conversiones.get()
+                if trabajo is self._FIN:
+                    break
+                if not self.cancelacion.is_set():
+                    # Con cancelacion el original queda en staging para --resume
+                    self.en_curso += 1
+                    try:
+                        trabajo = await convertir(trabajo)
+                    finally:
+                        self.en_curso -= 1
+                await terminados.put(trabajo)
+        
+        async def supervisar(red, conversion):
+            # Los trabajadores de red terminan cuando no queda entrada ni reintentos pendientes
+            await sin_pendientes.wait()
+            for i in range(len(red)):
+                await cola.put(((math.inf, i), self._FIN))
+            await asyncio.gather(*red, return_exceptions=True)
+            for _ in conversion:
+                await conversiones.put(self._FIN)
+            await asyncio.gather(*conversion, return_exceptions=True)
+            await terminados.put(self._FIN)
+        
+        red = [asyncio.ensure_future(trabajador_red()) for _ in range(self.max_concurrent)]
+        conversion = []
+        if convertir is not None:
+            conversion = [asyncio.ensure_future(trabajador_conversion()) for _ in range(max_conversiones)]
+        tareas = [asyncio.ensure_future(productor())] + red + conversion
+        tareas.append(asyncio.ensure_future(supervisar(red, conversion)))
+        
+        try:
+            while True:
+                trabajo = await terminados.get()
+                if trabajo is self._FIN:
+                    break
+                yield trabajo
+        finally:
+            # Si el consumidor abandona o se cancela, abortar todo lo pendiente
+            if any(not tarea.done() for tarea in tareas):
+                self.cancelar()
+                for tarea in tareas:
+                    tarea.cancel()
+                await asyncio.gather(*tareas, return_exceptions=True)
+
+def _instalar_manejador_interrupcion(planificador):
+    """
+    Instala un manejador de Ctrl-C para el planificador: la primera pulsacion
+    drena el lote, la segunda cancela las descargas en curso y la tercera
+    interrumpe el programa.
+    
+    :return: Manejador anterior (para restaurarlo) o None si no se instalo
+    """
+    if current_thread() is not main_thread():
+        return None
+    loop = asyncio.get_running_loop()
+    pulsaciones = 0
+    
+    def drenar():
+        planificador.drenar()
+        thread_safe_print(f"\n[PAUSE] Terminando las {planificador.en_curso} descargas en curso "
+                          f"(Ctrl-C otra vez para cancelarlas)...")
+        log_info("Interrupcion del usuario: drenando el lote")
+    
+    def cancelar():
+        planificador.cancelar()
+        thread_safe_print(f"\n[PAUSE] Cancelando las descargas en curso...")
+        log_info("Interrupcion del usuario: cancelando descargas en curso")
+    
+    def manejador(signum, frame):
+        # Se ejecuta en el hilo del bucle, quiza con print_lock tomado: no imprimir aqui,
+        # solo programar el trabajo para cuando el bucle recupere el control
+        nonlocal pulsaciones
+        pulsaciones += 1
+        if pulsaciones == 1:
+            loop.call_soon_threadsafe(drenar)
+        elif pulsaciones == 2:
+            loop.call_soon_threadsafe(cancelar)
+        else:
+            raise KeyboardInterrupt
+    
+    return signal.signal(signal.SIGINT, manejador)
+
+async def procesar_urls_async(urls, output_dir, max_concurrent=3, cache=None, indice=None,
+                              diario=None, max_conversiones=None, min_concurrent=None, politica=None,
+                              informe=None, reintentos=None, al_terminar=None, cancelacion=None, almacen=None,
+                              limitador=None, prioridades=None):
+    """
+    Procesa multiples URLs de forma asincrona con un limite de concurrencia.
+    
+    Las URLs se consumen de forma perezosa a traves de una cola acotada, de
+    modo que las descargas empiezan en cuanto se lee la primera URL valida y
+    la memoria no depende del tamano del CSV. La descarga (red) y la
+    conversion con FFmpeg (CPU) se ejecutan en pools independientes, y los
+    resultados se procesan a medida que cada URL termina. Si el mismo video
+    llega dos veces mientras el primero sigue en curso, el segundo espera y
+    comparte su resultado en lugar de descargarlo de nuevo. Los errores
+    transitorios se reintentan segun 'reintentos' sin frenar al resto del lote.
+    Las URLs con prioridad se despachan antes y, con 'limitador', reciben una
+    parte mayor del ancho de banda.
+    
+    :param urls: Iterable de URLs a procesar (lista o generador)
+    :param output_dir: Directorio de salida
+    :param max_concurrent: Numero maximo de descargas simultaneas (default: 3)
+    :param cache: CacheMetadatos opcional compartido por todas las descargas
+    :param indice: IndiceDescargas opcional del directorio de salida
+    :param diario: DiarioLote opcional para poder reanudar el lote
+    :param max_conversiones: Conversiones FFmpeg simultaneas (default: numero de CPUs)
+    :param min_concurrent: Minimo de descargas simultaneas; si es menor que max_concurrent
+                           la concurrencia se ajusta dinamicamente (AIMD)
+    :param politica: PoliticaSalida opcional (formato de salida y copia sin recodificar)
+    :param informe: InformeEjecucion opcional donde anotar las metricas de cada URL
+    :param reintentos: PoliticaReintentos opcional (por defecto, 3 reintentos con circuit breaker)
+    :param al_terminar: Funcion opcional llamada con cada TrabajoDescarga al terminar (exito o fallo)
+    :param cancelacion: threading.Event opcional; si se activa se abortan las descargas en curso
+    :param almacen: AlmacenSalida opcional (staging, sharding y admision por espacio libre)
+    :param limitador: LimitadorAncho opcional compartido por todas las descargas (--limit-rate)
+    :param prioridades: Dict opcional clave del video -> prioridad (ver iterar_urls_csv); puede
+                        rellenarse mientras se leen las URLs
+    :return: Tuple (exitosos, fallidos, interrumpido)
+    """
+    exitosos = 0
+    fallidos = 0
+    max_conversiones = max_conversiones or os.cpu_count() or 1
+    min_concurrent = min(min_concurrent or max_concurrent, max_concurrent)
+    loop = asyncio.get_running_loop()
+    inicial = max_concurrent if min_concurrent == max_concurrent else None
+    controlador = ControladorConcurrencia(min_concurrent, max_concurrent, inicial)
+    reintentos = reintentos or PoliticaReintentos()
+    prioridades = {} if prioridades is None else prioridades
+    planificador = PlanificadorDescargas(max_concurrent, controlador=controlador, reintentos=reintentos,
+                                         cancelacion=cancelacion,
+                                         prioridad=lambda url: prioridades.get(clave_video(url), 0))
+    # Un unico renderizador dibuja el progreso de todas las descargas
+    progreso = PanelProgreso()
+    progreso.limitador = limitador
+    contexto = ContextoDescarga(output_dir, cache, indice, diario, planificador.cancelacion, almacen,
+                                politica=politica, progreso=progreso, limitador=limitador)
+    
+    if controlador.adaptativo:
+        thread_safe_print(f"[START] Procesamiento asincrono: {min_concurrent}-{max_concurrent} descargas "
+                          f"(adaptativo), {max_conversiones} conversiones")
+    else:
+        thread_safe_print(f"[START] Procesamiento asincrono: max {max_concurrent} descargas, "
+                          f"{max_conversiones} conversiones")
+    log_info(f"Iniciando procesamiento asincrono con hasta {max_concurrent} descargas y "
+             f"{max_conversiones} conversiones simultaneas")
+    
+    # Pools independientes: hilos de red y subprocesos de FFmpeg (uno por hilo de conversion)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='red') as red, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_conversiones,
+                                                  thread_name_prefix='ffmpeg') as conversion:
+        
+        # Trabajos en curso por clave de video: (trabajo lider, futuro con su resultado final)
+        en_vuelo = {}
+        
+        def crear_trabajo(url, numero):
+            trabajo = TrabajoDescarga(url, f"T{numero:02d}")
+            trabajo.prioridad = prioridades.get(trabajo.clave, 0)
+            log_info(f"Creando tarea {trabajo.url_id} para: {url}"
+                     f"{f' (prioridad {trabajo.prioridad})' if trabajo.prioridad else ''}")
+            return trabajo
+        
+        def compartir(url, numero):
+            # Mismo video ya en curso: esperar su resultado (ver PlanificadorDescargas.ejecutar)
+            if clave_video(url) not in en_vuelo:
+                return None
+            return esperar_lider(crear_trabajo(url, numero))
+        
+        async def esperar_lider(trabajo):
+            lider, futuro = en_vuelo[trabajo.clave]
+            log_info(f"[{trabajo.url_id}] Mismo video que {lider.url_id}, se comparte su resultado")
+            trabajo.compartir_resultado(await asyncio.shield(futuro))
+            if trabajo.exito:
+                contexto.marcar(trabajo, 'done', archivo=trabajo.archivo)
+            return trabajo
+        
+        async def descargar(url, numero, trabajo=None):
+            if trabajo is not None:
+                # Reintento de un fallo transitorio: metadatos frescos por si las URLs caducaron
+                log_info(f"[{trabajo.url_id}] Reintento {trabajo.reintentos} de: {url}")
+                trabajo.error = None
+                if contexto.cache and trabajo.video_id:
+                    contexto.cache.invalidar(trabajo.video_id)
+                return await ejecutar_red(trabajo)
+            trabajo = crear_trabajo(url, numero)
+            en_vuelo[trabajo.clave] = (trabajo, loop.create_future())
+            contexto.marcar(trabajo, 'queued')
+            return await ejecutar_red(trabajo)
+        
+        async def ejecutar_red(trabajo):
+            try:
+                # Ejecutar la descarga en un hilo separado con animacion
+                await loop.run_in_executor(red, descargar_audio_original, trabajo, contexto, True)
+            except Exception as e:
+                trabajo.error = str(e)
+                log_error(f"[{trabajo.url_id}] Error procesando {trabajo.url}: {trabajo.error}")
+            if reintentos.debe_reintentar(trabajo):
+                progreso.actualizar(trabajo.url_id, f'esperando reintento {trabajo.reintentos + 1}')
+            return trabajo
+        
+        async def convertir(trabajo):
+            try:
+                await loop.run_in_executor(conversion, convertir_audio, trabajo, contexto)
+            except Exception as e:
+                trabajo.error = str(e)
+                log_error(f"[{trabajo.url_id}] Error convirtiendo {trabajo.url}: {trabajo.error}")
+            return trabajo
+        
+        manejador_anterior = _instalar_manejador_interrupcion(planificador)
+        progreso.start()
+        thread_safe_print(f"[PROCESS] Ejecutando tareas en paralelo a medida que se leen las URLs...")
+        try:
+            async for trabajo in planificador.ejecutar(urls, descargar, convertir, max_conversiones, compartir):
+                lider, futuro = en_vuelo.get(trabajo.clave, (None, None))
+                if lider is trabajo:
+                    del en_vuelo[trabajo.clave]
+                    futuro.set_result(trabajo)
+                progreso.terminar(trabajo.url_id, trabajo.exito or (False if trabajo.error else None))
+                # Un trabajo cancelado antes de convertirse no llega a liberar su reserva de espacio
+                contexto.almacen.liberar(trabajo)
+                prioridades.pop(trabajo.clave, None)
+                reintentos.registrar(trabajo)
+                if informe:
+                    informe.registrar(trabajo)
+                if al_terminar:
+                    al_terminar(trabajo)
+                if trabajo.exito:
+                    exitosos += 1
+                    # Solo mostrar el resultado final, los detalles van al log
+                    log_info(f"{trabajo.url_id} - Exito: {trabajo.url}")
+                elif not planificador.cancelacion.is_set():
+                    # Los errores ya se loggearon en la funcion individual
+                    fallidos += 1
+                    thread_safe_print(f"[FAIL] [{trabajo.url_id}] Fallo: {trabajo.url}")
+        finally:
+            progreso.stop()
+            if manejador_anterior is not None:
+                signal.signal(signal.SIGINT, manejador_anterior)
+    
+    # Los hilos de red ya terminaron: cerrar sus sesiones de yt-dlp
+    sesiones = contexto.cerrar()
+    log_info(f"Sesiones de yt-dlp creadas: {sesiones} para {exitosos + fallidos} URLs")
+    
+    if reintentos.programados:
+        log_info(f"Reintentos: {reintentos.resumen()}")
+    if controlador.adaptativo:
+        thread_safe_print(f"[STATS] Concurrencia adaptativa: limite final {controlador.limite}, "
+                          f"maximo alcanzado {controlador.limite_alcanzado}, {controlador.ajustes} ajustes")
+    if planificador.drenando:
+        log_info("Procesamiento interrumpido por el usuario")
+    return exitosos, fallidos, planificador.drenando
+
+# Puerto por defecto del modo 'serve' (solo escucha en localhost salvo que se indique --host)
+PUERTO_SERVIDOR = 8765
+
+class LoteServidor:
+    """Lote enviado al servidor (URLs sueltas o un CSV) con sus resultados a medida que terminan"""
+    
+    def __init__(self, lote_id, origen):
+        self.id = lote_id
+        self.origen = origen
+        self.creado = datetime.now().isoformat(timespec='seconds')
+        self.urls = iter(())
+        self.enviadas = 0  # URLs entregadas al pipeline
+        self.lectura_terminada = False
+        self.terminado_en = None
+        self.error = None  # Error leyendo el CSV
+        self.omitidas = {'existentes': 0, 'completadas': 0, 'duplicadas': 0}
+        self.resultados = []
+        self.exitosos = 0
+        self.fallidos = 0
+    
+    @property
+    def terminado(self):
+        return self.terminado_en is not None
+    
+    def como_dict(self, desde=None):
+        """
+        Estado del lote para la API.
+        
+        :param desde: Si se indica, incluye los resultados a partir de esa posicion
+        """
+        datos = {
+            'id': self.id,
+            'origen': self.origen,
+            'creado': self.creado,
+            'estado': 'terminado' if self.terminado else 'en curso',
+            'enviadas': self.enviadas,
+            'exitosos': self.exitosos,
+            'fallidos': self.fallidos,
+            'omitidas': dict(self.omitidas),
+            'error': self.error,
+        }
+        if desde is not None:
+            datos['desde'] = desde
+            datos['resultados'] = self.resultados[desde:]
+        return datos
+
+class ServidorDescargas:
+    """
+    Modo servidor: un unico pipeline de descargas de larga duracion (sesiones
+    de yt-dlp, cache y pools ya calientes) que recibe lotes por una API HTTP
+    local.
+    
+    El propio servidor es la fuente de URLs del pipeline (ver _siguiente_lote):
+    reparte turnos entre los lotes activos, de modo que un CSV grande no
+    retrasa a una URL suelta enviada despues, y asocia cada resultado a su lote.
+    """
+    
+    # Lotes terminados que se conservan para consultar su resultado
+    MAX_LOTES_TERMINADOS = 100
+    
+    def __init__(self, output_dir, omitir_existentes=False, verificar_checksums=False, expandir_listas=False,
+                 **opciones):
+        """
+        :param output_dir: Directorio de salida
+        :param omitir_existentes: Omitir los videos del indice que siguen intactos (--skip-existing)
+        :param verificar_checksums: Recalcular el checksum de los archivos del indice
+        :param expandir_listas: Expandir listas y canales (--expand-playlists)
+        :param opciones: Parametros adicionales de procesar_urls_async
+        """
+        self.output_dir = output_dir
+        self.omitir_existentes = omitir_existentes
+        self.verificar_checksums = verificar_checksums
+        self.expandir_listas = expandir_listas
+        self.opciones = opciones
+        self.lotes = {}             # id -> LoteServidor, en orden de llegada
+        self.activos = deque()      # Lotes con URLs por leer (turno rotatorio)
+        self.asignaciones = {}      # url -> lotes que esperan su resultado
+        self.prioridades = {}       # clave del video -> prioridad (columna del CSV)
+        self.cancelacion = Event()
+        self.cerrado = False
+        self.error = None
+        self.inicio = datetime.now().isoformat(timespec='seconds')
+        self._condicion = threading.Condition()
+        self._contador = itertools.count(1)
+        self._terminado = Event()
+    
+    # Fuente de URLs del pipeline
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        urls = self.siguiente_lote(1)
+        if not urls:
+            raise StopIteration
+        return urls[0]
+    
+    def siguiente_lote(self, tamano):
+        """
+        Espera a que haya URLs pendientes y devuelve hasta 'tamano', una de cada lote activo por turno.
+        
+        :return: Lista de URLs; vacia cuando el servidor se detiene
+        """
+        urls = []
+        while len(urls) < tamano:
+            with self._condicion:
+                # Solo se espera si todavia no hay nada que entregar
+                while not self.activos and not self.cerrado and not urls:
+                    self._condicion.wait()
+                if self.cerrado or not self.activos:
+                    return urls
+                lote = self.activos.popleft()
+            # Leer fuera del lock: el CSV o la expansion de listas pueden tardar
+            url = self._leer(lote)
+            with self._condicion:
+                if url is None:
+                    lote.lectura_terminada = True
+                    self._comprobar_fin(lote)
+                    continue
+                lote.enviadas += 1
+                self.activos.append(lote)
+                self.asignaciones.setdefault(url, deque()).append(lote)
+            urls.append(url)
+        return urls
+    
+    def _leer(self, lote):
+        """Siguiente URL de un lote o None si se acabo (o fallo la lectura del CSV)"""
+        try:
+            return next(lote.urls, None)
+        except (OSError, UnicodeError, csv.Error) as e:
+            lote.error = str(e)
+            log_error(f"[{lote.id}] Error leyendo {lote.origen}: {e}")
+            return None
+    
+    def _comprobar_fin(self, lote):
+        """Marca el lote como terminado si ya no quedan URLs por leer ni resultados pendientes (con el lock)"""
+        if lote.terminado or not lote.lectura_terminada or len(lote.resultados) < lote.enviadas:
+            return
+        lote.terminado_en = datetime.now().isoformat(timespec='seconds')
+        self._condicion.notify_all()
+        omitidas = sum(lote.omitidas.values())
+        thread_safe_print(f"[SUCCESS] Lote {lote.id} terminado: {lote.exitosos} exitosos, {lote.fallidos} fallidos"
+                          f"{f', {omitidas} omitidas' if omitidas else ''}")
+        # Olvidar los lotes terminados mas antiguos
+        terminados = [lote_id for lote_id, otro in self.lotes.items() if otro.terminado]
+        for lote_id in terminados[:-self.MAX_LOTES_TERMINADOS]:
+            del self.lotes[lote_id]
+    
+    def enviar(self, urls=None, archivo_csv=None, seccion=None):
+        """
+        Admite un lote nuevo.
+        
+        :param urls: Lista de URLs
+        :param archivo_csv: Ruta de un CSV legible por el servidor (alternativa a 'urls')
+        :param seccion: Lista [inicio, fin] en segundos (fin puede ser None) con la seccion por
+                        defecto del lote (--start/--end del cliente)
+        :return: LoteServidor creado
+        :raises ValueError: Si la peticion no es valida
+        :raises RuntimeError: Si el servidor se esta deteniendo
+        """
+        if seccion is not None:
+            numeros = (int, float)
+            if (not isinstance(seccion, list) or len(seccion) != 2 or not isinstance(seccion[0], numeros)
+                    or not isinstance(seccion[1], numeros + (type(None),)) or seccion[0] < 0
+                    or (seccion[1] is not None and seccion[1] <= seccion[0])):
+                raise ValueError("'seccion' debe ser [inicio, fin] en segundos, con fin posterior al inicio o null")
+            seccion = (float(seccion[0]), float(seccion[1]) if seccion[1] is not None else None)
+        if archivo_csv:
+            if not os.path.isfile(archivo_csv):
+                raise ValueError(f"No se encontro el archivo CSV: {archivo_csv}")
+            fuente = iterar_urls_csv(archivo_csv, self.prioridades, seccion)
+            origen = archivo_csv
+        elif isinstance(urls, list) and urls:
+            invalidas = [url for url in urls if not isinstance(url, str) or not es_url_valida(url.strip())]
+            if invalidas:
+                raise ValueError(f"URLs invalidas: {', '.join(map(str, invalidas[:5]))}")
+            fuente = [url_con_seccion(url_sin_seccion(url.strip()), *seccion) if seccion else url.strip()
+                      for url in urls]
+            origen = urls[0] if len(urls) == 1 else f"{len(urls)} URLs"
+        else:
+            raise ValueError("Se necesita 'urls' (lista de URLs) o 'csv' (ruta de un CSV)")
+        if self.expandir_listas:
+            fuente = expandir_listas(fuente)
+        
+        with self._condicion:
+            if self.cerrado:
+                raise RuntimeError(self.error or "El servidor se esta deteniendo")
+            lote = LoteServidor(f"L{next(self._contador):04d}", origen)
+            indice = self.opciones.get('indice') if self.omitir_existentes else None
+            lote.urls = filtrar_urls(fuente, lote.omitidas, indice, self.verificar_checksums)
+            self.lotes[lote.id] = lote
+            self.activos.append(lote)
+            self._condicion.notify_all()
+        thread_safe_print(f"[PROCESS] Lote {lote.id} recibido: {origen}")
+        return lote
+    
+    def _al_terminar(self, trabajo):
+        """Anota el resultado final de una URL en el lote que la envio"""
+        with self._condicion:
+            pendientes = self.asignaciones.get(trabajo.url)
+            if not pendientes:
+                return
+            lote = pendientes.popleft()
+            if not pendientes:
+                del self.asignaciones[trabajo.url]
+            if trabajo.exito:
+                lote.exitosos += 1
+                estado = 'done'
+            else:
+                lote.fallidos += 1
+                estado = 'failed' if trabajo.error else 'cancelled'
+            lote.resultados.append({
+                'url': trabajo.url,
+                'url_id': trabajo.url_id,
+                'estado': estado,
+                'archivo': trabajo.archivo,
+                'error': trabajo.error,
+                'reintentos': trabajo.reintentos,
+            })
+            self._condicion.notify_all()
+            self._comprobar_fin(lote)
+    
+    def esperar_resultados(self, lote_id, desde=0, espera=0.0):
+        """
+        Estado de un lote, esperando hasta 'espera' segundos a que haya resultados nuevos (long polling).
+        
+        :return: Dict del lote (ver LoteServidor.como_dict) o None si no existe
+        """
+        limite = time.monotonic() + espera
+        with self._condicion:
+            lote = self.lotes.get(lote_id)
+            if lote is None:
+                return None
+            while len(lote.resultados) <= desde and not lote.terminado and not self.cerrado:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicion.wait(restante)
+            return lote.como_dict(desde)
+    
+    def estado(self):
+        """Resumen del servidor para GET /status"""
+        with self._condicion:
+            lotes = list(self.lotes.values())
+            return {
+                'activo_desde': self.inicio,
+                'detenido': self.cerrado,
+                'error': self.error,
+                'lotes': len(lotes),
+                'lotes_en_curso': sum(1 for lote in lotes if not lote.terminado),
+                'urls_en_curso': sum(lote.enviadas - len(lote.resultados) for lote in lotes),
+                'exitosos': sum(lote.exitosos for lote in lotes),
+                'fallidos': sum(lote.fallidos for lote in lotes),
+            }
+    
+    def _ejecutar(self):
+        try:
+            asyncio.run(procesar_urls_async(self, self.output_dir, al_terminar=self._al_terminar,
+                                            cancelacion=self.cancelacion, prioridades=self.prioridades,
+                                            **self.opciones))
+        except Exception as e:
+            self.error = f"El pipeline de descargas se detuvo: {e}"
+            log_error(self.error)
+        finally:
+            with self._condicion:
+                self.cerrado = True
+                self._condicion.notify_all()
+            self._terminado.set()
+    
+    def iniciar(self):
+        """Arranca el pipeline en un hilo propio"""
+        Thread(target=self._ejecutar, name='pipeline', daemon=True).start()
+        return self
+    
+    def detener(self, cancelar=False):
+        """
+        Deja de admitir lotes y de leer URLs nuevas; lo que esta en curso termina.
+        
+        :param cancelar: Abortar tambien las descargas en curso
+        """
+        with self._condicion:
+            self.cerrado = True
+            self.activos.clear()
+            self._condicion.notify_all()
+        if cancelar:
+            self.cancelacion.set()
+    
+    def esperar_fin(self, timeout=None):
+        """Espera a que termine el pipeline; devuelve True si termino"""
+        # Un Event y no Thread.join: en Python < 3.12 un Ctrl-C durante join() deja el hilo marcado como terminado
+        return self._terminado.wait(timeout)
+    
+    def crear_servidor_http(self, host='127.0.0.1', puerto=PUERTO_SERVIDOR):
+        """
+        Crea el servidor HTTP de la API (sin autenticacion: pensado para localhost).
+        
+        POST /jobs           {"urls": [...]} o {"csv": "ruta"}, y opcionalmente "seccion": [inicio, fin]
+                             -> lote creado
+        GET  /jobs           Lotes conocidos
+        GET  /jobs/<id>      Estado y resultados (?desde=N&espera=S para esperar resultados nuevos)
+        GET  /status         Resumen del servidor
+        """
+        # Importacion diferida: solo el modo servidor necesita http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        servidor = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def _responder(self, codigo, datos):
+                cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+            
+            def do_GET(self):
+                partes = urlsplit(self.path)
+                ruta = partes.path.rstrip('/')
+                consulta = parse_qs(partes.query)
+                if ruta == '/status':
+                    self._responder(200, servidor.estado())
+                elif ruta == '/jobs':
+                    with servidor._condicion:
+                        lotes = [lote.como_dict() for lote in servidor.lotes.values()]
+                    self._responder(200, {'lotes': lotes})
+                elif ruta.startswith('/jobs/'):
+                    try:
+                        desde = max(0, int(consulta.get('desde', ['0'])[0]))
+                        espera = min(max(0.0, float(consulta.get('espera', ['0'])[0])), 60.0)
+                    except ValueError:
+                        self._responder(400, {'error': "'desde' y 'espera' deben ser numeros"})
+                        return
+                    datos = servidor.esperar_resultados(ruta[len('/jobs/'):], desde, espera)
+                    if datos is None:
+                        self._responder(404, {'error': 'Lote no encontrado'})
+                    else:
+                        self._responder(200, datos)
+                else:
+                    self._responder(404, {'error': 'Ruta no encontrada'})
+            
+            def do_POST(self):
+                if urlsplit(self.path).path.rstrip('/') != '/jobs':
+                    self._responder(404, {'error': 'Ruta no encontrada'})
+                    return
+                try:
+                    longitud = int(self.headers.get('Content-Length') or 0)
+                    peticion = json.loads(self.rfile.read(longitud) or b'{}')
+                    if not isinstance(peticion, dict):
+                        raise ValueError("Se esperaba un objeto JSON")
+                    lote = servidor.enviar(peticion.get('urls'), peticion.get('csv'), peticion.get('seccion'))
+                except ValueError as e:
+                    self._responder(400, {'error': str(e)})
+                except RuntimeError as e:
+                    self._responder(503, {'error': str(e)})
+                else:
+                    self._responder(202, lote.como_dict())
+            
+            def log_message(self, format, *args):
+                log_info(f"HTTP {self.address_string()} {format % args}")
+        
+        http = ThreadingHTTPServer((host, puerto), Handler)
+        http.daemon_threads = True
+        return http
+
+def servir(args, politica, reintentos, indice, cache=None, informe=None, almacen=None, limitador=None):
+    """
+    Modo 'serve': mantiene el pipeline en marcha y atiende la API HTTP hasta Ctrl-C.
+    
+    La primera pulsacion de Ctrl-C deja de admitir lotes y termina las
+    descargas en curso; la segunda las cancela.
+    
+    :return: Codigo de salida
+    """
+    max_concurrent = max(1, args.max_concurrency)
+    servidor = ServidorDescargas(
+        args.output_dir, args.skip_existing, args.verify_checksums, args.expand_playlists,
+        max_concurrent=max_concurrent, cache=cache, indice=indice, max_conversiones=args.transcode_workers,
+        min_concurrent=max(1, min(args.min_concurrency, max_concurrent)), politica=politica,
+        informe=informe, reintentos=reintentos, almacen=almacen, limitador=limitador,
+    )
+    try:
+        http = servidor.crear_servidor_http(args.host, args.port)
+    except OSError as e:
+        safe_print(f"[ERROR] No se pudo escuchar en {args.host}:{args.port}: {e}")
+        return 1
+    
+    servidor.iniciar()
+    host, puerto = http.server_address[:2]
+    safe_print(f"[START] Servidor de descargas en http://{host}:{puerto} (Ctrl-C para detener)")
+    safe_print(f"[INFO] Enviar un CSV: python descargar_audio.py urls.csv --server http://{host}:{puerto}")
+    log_info(f"Modo servidor escuchando en {host}:{puerto}")
+    try:
+        http.serve_forever()
+    except KeyboardInterrupt:
+        safe_print(f"\n[PAUSE] Deteniendo el servidor: terminando las descargas en curso "
+                   f"(Ctrl-C otra vez para cancelarlas)...")
+    finally:
+        http.server_close()
+    
+    detener_ordenadamente(servidor)
+    estado = servidor.estado()
+    safe_print(f"[STATS] Servidor detenido: {estado['lotes']} lotes, {estado['exitosos']} exitosos, "
+               f"{estado['fallidos']} fallidos")
+    log_info("Modo servidor detenido")
+    return 1 if servidor.error else 0
+
+def enviar_a_servidor(url_servidor, archivo_csv, seccion=None, espera=25):
+    """
+    Cliente ligero del modo 'serve': envia el CSV a un servidor en marcha y
+    muestra los resultados a medida que terminan (sin importar yt-dlp).
+    
+    :param url_servidor: URL base del servidor (p. ej. http://127.0.0.1:8765)
+    :param archivo_csv: CSV a procesar (el servidor lo lee desde su ruta absoluta)
+    :param seccion: Seccion (inicio, fin) por defecto de --start/--end, que aplica el servidor
+    :param espera: Segundos maximos de cada consulta de resultados (long polling)
+    :return: Codigo de salida
+    """
+    import urllib.request
+    import urllib.error
+    base = url_servidor.rstrip('/')
+    
+    def peticion(metodo, ruta, datos=None, timeout=30):
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+        solicitud = urllib.request.Request(base + ruta, data=cuerpo, method=metodo,
+                                           headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(solicitud, timeout=timeout) as respuesta:
+                return json.load(respuesta)
+        except urllib.error.HTTPError as e:
+            try:
+                mensaje = json.load(e).get('error')
+            except ValueError:
+                mensaje = None
+            raise RuntimeError(mensaje or f"HTTP {e.code}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise RuntimeError(f"No se pudo conectar con el servidor {base}: {getattr(e, 'reason', e)}") from e
+    
+    if not os.path.isfile(archivo_csv):
+        safe_print(f"[ERROR] No se pudo encontrar el archivo: {archivo_csv}")
+        return 1
+    try:
+        datos = {'csv': os.path.abspath(archivo_csv)}
+        if seccion:
+            datos['seccion'] = list(seccion)
+        lote = peticion('POST', '/jobs', datos)
+    except RuntimeError as e:
+        safe_print(f"[ERROR] {e}")
+        return 1
+    safe_print(f"[PROCESS] Lote {lote['id']} enviado a {base}")
+    
+    desde = 0
+    try:
+        while True:
+            datos = peticion('GET', f"/jobs/{lote['id']}?desde={desde}&espera={espera}", timeout=espera + 30)
+            for resultado in datos['resultados']:
+                if resultado['estado'] == 'done':
+                    safe_print(f"[SUCCESS] {resultado['url']} -> {resultado['archivo']}")
+                else:
+                    safe_print(f"[FAIL] {resultado['url']}: {resultado['error'] or resultado['estado']}")
+            desde += len(datos['resultados'])
+            if datos['estado'] == 'terminado':
+                break
+    except KeyboardInterrupt:
+        safe_print(f"\n[INFO] El lote {lote['id']} sigue en el servidor: {base}/jobs/{lote['id']}")
+        return 1
+    except RuntimeError as e:
+        safe_print(f"[ERROR] {e}")
+        return 1
+    
+    if datos['error']:
+        safe_print(f"[ERROR] Error leyendo el CSV en el servidor: {datos['error']}")
+    omitidas = sum(datos['omitidas'].values())
+    safe_print(f"[STATS] Lote {datos['id']}: {datos['exitosos']} exitosos, {datos['fallidos']} fallidos"
+               f"{f', {omitidas} omitidas' if omitidas else ''}")
+    if datos['fallidos'] == 0 and not datos['error']:
+        return 0
+    return 0 if datos['exitosos'] > 0 else 1
+
+# Segundos que dura el arriendo de una URL de la cola distribuida. El trabajador
+# lo renueva cada tercio de ese tiempo, asi que es lo que tarda en volver a la
+# cola el trabajo de un trabajador caido
+ARRIENDO_COLA = 60.0
+# Arriendos sin resultado tras los que una URL se da por fallida (p. ej. si tumba al trabajador)
+MAX_ARRIENDOS = 3
+# Ventana (segundos) del ritmo que muestra 'status'
+VENTANA_RITMO = 60.0
+
+def resultado_cola(url, estado, trabajador, archivo=None, error=None, reintentos=0, bytes_descargados=0):
+    """Resultado final de una URL tal como se guarda en la cola distribuida"""
+    return {
+        'url': url,
+        'estado': estado,
+        'archivo': archivo,
+        'error': error,
+        'reintentos': reintentos,
+        'bytes': bytes_descargados,
+        'trabajador': trabajador,
+        'fin': time.time(),
+    }
+
+def resultado_abandonado(url, arriendos):
+    """Resultado de una URL cuyos arriendos caducaron una y otra vez sin resultado"""
+    return resultado_cola(url, 'failed', None,
+                          error=f"Abandonada tras {arriendos} arriendos sin resultado (el trabajador se detuvo o cayo)")
+
+class ColaSQLite:
+    """
+    Cola de trabajos distribuida en un archivo SQLite, pensada para un volumen
+    compartido por varias maquinas.
+    
+    Cada URL (por clave de video, ver clave_video) pasa por 'queued' ->
+    'leased' -> 'done'/'failed'. Un arriendo caduca si su trabajador deja de
+    renovarlo y la URL vuelve a estar disponible para otro. La exclusion mutua
+    la da el bloqueo de archivo de SQLite (BEGIN IMMEDIATE); no se usa WAL
+    porque necesita memoria compartida y no funciona en volumenes de red.
+    """
+    
+    def __init__(self, ruta):
+        self.ruta = os.path.abspath(ruta)
+        self.descripcion = f"sqlite:///{self.ruta.lstrip('/')}"
+        self._lock = Lock()
+        Path(os.path.dirname(self.ruta)).mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.ruta, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._transaccion() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS trabajos ('
+                'clave TEXT PRIMARY KEY, url TEXT NOT NULL, estado TEXT NOT NULL DEFAULT \'queued\', '
+                'trabajador TEXT, arriendo_hasta REAL, intentos INTEGER NOT NULL DEFAULT 0, '
+                'fin REAL, bytes INTEGER, resultado TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_estado ON trabajos (estado)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_fin ON trabajos (fin)')
+            conn.execute('CREATE TABLE IF NOT EXISTS trabajadores (nombre TEXT PRIMARY KEY, datos TEXT NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor REAL)')
+    
+    @contextlib.contextmanager
+    def _transaccion(self):
+        """Transaccion que toma el bloqueo de escritura desde el principio (sin interbloqueos entre procesos)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+    
+    def encolar(self, urls):
+        """
+        Anade URLs a la cola; las que ya estaban (por clave de video) se ignoran.
+        
+        :return: Numero de URLs nuevas
+        """
+        urls = [normalizar_url(url) for url in urls]
+        filas = [(clave_video(url), url) for url in urls]
+        with self._transaccion() as conn:
+            antes = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO trabajos (clave, url) VALUES (?, ?)', filas)
+            return conn.total_changes - antes
+    
+    def arrendar(self, trabajador, cantidad, duracion):
+        """
+        Arrienda hasta 'cantidad' URLs: primero las de arriendos caducados, luego por orden de llegada.
+        
+        :return: Lista de (clave, url)
+        """
+        ahora = time.time()
+        arrendadas = []
+        with self._transaccion() as conn:
+            conn.execute('INSERT OR IGNORE INTO meta VALUES (\'inicio\', ?)', (ahora,))
+            filas = conn.execute(
+                'SELECT clave, url, intentos FROM trabajos WHERE estado = \'leased\' AND arriendo_hasta < ? '
+                'ORDER BY rowid LIMIT ?', (ahora, cantidad)
+            ).fetchall()
+            filas += conn.execute(
+                'SELECT clave, url, intentos FROM trabajos WHERE estado = \'queued\' ORDER BY rowid LIMIT ?',
+                (cantidad - len(filas),)
+            ).fetchall()
+            for clave, url, intentos in filas:
+                if intentos >= MAX_ARRIENDOS:
+                    resultado = resultado_abandonado(url, intentos)
+                    log_warning(f"{url}: {resultado['error']}")
+                    conn.execute(
+                        'UPDATE trabajos SET estado = \'failed\', fin = ?, bytes = 0, resultado = ? WHERE clave = ?',
+                        (resultado['fin'], json.dumps(resultado, ensure_ascii=False), clave)
+                    )
+                    continue
+                conn.execute(
+                    'UPDATE trabajos SET estado = \'leased\', trabajador = ?, arriendo_hasta = ?, '
+                    'intentos = intentos + 1 WHERE clave = ?', (trabajador, ahora + duracion, clave)
+                )
+                arrendadas.append((clave, url))
+        return arrendadas
+    
+    def renovar(self, trabajador, claves, duracion):
+        """
+        Prolonga los arriendos del trabajador.
+        
+        :return: Claves cuyo arriendo ya no es suyo (caduco y lo tomo otro, o ya tiene resultado)
+        """
+        perdidas = []
+        with self._transaccion() as conn:
+            for clave in claves:
+                cursor = conn.execute(
+                    'UPDATE trabajos SET arriendo_hasta = ? WHERE clave = ? AND trabajador = ? '
+                    'AND estado = \'leased\'', (time.time() + duracion, clave, trabajador)
+                )
+                if cursor.rowcount == 0:
+                    perdidas.append(clave)
+        return perdidas
+    
+    def completar(self, clave, trabajador, resultado):
+        """
+        Escribe el resultado final de una URL (gana el primero si dos trabajadores la procesaron).
+        
+        :return: True si se guardo, False si ya tenia resultado
+        """
+        with self._transaccion() as conn:
+            cursor = conn.execute(
+                'UPDATE trabajos SET estado = ?, trabajador = ?, arriendo_hasta = NULL, fin = ?, bytes = ?, '
+                'resultado = ? WHERE clave = ? AND estado IN (\'queued\', \'leased\')',
+                (resultado['estado'], trabajador, resultado['fin'], resultado['bytes'],
+                 json.dumps(resultado, ensure_ascii=False), clave)
+            )
+            return cursor.rowcount == 1
+    
+    def liberar(self, trabajador, claves):
+        """Devuelve a la cola URLs arrendadas que no se llegaron a procesar (no cuentan como intento)"""
+        with self._transaccion() as conn:
+            conn.executemany(
+                'UPDATE trabajos SET estado = \'queued\', trabajador = NULL, arriendo_hasta = NULL, '
+                'intentos = MAX(intentos - 1, 0) WHERE clave = ? AND trabajador = ? AND estado = \'leased\'',
+                [(clave, trabajador) for clave in claves]
+            )
+    
+    def registrar_trabajador(self, nombre, datos):
+        """Publica el estado de un trabajador (lo muestra 'status')"""
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO trabajadores VALUES (?, ?)',
+                               (nombre, json.dumps(datos, ensure_ascii=False)))
+    
+    def pendientes(self):
+        """URLs sin resultado (en cola o arrendadas)"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM trabajos WHERE estado IN (\'queued\', \'leased\')'
+            ).fetchone()[0]
+    
+    def estado(self, ventana=VENTANA_RITMO):
+        """
+        Resumen de la cola para 'status'.
+        
+        :param ventana: Segundos hacia atras en los que se cuentan las URLs terminadas (ritmo)
+        """
+        with self._lock:
+            por_estado = dict(self._conn.execute('SELECT estado, COUNT(*) FROM trabajos GROUP BY estado'))
+            recientes, bytes_recientes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM trabajos WHERE fin >= ?', (time.time() - ventana,)
+            ).fetchone()
+            inicio = self._conn.execute('SELECT valor FROM meta WHERE clave = \'inicio\'').fetchone()
+            trabajadores = {nombre: json.loads(datos)
+                            for nombre, datos in self._conn.execute('SELECT nombre, datos FROM trabajadores')}
+        return {
+            'total': sum(por_estado.values()),
+            'en_cola': por_estado.get('queued', 0),
+            'en_curso': por_estado.get('leased', 0),
+            'exitosos': por_estado.get('done', 0),
+            'fallidos': por_estado.get('failed', 0),
+            'recientes': recientes,
+            'bytes_recientes': bytes_recientes,
+            'inicio': inicio[0] if inicio else None,
+            'trabajadores': trabajadores,
+        }
+    
+    def cerrar(self):
+        """Cierra la conexion a la base de datos"""
+        with self._lock:
+            self._conn.close()
+
+class ErrorRESP(RuntimeError):
+    """Error devuelto por el servidor RESP (respuesta '-ERR ...')"""
+
+class ClienteRESP:
+    """
+    Cliente minimo del protocolo de Redis (RESP2) sin dependencias: un socket
+    por cliente y pipelining (varios comandos por ida y vuelta).
+    """
+    
+    def __init__(self, host='127.0.0.1', puerto=6379, db=0, password=None, timeout=30):
+        self.host = host
+        self.puerto = puerto
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._lock = Lock()
+        self._socket = None
+        self._lector = None
+    
+    def _conectar(self):
+        self._socket = socket.create_connection((self.host, self.puerto), self.timeout)
+        self._lector = self._socket.makefile('rb')
+        iniciales = []
+        if self.password:
+            iniciales.append(('AUTH', self.password))
+        if self.db:
+            iniciales.append(('SELECT', self.db))
+        self._enviar(iniciales)
+    
+    def _desconectar(self):
+        if self._socket is not None:
+            with contextlib.suppress(OSError):
+                self._lector.close()
+                self._socket.close()
+        self._socket = self._lector = None
+    
+    @staticmethod
+    def _codificar(comando):
+        partes = [b'*%d\r\n' % len(comando)]
+        for argumento in comando:
+            dato = argumento if isinstance(argumento, bytes) else str(argumento).encode('utf-8')
+            partes.append(b'$%d\r\n%s\r\n' % (len(dato), dato))
+        return b''.join(partes)
+    
+    def _leer(self):
+        linea = self._lector.readline()
+        if not linea.endswith(b'\r\n'):
+            raise ConnectionError('Conexion cerrada por el servidor RESP')
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b'+':
+            return resto.decode('utf-8')
+        if tipo == b'-':
+            # Se devuelve en lugar de lanzarse para no desincronizar el resto del pipeline
+            return ErrorRESP(resto.decode('utf-8'))
+        if tipo == b':':
+            return int(resto)
+        if tipo == b'$':
+            longitud = int(resto)
+            return None if longitud < 0 else self._lector.read(longitud + 2)[:-2].decode('utf-8')
+        if tipo == b'*':
+            longitud = int(resto)
+            return None if longitud < 0 else [self._leer() for _ in range(longitud)]
+        raise ConnectionError(f"Respuesta RESP no valida: {linea[:50]!r}")
+    
+    def _enviar(self, comandos):
+        self._socket.sendall(b''.join(self._codificar(comando) for comando in comandos))
+        respuestas = [self._leer() for _ in comandos]
+        for respuesta in respuestas:
+            if isinstance(respuesta, ErrorRESP):
+                raise respuesta
+        return respuestas
+    
+    def pipeline(self, comandos):
+        """
+        Envia varios comandos de una vez y devuelve sus respuestas en orden.
+        
+        Si la conexion falla se cierra y se lanza el error; la siguiente llamada
+        reconecta (no se reenvia nada: INCR o HINCRBY no son idempotentes).
+        """
+        if not comandos:
+            return []
+        with self._lock:
+            try:
+                if self._socket is None:
+                    self._conectar()
+                return self._enviar(comandos)
+            except OSError:
+                self._desconectar()
+                raise
+    
+    def comando(self, *argumentos):
+        return self.pipeline([argumentos])[0]
+    
+    def cerrar(self):
+        with self._lock:
+            self._desconectar()
+
+class ColaRESP:
+    """
+    Cola de trabajos distribuida en un servidor con protocolo de Redis.
+    
+    Claves (bajo un prefijo, por defecto 'y2m'):
+      urls              hash clave -> URL (todas las encoladas; evita duplicados)
+      pendientes        zset de claves sin resultado, por orden de llegada
+      arriendo:<clave>  trabajador que la tiene arrendada (SET NX PX: caduca sola)
+      intentos          hash clave -> arriendos
+      resultados        hash clave -> resultado JSON; 'fin' es un zset clave -> epoch
+      exitosos, fallidos, orden, inicio   contadores
+      trabajadores      hash nombre -> estado JSON
+    Si un trabajador cae su arriendo caduca y la URL vuelve a estar disponible
+    sin que nadie tenga que recogerla. Solo usa comandos basicos (sin scripts
+    Lua), de modo que sirve cualquier servidor compatible.
+    """
+    
+    # Claves pendientes que se examinan por consulta al buscar URLs sin arrendar
+    VENTANA = 200
+    
+    def __init__(self, cliente, prefijo='y2m'):
+        self.cliente = cliente
+        self.prefijo = prefijo
+        self.descripcion = f"redis://{cliente.host}:{cliente.puerto}/{cliente.db} ({prefijo})"
+        self.cliente.comando('PING')
+    
+    def _k(self, *partes):
+        return ':'.join((self.prefijo,) + partes)
+    
+    def encolar(self, urls):
+        """
+        Anade URLs a la cola; las que ya estaban (por clave de video) se ignoran.
+        
+        :return: Numero de URLs nuevas
+        """
+        urls = [normalizar_url(url) for url in urls]
+        claves = [clave_video(url) for url in urls]
+        respuestas = self.cliente.pipeline([('HSETNX', self._k('urls'), clave, url)
+                                            for clave, url in zip(claves, urls)])
+        nuevas = [clave for clave, nueva in zip(claves, respuestas) if nueva == 1]
+        if nuevas:
+            ultimo = self.cliente.comando('INCRBY', self._k('orden'), len(nuevas))
+            self.cliente.pipeline([('ZADD', self._k('pendientes'), 'NX', ultimo - len(nuevas) + i, clave)
+                                   for i, clave in enumerate(nuevas, 1)])
+        return len(nuevas)
+    
+    def arrendar(self, trabajador, cantidad, duracion):
+        """
+        Arrienda hasta 'cantidad' URLs pendientes por orden de llegada (incluidas las de arriendos caducados).
+        
+        :return: Lista de (clave, url)
+        """
+        self.cliente.comando('SET', self._k('inicio'), time.time(), 'NX')
+        milisegundos = int(duracion * 1000)
+        arrendadas = []
+        desde = 0
+        while len(arrendadas) < cantidad:
+            candidatas = self.cliente.comando('ZRANGE', self._k('pendientes'), desde, desde + self.VENTANA - 1)
+            if not candidatas:
+                break
+            desde += len(candidatas)
+            while candidatas and len(arrendadas) < cantidad:
+                faltan = cantidad - len(arrendadas)
+                grupo, candidatas = candidatas[:faltan], candidatas[faltan:]
+                respuestas = self.cliente.pipeline([('SET', self._k('arriendo', clave), trabajador, 'NX',
+                                                     'PX', milisegundos) for clave in grupo])
+                ganadas = [clave for clave, respuesta in zip(grupo, respuestas) if respuesta == 'OK']
+                if not ganadas:
+                    continue
+                respuestas = self.cliente.pipeline(
+                    [('HINCRBY', self._k('intentos'), clave, 1) for clave in ganadas]
+                    + [('HGET', self._k('urls'), clave) for clave in ganadas]
+                    + [('HEXISTS', self._k('resultados'), clave) for clave in ganadas]
+                )
+                n = len(ganadas)
+                for clave, intentos, url, terminada in zip(ganadas, respuestas[:n], respuestas[n:2 * n],
+                                                           respuestas[2 * n:]):
+                    if terminada or url is None:
+                        # Termino entre ZRANGE y SET
+                        self.cliente.comando('DEL', self._k('arriendo', clave))
+                    elif intentos > MAX_ARRIENDOS:
+                        resultado = resultado_abandonado(url, intentos - 1)
+                        log_warning(f"{url}: {resultado['error']}")
+                        self.completar(clave, None, resultado)
+                    else:
+                        arrendadas.append((clave, url))
+        return arrendadas
+    
+    def _propias(self, trabajador, claves):
+        respuestas = self.cliente.pipeline([('GET', self._k('arriendo', clave)) for clave in claves])
+        return [clave for clave, respuesta in zip(claves, respuestas) if respuesta == trabajador]
+    
+    def renovar(self, trabajador, claves, duracion):
+        """
+        Prolonga los arriendos del trabajador.
+        
+        :return: Claves cuyo arriendo ya no es suyo (caduco y lo tomo otro, o ya tiene resultado)
+        """
+        propias = self._propias(trabajador, claves)
+        self.cliente.pipeline([('PEXPIRE', self._k('arriendo', clave), int(duracion * 1000)) for clave in propias])
+        return [clave for clave in claves if clave not in set(propias)]
+    
+    def completar(self, clave, trabajador, resultado):
+        """
+        Escribe el resultado final de una URL (gana el primero si dos trabajadores la procesaron).
+        
+        :return: True si se guardo, False si ya tenia resultado
+        """
+        eliminada, _ = self.cliente.pipeline([('ZREM', self._k('pendientes'), clave),
+                                              ('DEL', self._k('arriendo', clave))])
+        if not eliminada:
+            return False
+        self.cliente.pipeline([
+            ('HSET', self._k('resultados'), clave, json.dumps(resultado, ensure_ascii=False)),
+            ('ZADD', self._k('fin'), resultado['fin'], clave),
+            ('INCR', self._k('exitosos' if resultado['estado'] == 'done' else 'fallidos')),
+        ])
+        return True
+    
+    def liberar(self, trabajador, claves):
+        """Devuelve a la cola URLs arrendadas que no se llegaron a procesar (no cuentan como intento)"""
+        comandos = []
+        for clave in self._propias(trabajador, claves):
+            comandos += [('DEL', self._k('arriendo', clave)), ('HINCRBY', self._k('intentos'), clave, -1)]
+        self.cliente.pipeline(comandos)
+    
+    def registrar_trabajador(self, nombre, datos):
+        """Publica el estado de un trabajador (lo muestra 'status')"""
+        self.cliente.comando('HSET', self._k('trabajadores'), nombre, json.dumps(datos, ensure_ascii=False))
+    
+    def pendientes(self):
+        """URLs sin resultado (en cola o arrendadas)"""
+        return self.cliente.comando('ZCARD', self._k('pendientes'))
+    
+    def estado(self, ventana=VENTANA_RITMO):
+        """
+        Resumen de la cola para 'status'. Las URLs en curso son las que declaran
+        los trabajadores con latido reciente (no se recorren las claves de arriendo).
+        
+        :param ventana: Segundos hacia atras en los que se cuentan las URLs terminadas (ritmo)
+        """
+        ahora = time.time()
+        total, pendientes, exitosos, fallidos, inicio, trabajadores, recientes = self.cliente.pipeline([
+            ('HLEN', self._k('urls')),
+            ('ZCARD', self._k('pendientes')),
+            ('GET', self._k('exitosos')),
+            ('GET', self._k('fallidos')),
+            ('GET', self._k('inicio')),
+            ('HGETALL', self._k('trabajadores')),
+            ('ZRANGEBYSCORE', self._k('fin'), ahora - ventana, '+inf'),
+        ])
+        bytes_recientes = 0
+        if recientes:
+            for resultado in self.cliente.comando('HMGET', self._k('resultados'), *recientes):
+                bytes_recientes += json.loads(resultado)['bytes'] if resultado else 0
+        trabajadores = {trabajadores[i]: json.loads(trabajadores[i + 1]) for i in range(0, len(trabajadores), 2)}
+        en_curso = min(pendientes, sum(datos['en_curso'] for datos in trabajadores.values()
+                                       if datos['estado'] == 'activo' and ahora - datos['latido'] <= datos['arriendo']))
+        return {
+            'total': total,
+            'en_cola': pendientes - en_curso,
+            'en_curso': en_curso,
+            'exitosos': int(exitosos or 0),
+            'fallidos': int(fallidos or 0),
+            'recientes': len(recientes),
+            'bytes_recientes': bytes_recientes,
+            'inicio': float(inicio) if inicio else None,
+            'trabajadores': trabajadores,
+        }
+    
+    def cerrar(self):
+        self.cliente.cerrar()
+
+def abrir_cola(destino):
+    """
+    Abre la cola distribuida de --queue.
+    
+    :param destino: redis://[:password@]host[:puerto][/db][?prefix=y2m], sqlite:///ruta/cola.db
+                    o directamente la ruta de un archivo SQLite
+    :return: ColaRESP o ColaSQLite
+    :raises ValueError: Si el destino no es valido
+    """
+    partes = urlsplit(destino)
+    if partes.scheme == 'redis':
+        db = partes.path.strip('/') or '0'
+        if not db.isdigit():
+            raise ValueError(f"Base de datos no valida en {destino}: {db}")
+        prefijo = parse_qs(partes.query).get('prefix', ['y2m'])[0]
+        cliente = ClienteRESP(partes.hostname or '127.0.0.1', partes.port or 6379, int(db), partes.password)
+        return ColaRESP(cliente, prefijo)
+    if partes.scheme == 'sqlite':
+        # sqlite:///ruta/absoluta o sqlite://ruta/relativa
+        ruta = destino[len('sqlite://'):]
+        if re.match(r'^/[A-Za-z]:', ruta):  # sqlite:///C:/ruta en Windows
+            ruta = ruta[1:]
+        return ColaSQLite(ruta)
+    if len(partes.scheme) > 1:  # 'C:\...' en Windows tiene esquema de una letra
+        raise ValueError(f"Cola no reconocida: {destino} (se espera redis://... o sqlite:///...)")
+    return ColaSQLite(destino)
+
+class TrabajadorCola:
+    """
+    Modo 'worker': arrienda URLs de la cola distribuida, las pasa por el
+    pipeline local (procesar_urls_async) y escribe cada resultado en la cola.
+    
+    Como ServidorDescargas, es la fuente de URLs del pipeline. Un hilo de
+    latidos renueva los arriendos de todo lo que tiene (tambien lo que espera
+    en las colas locales), publica el estado del trabajador y escribe los
+    resultados, de modo que el bucle de eventos nunca espera a la cola.
+    Solo arrienda lo que puede empezar (como mucho max_concurrent URLs sin
+    terminar), de modo que no acapara trabajo que otro trabajador podria hacer.
+    Termina cuando la cola no tiene nada pendiente en ningun trabajador.
+    """
+    
+    # Segundos entre consultas cuando todo lo pendiente esta arrendado por otros trabajadores
+    ESPERA_COLA = 2.0
+    
+    def __init__(self, cola, nombre, output_dir, arriendo=ARRIENDO_COLA, omitir_existentes=False,
+                 verificar_checksums=False, **opciones):
+        """
+        :param cola: ColaSQLite o ColaRESP (ver abrir_cola)
+        :param nombre: Nombre unico del trabajador en la flota
+        :param output_dir: Directorio de salida
+        :param arriendo: Segundos de cada arriendo (se renueva cada tercio)
+        :param omitir_existentes: No descargar los videos del indice local que siguen intactos
+        :param verificar_checksums: Recalcular el checksum de los archivos del indice
+        :param opciones: Parametros adicionales de procesar_urls_async
+        """
+        self.cola = cola
+        self.nombre = nombre
+        self.output_dir = output_dir
+        self.arriendo = arriendo
+        self.omitir_existentes = omitir_existentes
+        self.verificar_checksums = verificar_checksums
+        self.opciones = opciones
+        self.arrendadas = {}  # clave -> URL arrendada cuyo resultado aun no esta en la cola
+        self.en_proceso = 0   # URLs entregadas al pipeline que aun no han terminado
+        self.max_en_proceso = opciones.get('max_concurrent', 3)
+        self.exitosos = 0
+        self.fallidos = 0
+        self.omitidas = 0
+        self.bytes = 0
+        self.cancelacion = Event()
+        self.error = None
+        self.inicio = time.time()
+        self._parada = Event()  # Dejar de arrendar URLs nuevas
+        self._resultados = queue.Queue()  # (clave, resultado) por escribir; None = fin
+        self._lock = Lock()
+        self._hueco = threading.Condition(self._lock)  # Avisa cuando termina una URL del pipeline
+        self._terminado = Event()
+        self._hilo_latidos = None
+    
+    # Fuente de URLs del pipeline
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        urls = self.siguiente_lote(1)
+        if not urls:
+            raise StopIteration
+        return urls[0]
+    
+    def siguiente_lote(self, tamano):
+        """
+        Arrienda hasta 'tamano' URLs, esperando si lo pendiente lo tienen otros trabajadores.
+        
+        :return: Lista de URLs; vacia cuando la cola se agota o el trabajador se detiene
+        """
+        indice = self.opciones.get('indice') if self.omitir_existentes else None
+        while not self._parada.is_set():
+            with self._hueco:
+                while self.en_proceso >= self.max_en_proceso and not self._parada.is_set():
+                    self._hueco.wait(0.5)
+                cantidad = min(tamano, self.max_en_proceso - self.en_proceso)
+            if cantidad <= 0:
+                break
+            try:
+                arrendadas = self.cola.arrendar(self.nombre, cantidad, self.arriendo)
+                if not arrendadas and self.cola.pendientes() == 0:
+                    return []
+            except (OSError, sqlite3.Error, RuntimeError) as e:
+                log_warning(f"[{self.nombre}] Cola no disponible: {e}")
+                arrendadas = []
+            urls = []
+            for clave, url in arrendadas:
+                with self._lock:
+                    self.arrendadas[clave] = url
+                existente = indice.verificar(clave, self.verificar_checksums) if indice else None
+                if existente:
+                    log_info(f"Omitido (ya descargado): {url} -> {existente}")
+                    with self._lock:
+                        self.omitidas += 1
+                    self._resultados.put((clave, resultado_cola(url, 'done', self.nombre, archivo=existente)))
+                else:
+                    urls.append(url)
+            if urls:
+                with self._lock:
+                    self.en_proceso += len(urls)
+                return urls
+            if not arrendadas:
+                self._parada.wait(self.ESPERA_COLA)
+        return []
+    
+    def _al_terminar(self, trabajo):
+        """Pasa el resultado final de una URL al hilo de latidos (las canceladas vuelven a la cola al final)"""
+        with self._hueco:
+            self.en_proceso -= 1
+            self._hueco.notify()
+        if not trabajo.exito and not trabajo.error:
+            return
+        with self._lock:
+            if trabajo.exito:
+                self.exitosos += 1
+                self.bytes += trabajo.bytes_descargados
+            else:
+                self.fallidos += 1
+        self._resultados.put((trabajo.clave, resultado_cola(
+            trabajo.url, 'done' if trabajo.exito else 'failed', self.nombre, trabajo.archivo, trabajo.error,
+            trabajo.reintentos, trabajo.bytes_descargados,
+        )))
+    
+    def datos(self, estado='activo'):
+        """Estado del trabajador que se publica en la cola"""
+        with self._lock:
+            return {
+                'host': socket.gethostname(),
+                'pid': os.getpid(),
+                'estado': estado,
+                'inicio': self.inicio,
+                'latido': time.time(),
+                'arriendo': self.arriendo,
+                'en_curso': len(self.arrendadas),
+                'exitosos': self.exitosos,
+                'fallidos': self.fallidos,
+                'omitidas': self.omitidas,
+                'bytes': self.bytes,
+            }
+    
+    def _renovar(self):
+        with self._lock:
+            claves = list(self.arrendadas)
+        for clave in self.cola.renovar(self.nombre, claves, self.arriendo) if claves else []:
+            with self._lock:
+                url = self.arrendadas.get(clave)
+            if url:
+                log_warning(f"[{self.nombre}] Arriendo perdido de {url}: otro trabajador puede repetirla")
+        self.cola.registrar_trabajador(self.nombre, self.datos())
+    
+    def _latir(self):
+        """Hilo de latidos: escribe los resultados, renueva los arriendos y publica el estado"""
+        intervalo = self.arriendo / 3
+        proximo = time.monotonic()
+        por_escribir = deque()
+        terminar = False
+        while True:
+            try:
+                elemento = self._resultados.get(timeout=max(0.0, proximo - time.monotonic()))
+                while True:
+                    if elemento is None:
+                        terminar = True
+                    else:
+                        por_escribir.append(elemento)
+                    elemento = self._resultados.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                while por_escribir:
+                    clave, resultado = por_escribir[0]
+                    if not self.cola.completar(clave, self.nombre, resultado):
+                        log_info(f"[{self.nombre}] Otro trabajador ya escribio el resultado de {resultado['url']}")
+                    with self._lock:
+                        self.arrendadas.pop(clave, None)
+                    por_escribir.popleft()
+                if terminar:
+                    break
+                if time.monotonic() >= proximo:
+                    self._renovar()
+                    proximo = time.monotonic() + intervalo
+            except (OSError, sqlite3.Error, RuntimeError) as e:
+                if terminar:
+                    log_error(f"[{self.nombre}] No se pudieron escribir {len(por_escribir)} resultados: {e}; "
+                              f"esas URLs volveran a la cola al caducar su arriendo")
+                    return
+                log_warning(f"[{self.nombre}] Error con la cola: {e}")
+                proximo = time.monotonic() + min(intervalo, 5.0)
+        
+        # Lo arrendado que no llego a procesarse (drenaje o cancelacion) vuelve a la cola
+        try:
+            with self._lock:
+                sobrantes = list(self.arrendadas)
+            if sobrantes:
+                self.cola.liberar(self.nombre, sobrantes)
+                log_info(f"[{self.nombre}] {len(sobrantes)} URLs devueltas a la cola")
+            self.cola.registrar_trabajador(self.nombre, self.datos('detenido'))
+        except (OSError, sqlite3.Error, RuntimeError) as e:
+            log_warning(f"[{self.nombre}] No se pudo liberar lo arrendado: {e}")
+    
+    def _ejecutar(self):
+        try:
+            asyncio.run(procesar_urls_async(self, self.output_dir, al_terminar=self._al_terminar,
+                                            cancelacion=self.cancelacion, **self.opciones))
+        except Exception as e:
+            self.error = f"El pipeline de descargas se detuvo: {e}"
+            log_error(self.error)
+        finally:
+            self._parada.set()
+            self._resultados.put(None)
+            self._hilo_latidos.join()
+            self._terminado.set()
+    
+    def iniciar(self):
+        """Arranca el hilo de latidos y el pipeline"""
+        self._hilo_latidos = Thread(target=self._latir, name='latidos', daemon=True)
+        self._hilo_latidos.start()
+        Thread(target=self._ejecutar, name='pipeline', daemon=True).start()
+        return self
+    
+    def detener(self, cancelar=False):
+        """
+        Deja de arrendar URLs; lo que esta en curso termina y lo demas vuelve a la cola.
+        
+        :param cancelar: Abortar tambien las descargas en curso
+        """
+        self._parada.set()
+        if cancelar:
+            self.cancelacion.set()
+    
+    def esperar_fin(self, timeout=None):
+        """Espera a que termine el pipeline; devuelve True si termino"""
+        # Event y no Thread.join (ver ServidorDescargas.esperar_fin)
+        return self._terminado.wait(timeout)
+
+def detener_ordenadamente(servicio):
+    """
+    Detiene un ServidorDescargas o TrabajadorCola esperando a las descargas en
+    curso; un Ctrl-C durante la espera las cancela.
+    """
+    try:
+        servicio.detener()
+        while not servicio.esperar_fin(0.5):
+            pass
+    except KeyboardInterrupt:
+        safe_print(f"\n[PAUSE] Cancelando las descargas en curso...")
+        servicio.detener(cancelar=True)
+        servicio.esperar_fin()
+
+def trabajar(args, politica, reintentos, indice, cache=None, informe=None, almacen=None, limitador=None):
+    """
+    Modo 'worker': procesa URLs de la cola distribuida (--queue) hasta que no quede nada pendiente.
+    
+    La primera pulsacion de Ctrl-C deja de arrendar URLs y termina las
+    descargas en curso (lo demas vuelve a la cola); la segunda las cancela.
+    
+    :return: Codigo de salida
+    """
+    try:
+        cola = abrir_cola(args.queue)
+    except (OSError, sqlite3.Error, ValueError, RuntimeError) as e:
+        safe_print(f"[ERROR] No se pudo abrir la cola {args.queue}: {e}")
+        return 1
+    nombre = args.worker_name or f"{socket.gethostname()}-{os.getpid()}"
+    max_concurrent = max(1, args.max_concurrency)
+    trabajador = TrabajadorCola(
+        cola, nombre, args.output_dir, max(1.0, args.lease), args.skip_existing, args.verify_checksums,
+        max_concurrent=max_concurrent, cache=cache, indice=indice, max_conversiones=args.transcode_workers,
+        min_concurrent=max(1, min(args.min_concurrency, max_concurrent)), politica=politica,
+        informe=informe, reintentos=reintentos, almacen=almacen, limitador=limitador,
+    )
+    trabajador.iniciar()
+    safe_print(f"[START] Trabajador {nombre} conectado a {cola.descripcion} (Ctrl-C para detener)")
+    log_info(f"Trabajador {nombre}: cola {cola.descripcion}, arriendos de {trabajador.arriendo:.0f}s")
+    try:
+        while not trabajador.esperar_fin(0.5):
+            pass
+    except KeyboardInterrupt:
+        safe_print(f"\n[PAUSE] Deteniendo el trabajador: terminando las descargas en curso "
+                   f"(Ctrl-C otra vez para cancelarlas)...")
+        detener_ordenadamente(trabajador)
+    cola.cerrar()
+    
+    safe_print(f"[STATS] Trabajador {nombre}: {trabajador.exitosos} exitosos, {trabajador.fallidos} fallidos"
+               f"{f', {trabajador.omitidas} omitidas' if trabajador.omitidas else ''}")
+    if reintentos.resumen():
+        safe_print(f"[STATS] Reintentos: {reintentos.resumen()}")
+    log_info(f"Trabajador {nombre} detenido")
+    if trabajador.error:
+        return 1
+    return 0 if trabajador.exitosos or not trabajador.fallidos else 1
+
+def encolar_csv(args, seccion=None):
+    """
+    Encola las URLs de un CSV en la cola distribuida (--queue) para que las procesen los trabajadores.
+    
+    :param seccion: Seccion (inicio, fin) por defecto de --start/--end (viaja en la URL encolada)
+    """
+    if not os.path.isfile(args.csv_file):
+        safe_print(f"[ERROR] No se pudo encontrar el archivo: {args.csv_file}")
+        return 1
+    try:
+        cola = abrir_cola(args.queue)
+    except (OSError, sqlite3.Error, ValueError, RuntimeError) as e:
+        safe_print(f"[ERROR] No se pudo abrir la cola {args.queue}: {e}")
+        return 1
+    
+    omitidas = {'existentes': 0, 'completadas': 0, 'duplicadas': 0}
+    urls = iterar_urls_csv(args.csv_file, seccion=seccion)
+    if args.expand_playlists:
+        urls = expandir_listas(urls)
+    urls = filtrar_urls(urls, omitidas)
+    leidas = nuevas = 0
+    try:
+        while True:
+            bloque = list(itertools.islice(urls, 500))
+            if not bloque:
+                break
+            leidas += len(bloque)
+            nuevas += cola.encolar(bloque)
+    except (OSError, UnicodeError, csv.Error, sqlite3.Error, RuntimeError) as e:
+        safe_print(f"[ERROR] Error encolando las URLs: {e}")
+        return 1
+    finally:
+        cola.cerrar()
+    
+    safe_print(f"[SUCCESS] {nuevas} URLs encoladas en {cola.descripcion}"
+               f"{f' ({leidas - nuevas} ya estaban en la cola)' if leidas > nuevas else ''}")
+    safe_print(f"[INFO] Trabajadores: python descargar_audio.py worker --queue {args.queue} -o <directorio>")
+    safe_print(f"[INFO] Progreso: python descargar_audio.py status --queue {args.queue}")
+    log_info(f"Encoladas {nuevas} de {leidas} URLs de {args.csv_file} en {cola.descripcion}")
+    return 0 if leidas else 1
+
+def imprimir_estado_cola(estado, descripcion, ventana=VENTANA_RITMO):
+    """Muestra el progreso de la flota: totales, ritmo reciente, tiempo restante y trabajadores"""
+    ahora = time.time()
+    terminadas = estado['exitosos'] + estado['fallidos']
+    porcentaje = terminadas / estado['total'] * 100 if estado['total'] else 0.0
+    safe_print(f"[STATS] {descripcion} - {datetime.now().strftime('%H:%M:%S')}")
+    safe_print(f"   URLs: {estado['total']} | terminadas {terminadas} ({estado['exitosos']} exitosas, "
+               f"{estado['fallidos']} fallidas) | en curso {estado['en_curso']} | en cola {estado['en_cola']} "
+               f"| {porcentaje:.1f}%")
+    
+    # Ritmo de la ultima ventana (o desde el primer arriendo si la cola es mas reciente)
+    ventana = min(ventana, ahora - estado['inicio']) if estado['inicio'] else 0
+    if ventana > 0 and estado['recientes']:
+        urls_por_segundo = estado['recientes'] / ventana
+        restantes = estado['en_cola'] + estado['en_curso']
+        eta = f" | restante estimado {formatear_duracion(restantes / urls_por_segundo)}" if restantes else ''
+        safe_print(f"   Ritmo (ultimos {ventana:.0f}s): {urls_por_segundo * 60:.1f} URLs/min, "
+                   f"{estado['bytes_recientes'] / ventana / 1e6:.2f} MB/s{eta}")
     
-    return exitosos, fallidos, resultados
+    if estado['trabajadores']:
+        safe_print(f"   {'Trabajador':<28}{'Estado':<12}{'En curso':>9}{'Exitosos':>10}{'Fallidos':>10}"
+                   f"{'MB':>10}{'Latido':>9}")
+    for nombre, datos in sorted(estado['trabajadores'].items()):
+        hace = ahora - datos['latido']
+        situacion = datos['estado']
+        if situacion == 'activo' and hace > datos['arriendo']:
+            situacion = 'sin latido'  # Caido: sus arriendos caducan y otro los retoma
+        safe_print(f"   {nombre:<28}{situacion:<12}{datos['en_curso']:>9}{datos['exitosos']:>10}"
+                   f"{datos['fallidos']:>10}{datos['bytes'] / 1e6:>10.1f}{formatear_duracion(hace):>9}")
+
+def mostrar_estado_cola(args):
+    """Modo 'status': progreso y ritmo de toda la flota; con --watch se repite hasta que la cola se vacia"""
+    try:
+        cola = abrir_cola(args.queue)
+    except (OSError, sqlite3.Error, ValueError, RuntimeError) as e:
+        safe_print(f"[ERROR] No se pudo abrir la cola {args.queue}: {e}")
+        return 1
+    try:
+        while True:
+            estado = cola.estado()
+            imprimir_estado_cola(estado, cola.descripcion)
+            if not args.watch or (estado['total'] and not estado['en_cola'] and not estado['en_curso']):
+                break
+            time.sleep(args.watch)
+            safe_print("")
+    except KeyboardInterrupt:
+        pass
+    except (OSError, sqlite3.Error, RuntimeError) as e:
+        safe_print(f"[ERROR] Error consultando la cola: {e}")
+        return 1
+    finally:
+        cola.cerrar()
+    return 0
 
 def main():
     """Función principal con manejo de argumentos mejorado"""
-    # Initialize logging for CLI usage
-    global log_file
-    log_file = setup_logging()
-    
     parser = argparse.ArgumentParser(
         description='Descarga audio de YouTube y lo convierte a MP3',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -447,7 +4370,205 @@ Ejemplos:
     )
     parser.add_argument(
         'csv_file',
-        help='Archivo CSV con URLs a procesar (una URL por fila)'
+        nargs='?',
+        help='Archivo CSV con URLs a procesar (una URL por fila). Con "serve" como primer argumento '
+             'se arranca el modo servidor; con "worker" o "status", un trabajador de la cola distribuida '
+             '(--queue) o el progreso de la flota'
+    )
+    parser.add_argument(
+        '--server',
+        default=None,
+        help='Enviar el CSV a un servidor en marcha ("serve") en esta URL, p. ej. http://127.0.0.1:8765, '
+             'y mostrar sus resultados'
+    )
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Modo servidor: direccion de escucha; la API no tiene autenticacion (por defecto: 127.0.0.1)'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=PUERTO_SERVIDOR,
+        help=f'Modo servidor: puerto de la API HTTP (por defecto: {PUERTO_SERVIDOR})'
+    )
+    parser.add_argument(
+        '--queue',
+        default=None,
+        help='Cola distribuida compartida por varios trabajadores: redis://host:6379/0 o '
+             'sqlite:///ruta/cola.db (en un volumen compartido). Con un CSV encola sus URLs y termina'
+    )
+    parser.add_argument(
+        '--lease',
+        type=float,
+        default=ARRIENDO_COLA,
+        help=f'Modo worker: segundos de arriendo de cada URL; se renueva mientras el trabajador vive y, '
+             f'si cae, la URL vuelve a la cola al caducar (por defecto: {ARRIENDO_COLA:.0f})'
+    )
+    parser.add_argument(
+        '--worker-name',
+        default=None,
+        help='Modo worker: nombre del trabajador en la flota (por defecto: <host>-<pid>)'
+    )
+    parser.add_argument(
+        '--watch',
+        type=float,
+        default=0,
+        help='Modo status: repetir cada N segundos hasta que la cola se vacie'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=os.environ.get('CACHE_DIR', os.path.join(Path.home(), '.cache', 'youtube2mp3')),
+        help='Directorio de la cache de metadatos (por defecto: ~/.cache/youtube2mp3)'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        default=6 * 3600,
+        help='Segundos de validez de cada entrada de la cache (por defecto: 21600)'
+    )
+    parser.add_argument(
+        '--cache-max-entries',
+        type=int,
+        default=5000,
+        help='Numero maximo de entradas en la cache antes de expulsar las menos usadas'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='No usar la cache de metadatos'
+    )
+    parser.add_argument(
+        '--skip-existing',
+        action='store_true',
+        help='Omitir los videos ya descargados segun el indice del directorio de salida'
+    )
+    parser.add_argument(
+        '--verify-checksums',
+        action='store_true',
+        help='Con --skip-existing, recalcular el checksum de cada archivo existente'
+    )
+    parser.add_argument(
+        '--journal',
+        default=None,
+        help=f'Diario del lote para poder reanudarlo (por defecto: <output-dir>/{DiarioLote.NOMBRE_ARCHIVO})'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Reanudar un lote interrumpido segun su diario (incluidas descargas .part parciales)'
+    )
+    parser.add_argument(
+        '--expand-playlists',
+        action='store_true',
+        help='Expandir las URLs de listas y canales en sus videos (extraccion plana y paginada)'
+    )
+    parser.add_argument(
+        '--max-concurrency',
+        type=int,
+        default=16,
+        help='Maximo de descargas simultaneas (por defecto: 16)'
+    )
+    parser.add_argument(
+        '--min-concurrency',
+        type=int,
+        default=1,
+        help='Minimo de descargas simultaneas; igual a --max-concurrency fija la concurrencia (por defecto: 1)'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=3,
+        help='Reintentos de una URL tras un error transitorio (429/403, 5xx, red) con espera '
+             'exponencial y jitter; 0 los desactiva (por defecto: 3)'
+    )
+    parser.add_argument(
+        '--retry-delay',
+        type=float,
+        default=2.0,
+        help='Espera base en segundos antes del primer reintento; se duplica en cada uno (por defecto: 2)'
+    )
+    parser.add_argument(
+        '--start',
+        default=None,
+        help='Descargar solo desde este instante (90, 1:30 o 1:02:03) las URLs sin seccion propia '
+             '(columnas "start"/"end" del CSV). Solo se descarga y convierte ese tramo; requiere FFmpeg'
+    )
+    parser.add_argument(
+        '--end',
+        default=None,
+        help='Descargar solo hasta este instante (ver --start)'
+    )
+    parser.add_argument(
+        '--limit-rate',
+        type=parsear_tasa,
+        default=None,
+        help='Ancho de banda maximo del proceso (total, no por descarga), p. ej. 500K o 4M. Se reparte entre '
+             'las descargas activas segun su prioridad (columna "priority" del CSV). No limita las '
+             'secciones (--start/--end), que descarga FFmpeg'
+    )
+    parser.add_argument(
+        '--transcode-workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Conversiones FFmpeg simultaneas (por defecto: numero de CPUs)'
+    )
+    parser.add_argument(
+        '--staging-dir',
+        default=None,
+        help='Directorio para los archivos intermedios (.part y salida de FFmpeg), p. ej. un SSD local o '
+             'tmpfs; el archivo terminado se mueve de forma atomica a la salida (por defecto: <output-dir>/.staging)'
+    )
+    parser.add_argument(
+        '--min-free-mb',
+        type=int,
+        default=AlmacenSalida.MARGEN_POR_DEFECTO // MB,
+        help='Espacio libre (MB) que se respeta en staging y en la salida. Antes de descargar se comprueba '
+             'que quepa el tamano esperado segun los metadatos; si no, se espera a que terminen otras descargas '
+             f'(por defecto: {AlmacenSalida.MARGEN_POR_DEFECTO // MB})'
+    )
+    parser.add_argument(
+        '--shard-levels',
+        type=int,
+        default=0,
+        help='Repartir los archivos en N niveles de subdirectorios segun el hash del ID del video '
+             '(ab/cd/...), para salidas con muchos miles de archivos (por defecto: 0, sin subdirectorios)'
+    )
+    parser.add_argument(
+        '--codec',
+        choices=PoliticaSalida.FORMATOS,
+        default=None,
+        help='Formato de salida: mp3 (por defecto), m4a, opus o best (conserva el codec original). '
+             'Si el audio descargado ya tiene ese codec se copia sin recodificar'
+    )
+    parser.add_argument(
+        '--no-transcode',
+        action='store_true',
+        help='No recodificar nunca: solo copiar el flujo de audio original (implica --codec best '
+             'si no se indica otro); falla si el audio no se puede guardar en el formato pedido'
+    )
+    parser.add_argument(
+        '--report',
+        default=None,
+        help='Guardar un informe de rendimiento (tiempos por fase, velocidades, p50/p95/p99) '
+             'en JSON o, si la ruta termina en .csv, en CSV'
+    )
+    parser.add_argument(
+        '--log-json',
+        action='store_true',
+        help='Escribir el log como lineas JSON (ts, level, thread, job, msg)'
+    )
+    parser.add_argument(
+        '--log-max-bytes',
+        type=int,
+        default=10 * 1024 * 1024,
+        help='Rotar el log al alcanzar este tamano en bytes; 0 desactiva la rotacion (por defecto: 10 MB)'
+    )
+    parser.add_argument(
+        '--log-backups',
+        type=int,
+        default=5,
+        help='Archivos de log rotados que se conservan (por defecto: 5)'
     )
     parser.add_argument(
         '--version',
@@ -455,86 +4576,242 @@ Ejemplos:
         version='YouTube to MP3 Downloader v1.2 (Async)'
     )
     
-    args = parser.parse_args()
+    argumentos = sys.argv[1:]
+    modo = argumentos[0] if argumentos[:1] and argumentos[0] in ('serve', 'worker', 'status') else None
+    args = parser.parse_args(argumentos[1:] if modo else argumentos)
+    if modo in ('worker', 'status') and not args.queue:
+        parser.error(f'"{modo}" necesita --queue')
+    if not modo and not args.csv_file:
+        parser.error('falta el archivo CSV (o "serve", "worker" o "status")')
+    
+    # Seccion por defecto (--start/--end) para las filas del CSV que no piden ninguna
+    seccion = None
+    if args.start or args.end:
+        try:
+            seccion = (parsear_tiempo(args.start) if args.start else 0.0,
+                       parsear_tiempo(args.end) if args.end else None)
+        except ValueError as e:
+            parser.error(str(e))
+        if seccion[1] is not None and seccion[1] <= seccion[0]:
+            parser.error('--end debe ser posterior a --start')
+    
+    # Initialize logging for CLI usage
+    global log_file
+    log_file = setup_logging(args.log_json, args.log_max_bytes, args.log_backups)
+    
+    # Cliente ligero: el servidor hace todo el trabajo
+    if args.server and not modo:
+        return enviar_a_servidor(args.server, args.csv_file, seccion)
+    
+    # Cola distribuida: encolar el CSV o consultar el progreso sin descargar nada aqui
+    if modo == 'status':
+        return mostrar_estado_cola(args)
+    if args.queue and not modo:
+        return encolar_csv(args, seccion)
     
     urls_a_procesar = []
     
     # Mostrar informacion del archivo de log
     thread_safe_print(f"[INFO] Log de la sesion: {log_file}")
     
+    # Formato de salida: copiar el audio original siempre que el formato lo permita
+    politica = PoliticaSalida(args.codec or ('best' if args.no_transcode else 'mp3'),
+                              transcodificar=not args.no_transcode)
+    
+    # Reintentos de errores transitorios y circuit breaker por host
+    reintentos = PoliticaReintentos(args.retries, args.retry_delay)
+    
+    # Staging, subdirectorios por hash y admision por espacio libre en disco
+    almacen = AlmacenSalida(args.output_dir, args.staging_dir, max(0, args.shard_levels),
+                            max(0, args.min_free_mb) * MB)
+    
+    # Limite de ancho de banda global, compartido por todas las descargas
+    limitador = LimitadorAncho(args.limit_rate) if args.limit_rate else None
+    
+    # Indice de descargas completadas en el directorio de salida
+    indice = IndiceDescargas(args.output_dir)
+    
+    def abrir_cache():
+        """Cache de metadatos compartida entre ejecuciones (None si esta desactivada o no se puede abrir)"""
+        if args.no_cache:
+            return None
+        try:
+            cache = CacheMetadatos(args.cache_dir, args.cache_ttl, args.cache_max_entries)
+            log_info(f"Cache de metadatos: {cache.ruta}")
+            return cache
+        except (OSError, sqlite3.Error) as e:
+            log_warning(f"No se pudo abrir la cache de metadatos: {e}")
+            return None
+    
+    if modo in ('serve', 'worker'):
+        informe = None
+        if args.report:
+            try:
+                informe = InformeEjecucion(args.report)
+            except OSError as e:
+                safe_print(f"[ERROR] No se pudo crear el informe {args.report}: {e}")
+                return 1
+        cache = abrir_cache()
+        codigo = (servir if modo == 'serve' else trabajar)(args, politica, reintentos, indice, cache, informe,
+                                                          almacen, limitador)
+        if informe:
+            informe.guardar()
+            safe_print(f"[INFO] Informe de rendimiento: {args.report}")
+        if cache:
+            cache.cerrar()
+        return codigo
+    
     # Modo CSV obligatorio: procesar multiples URLs desde archivo
     safe_print(f"[FOLDER] Procesando URLs desde archivo CSV: {args.csv_file}\n")
-    urls_a_procesar = leer_urls_csv(args.csv_file)
+    if not os.path.isfile(args.csv_file):
+        safe_print(f"[ERROR] No se pudo encontrar el archivo: {args.csv_file}")
+        return 1
     
-    if not urls_a_procesar:
+    # Diario del lote: permite reanudar tras una interrupcion
+    ruta_diario = args.journal or os.path.join(args.output_dir, DiarioLote.NOMBRE_ARCHIVO)
+    diario = DiarioLote(ruta_diario, reanudar=args.resume)
+    if args.resume:
+        completadas = sum(1 for estado in diario.estados.values() if estado == 'done')
+        safe_print(f"[PROCESS] Reanudando lote: {completadas} URL(s) ya completadas en el diario")
+        log_info(f"Reanudando lote desde {ruta_diario}")
+    
+    omitidas = {'existentes': 0, 'completadas': 0, 'duplicadas': 0}
+    
+    # Prioridades de la columna 'priority' del CSV (se rellena mientras se lee)
+    prioridades = {}
+    urls = iterar_urls_csv(args.csv_file, prioridades, seccion)
+    if args.expand_playlists:
+        urls = expandir_listas(urls)
+    
+    # Leer solo las primeras URLs para decidir la concurrencia; el resto se lee en streaming
+    urls_a_procesar = filtrar_urls(urls, omitidas, indice if args.skip_existing else None,
+                                   args.verify_checksums, diario if args.resume else None)
+    try:
+        muestra = list(itertools.islice(urls_a_procesar, 11))
+    except (OSError, UnicodeError, csv.Error) as e:
+        safe_print(f"[ERROR] Error leyendo el archivo CSV: {e}")
+        diario.cerrar()
+        return 1
+    
+    if not muestra:
+        diario.cerrar()
+        if any(omitidas.values()):
+            safe_print("\n[CELEBRATE] Todos los archivos ya estaban descargados!")
+            return 0
         safe_print("[ERROR] No se encontraron URLs validas en el archivo CSV.")
         return 1
     
-    # Procesar todas las URLs de forma asincrona
-    total_urls = len(urls_a_procesar)
-    
-    # Determinar automaticamente el numero de hilos basado en la cantidad de URLs
-    # Estrategia: un hilo por URL, con un maximo razonable para no sobrecargar el sistema
-    if total_urls == 1:
-        max_concurrent = 1
-    elif total_urls <= 5:
-        max_concurrent = total_urls  # Un hilo por URL para pocas URLs
-    elif total_urls <= 10:
-        max_concurrent = min(total_urls, 5)  # Hasta 5 hilos para 6-10 URLs
-    else:
-        max_concurrent = min(total_urls, 8)  # Hasta 8 hilos para mas de 10 URLs
+    # Informe de rendimiento opcional (--report)
+    informe = None
+    if args.report:
+        try:
+            informe = InformeEjecucion(args.report)
+        except OSError as e:
+            safe_print(f"[ERROR] No se pudo crear el informe {args.report}: {e}")
+            diario.cerrar()
+            return 1
+    
+    def guardar_informe():
+        """Escribe el informe (tambien si el lote se interrumpe); devuelve el resumen"""
+        if not informe:
+            return None
+        try:
+            resumen = informe.guardar()
+        except OSError as e:
+            log_error(f"No se pudo escribir el informe {args.report}: {e}")
+            return None
+        safe_print(f"[INFO] Informe de rendimiento: {args.report}")
+        return resumen
     
-    log_info(f"Determinacion automatica de hilos: {total_urls} URLs -> {max_concurrent} hilos")
+    # Cache de metadatos compartida entre ejecuciones
+    cache = abrir_cache()
+    
+    # La concurrencia se ajusta durante el lote (AIMD) entre --min y --max-concurrency;
+    # con pocas URLs no tiene sentido superar su numero
+    total_muestra = len(muestra)
+    max_concurrent = max(1, args.max_concurrency)
+    if total_muestra <= 10:
+        max_concurrent = min(max_concurrent, total_muestra)
+    min_concurrent = max(1, min(args.min_concurrency, max_concurrent))
+    
+    log_info(f"Concurrencia: {total_muestra}{'+' if total_muestra > 10 else ''} URLs -> "
+             f"entre {min_concurrent} y {max_concurrent} descargas simultaneas")
     
     # Decide si usar procesamiento asincrono o sincronico
-    usar_async = total_urls > 1 and max_concurrent > 1
+    usar_async = max_concurrent > 1
     
     if usar_async:
-        thread_safe_print(f"[INFO] Modo asincrono automatico: {max_concurrent} hilos para {total_urls} URL(s)")
+        thread_safe_print(f"[INFO] Modo asincrono automatico: hasta {max_concurrent} descargas simultaneas")
         try:
-            # Ejecutar el procesamiento asincrono
-            exitosos, fallidos, resultados = asyncio.run(
-                procesar_urls_async(urls_a_procesar, args.output_dir, max_concurrent)
+            # Ejecutar el procesamiento asincrono (la muestra ya leida va primero)
+            exitosos, fallidos, interrumpido = asyncio.run(
+                procesar_urls_async(itertools.chain(muestra, urls_a_procesar), args.output_dir,
+                                    max_concurrent, cache, indice, diario, args.transcode_workers,
+                                    min_concurrent, politica, informe, reintentos, almacen=almacen,
+                                    limitador=limitador, prioridades=prioridades)
             )
         except KeyboardInterrupt:
+            diario.cerrar()
+            guardar_informe()
             safe_print(f"\n[PAUSE] Procesamiento interrumpido por el usuario.")
+            safe_print(f"[INFO] Usa --resume para continuar el lote donde se quedo.")
             return 1
         except Exception as e:
+            diario.cerrar()
+            guardar_informe()
             error_msg = f"Error durante el procesamiento asincrono: {e}"
             log_error(error_msg)
             return 1
     else:
         # Procesamiento sincronico para URL unica o max_concurrent = 1
         thread_safe_print(f"[INFO] Modo sincronico")
+        # Un solo contexto para todo el lote: la sesion de yt-dlp se reutiliza entre URLs
+        contexto = ContextoDescarga(args.output_dir, cache, indice, diario, almacen=almacen, politica=politica,
+                                    limitador=limitador)
         exitosos = 0
         fallidos = 0
+        interrumpido = False
+        # Con mas de 10 URLs el resto del CSV se sigue leyendo en streaming y el total no se conoce
+        total_urls = len(muestra) if len(muestra) <= 10 else None
         
-        for i, url in enumerate(urls_a_procesar, 1):
+        for i, url in enumerate(itertools.chain(muestra, urls_a_procesar), 1):
+            posicion = f"{i}/{total_urls}" if total_urls else f"{i}"
             safe_print(f"\n{'='*60}")
-            safe_print(f"[AUDIO] Procesando {i}/{total_urls}: {url}")
+            safe_print(f"[AUDIO] Procesando {posicion}: {url}")
             safe_print(f"{'='*60}")
             
             try:
                 url_id = f"S{i:02d}"
-                resultado = descargar_audio_mp3(url, args.output_dir, url_id)
+                diario.marcar(url, 'queued')
+                resultado = descargar_audio_mp3(url, url_id=url_id, informe=informe, contexto=contexto,
+                                                reintentos=reintentos)
                 
                 if resultado:
                     exitosos += 1
-                    safe_print(f"[SUCCESS] {i}/{total_urls} - Exito: {url}")
+                    safe_print(f"[SUCCESS] {posicion} - Exito: {url}")
                 else:
                     fallidos += 1
-                    safe_print(f"[FAIL] {i}/{total_urls} - Fallo: {url}")
+                    safe_print(f"[FAIL] {posicion} - Fallo: {url}")
                     
             except KeyboardInterrupt:
                 safe_print(f"\n\n[PAUSE] Procesamiento interrumpido por el usuario.")
                 safe_print(f"[STATS] Resumen hasta el momento:")
                 safe_print(f"   [SUCCESS] Exitosos: {exitosos}")
                 safe_print(f"   [FAIL] Fallidos: {fallidos}")
-                safe_print(f"   [PAUSE] Restantes: {total_urls - i}")
+                if total_urls:
+                    safe_print(f"   [PAUSE] Restantes: {total_urls - i}")
+                safe_print(f"[INFO] Usa --resume para continuar el lote donde se quedo.")
+                contexto.cerrar()
+                diario.cerrar()
+                guardar_informe()
                 return 1
             except Exception as e:
                 fallidos += 1
-                safe_print(f"[ERROR] {i}/{total_urls} - Error inesperado con {url}: {e}")
+                safe_print(f"[ERROR] {posicion} - Error inesperado con {url}: {e}")
+        contexto.cerrar()
+    
+    diario.cerrar()
+    total_urls = exitosos + fallidos
     
     # Resumen final
     safe_print(f"\n\n{'='*60}")
@@ -543,11 +4820,49 @@ Ejemplos:
     safe_print(f"[NOTE] URLs procesadas: {total_urls}")
     safe_print(f"[SUCCESS] Exitosos: {exitosos}")
     safe_print(f"[FAIL] Fallidos: {fallidos}")
+    if any(omitidas.values()):
+        safe_print(f"[INFO] Omitidas: {omitidas['existentes']} ya descargadas, "
+                   f"{omitidas['completadas']} completadas segun el diario, "
+                   f"{omitidas['duplicadas']} duplicadas en el CSV")
+    if reintentos.resumen():
+        safe_print(f"[STATS] Reintentos: {reintentos.resumen()}")
+    if politica.copias or politica.transcodificaciones:
+        resumen = []
+        if politica.copias:
+            resumen.append(f"{politica.copias} copiados sin recodificar "
+                           f"(media {politica.tiempo_copias / politica.copias:.2f}s)")
+        if politica.transcodificaciones:
+            resumen.append(f"{politica.transcodificaciones} transcodificados "
+                           f"(media {politica.tiempo_transcodificaciones / politica.transcodificaciones:.2f}s)")
+        safe_print(f"[STATS] Conversion: {', '.join(resumen)}")
+        log_info(f"Conversion - Copias: {politica.copias} ({politica.tiempo_copias:.3f}s), "
+                 f"Transcodificaciones: {politica.transcodificaciones} "
+                 f"({politica.tiempo_transcodificaciones:.3f}s)")
+    if limitador and limitador.bytes:
+        safe_print(f"[STATS] Limite de ancho de banda: {limitador.tasa / 1e6:.2f} MB/s, "
+                   f"{limitador.bytes / 1e6:.1f} MB descargados, {limitador.espera_total:.1f}s de espera acumulada")
+    if almacen.esperas or almacen.rechazos:
+        safe_print(f"[STATS] Espacio en disco: {almacen.esperas} descargas esperaron a que se liberara espacio, "
+                   f"{almacen.rechazos} rechazadas por no caber")
+    resumen = guardar_informe()
+    if resumen and resumen['metricas'].get('total_s'):
+        total = resumen['metricas']['total_s']
+        safe_print(f"[STATS] Tiempo por URL: p50 {total['p50']:.2f}s, p95 {total['p95']:.2f}s, "
+                   f"p99 {total['p99']:.2f}s; {resumen['mb_por_segundo']:.2f} MB/s en total")
+    if cache:
+        safe_print(f"[STATS] Cache de metadatos: {cache.aciertos} aciertos, {cache.fallos} fallos")
+        log_info(f"Cache de metadatos - Aciertos: {cache.aciertos}, Fallos: {cache.fallos}")
+        cache.cerrar()
     safe_print(f"[INFO] Log detallado: {log_file}")
     
     # Log del resumen final
     log_info(f"Resumen final - URLs: {total_urls}, Exitosos: {exitosos}, Fallidos: {fallidos}")
     
+    if interrumpido:
+        safe_print(f"\n[PAUSE] Procesamiento interrumpido por el usuario.")
+        safe_print(f"[INFO] Usa --resume para continuar el lote donde se quedo.")
+        log_warning("Sesion interrumpida por el usuario")
+        return 1
     if fallidos == 0:
         safe_print(f"\n[CELEBRATE] Todos los archivos se descargaron exitosamente!")
         log_info("Sesion completada exitosamente - todos los archivos descargados")
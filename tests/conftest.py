@@ -0,0 +1,40 @@
+"""
+Configuracion comun de las pruebas (sin red: ver benchmarks/fake_media.py).
+
+Uso:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# descargar_audio.py y la infraestructura de los benchmarks (servidor y extractor falsos)
+sys.path[:0] = [RAIZ, os.path.join(RAIZ, 'benchmarks')]
+
+import descargar_audio
+
+
+@pytest.fixture
+def escribir_csv(tmp_path):
+    """Devuelve una funcion que escribe un CSV de URLs en tmp_path y devuelve su ruta"""
+    def escribir(urls, encabezado='url', nombre='urls.csv'):
+        ruta = tmp_path / nombre
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(f"{encabezado}\n")
+            for url in urls:
+                archivo.write(f"{url}\n")
+        return ruta
+    return escribir
+
+
+@pytest.fixture
+def ejecutar_main(monkeypatch, tmp_path):
+    """Devuelve una funcion que ejecuta main() con esos argumentos, con tmp_path como directorio actual"""
+    def ejecutar(*argumentos):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('LOGS_DIR', str(tmp_path / 'logs'))
+        monkeypatch.setattr(sys, 'argv', ['descargar_audio.py', *[str(a) for a in argumentos]])
+        return descargar_audio.main()
+    return ejecutar
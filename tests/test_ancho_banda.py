@@ -0,0 +1,47 @@
+"""Limite global de ancho de banda (--limit-rate) y prioridades del CSV"""
+import threading
+import time
+
+import descargar_audio
+from descargar_audio import LimitadorAncho
+
+
+def test_limitador_respeta_la_tasa_entre_varias_descargas():
+    """Varias descargas a la vez no superan entre todas la tasa (mas la rafaga inicial)"""
+    limitador = LimitadorAncho(400 * 1024)
+    bloque, bloques = 16 * 1024, 20
+    
+    def descargar(descarga):
+        for _ in range(bloques):
+            limitador.consumir(descarga, bloque)
+        limitador.terminar(descarga)
+    
+    hilos = [threading.Thread(target=descargar, args=(f"D{i}",)) for i in range(3)]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(timeout=10)
+    duracion = time.monotonic() - inicio
+    
+    total = 3 * bloques * bloque
+    minimo = (total - limitador.capacidad - bloque) / limitador.tasa
+    assert limitador.bytes == total
+    assert minimo <= duracion < minimo + 1.5
+
+
+def test_prioridades_en_una_sola_lectura(escribir_csv):
+    """Las filas prioritarias se adelantan sin una segunda pasada por el CSV y con memoria acotada"""
+    prioridad = {29: 3, 15: 1}
+    csv_urls = escribir_csv([f"https://www.youtube.com/watch?v=prio{i:07d},{prioridad.get(i, '')}"
+                             for i in range(30)], encabezado='url,priority')
+    prioridades = {}
+    urls = list(descargar_audio.iterar_urls_csv(str(csv_urls), prioridades))
+    esperado = [29, 15] + [i for i in range(30) if i not in prioridad]
+    assert urls == [f"https://www.youtube.com/watch?v=prio{i:07d}" for i in esperado]
+    assert prioridades == {'prio0000029': 3, 'prio0000015': 1}
+    
+    # Con una ventana de 2 filas solo se adelanta a las 2 anteriores
+    filas = [(i, [], prioridad.get(i, 0), None) for i in range(30)]
+    orden = [fila[0] for fila in descargar_audio._ordenar_por_prioridad(iter(filas), ventana=2)]
+    assert orden.index(29) == 27 and orden.index(15) == 13
@@ -0,0 +1,56 @@
+"""Cola distribuida (--queue): SQLite y protocolo de Redis"""
+import time
+
+import pytest
+
+from fake_media import ServidorRESP
+
+import descargar_audio
+from descargar_audio import ColaSQLite, ErrorRESP, abrir_cola
+
+URLS = [f"https://www.youtube.com/watch?v=cola0000{i:03d}" for i in range(3)]
+
+
+@pytest.fixture(params=['sqlite', 'resp'])
+def cola(request, tmp_path):
+    if request.param == 'sqlite':
+        cola = ColaSQLite(str(tmp_path / 'cola.db'))
+        yield cola
+        cola.cerrar()
+    else:
+        with ServidorRESP() as servidor:
+            cola = abrir_cola(servidor.url)
+            yield cola
+            cola.cerrar()
+
+
+def test_arriendo_caducado_vuelve_a_arrendarse(cola):
+    """Si un trabajador cae sin renovar, otro recoge su URL y el primero ya no puede renovarla"""
+    assert cola.encolar(URLS + URLS[:1]) == 3
+    arrendadas = cola.arrendar('caido', 1, 0.05)
+    assert [url for _, url in arrendadas] == URLS[:1]
+    assert [url for _, url in cola.arrendar('vivo', 1, 60)] == URLS[1:2]
+    time.sleep(0.1)
+    assert cola.arrendar('otro', 3, 60) == arrendadas + [(descargar_audio.clave_video(URLS[2]), URLS[2])]
+    assert cola.renovar('caido', [arrendadas[0][0]], 60) == [arrendadas[0][0]]
+
+
+def test_tope_de_arriendos_marca_la_url_como_fallida(cola):
+    """Una URL cuyos arriendos caducan una y otra vez termina como fallida en lugar de repetirse sin fin"""
+    cola.encolar(URLS[:1])
+    for intento in range(descargar_audio.MAX_ARRIENDOS):
+        assert len(cola.arrendar(f"trabajador{intento}", 1, 0.01)) == 1
+        time.sleep(0.05)
+    assert cola.arrendar('ultimo', 1, 60) == []
+    assert cola.pendientes() == 0
+    assert cola.estado()['fallidos'] == 1
+
+
+def test_error_resp_no_desincroniza_el_pipeline():
+    """Una respuesta '-ERR' se lanza como ErrorRESP tras leer las demas; la conexion sigue siendo valida"""
+    with ServidorRESP() as servidor:
+        cliente = abrir_cola(servidor.url).cliente
+        with pytest.raises(ErrorRESP, match='NOEXISTE'):
+            cliente.pipeline([('SET', 'a', '1'), ('NOEXISTE',), ('SET', 'b', '2')])
+        assert cliente.pipeline([('GET', 'a'), ('GET', 'b')]) == ['1', '2']
+        cliente.cerrar()
@@ -0,0 +1,17 @@
+"""Concurrencia del lote (--max-concurrency)"""
+import descargar_audio
+
+
+def test_modo_secuencial_procesa_todo_el_csv(monkeypatch, escribir_csv, ejecutar_main, capsys):
+    """--max-concurrency 1 no se queda en la muestra inicial de 11 URLs"""
+    urls = [f"https://www.youtube.com/watch?v=seq{i:08d}" for i in range(30)]
+    procesadas = []
+    
+    def descargar(url, *args, **kwargs):
+        procesadas.append(url)
+        return f"{url}.mp3"
+    
+    monkeypatch.setattr(descargar_audio, 'descargar_audio_mp3', descargar)
+    assert ejecutar_main(escribir_csv(urls), '--max-concurrency', '1', '--no-cache') == 0
+    assert procesadas == urls
+    assert "URLs procesadas: 30" in capsys.readouterr().out
@@ -0,0 +1,74 @@
+"""Etapa de conversion y politica de salida (--codec / --no-transcode)"""
+import os
+import shutil
+
+import pytest
+
+from fake_media import ServidorMedios, extractor_falso
+
+import descargar_audio
+from descargar_audio import ContextoDescarga, DiarioLote, TrabajoDescarga, convertir_audio
+
+
+class IndiceRoto:
+    def registrar(self, *args):
+        raise OSError('No queda espacio en el dispositivo')
+
+
+class DiarioRoto:
+    def __init__(self):
+        self.estados = {}
+    
+    def marcar(self, url, estado, **extra):
+        if estado == 'done':
+            raise OSError('No queda espacio en el dispositivo')
+        self.estados[url] = estado
+
+
+@pytest.fixture
+def trabajo_descargado(monkeypatch, tmp_path):
+    """Trabajo con el audio original ya descargado; la copia del flujo no necesita FFmpeg"""
+    monkeypatch.setattr(descargar_audio, 'copiar_flujo_audio',
+                        lambda origen, destino, *args: shutil.copyfile(origen, destino))
+    trabajo = TrabajoDescarga("https://www.youtube.com/watch?v=conversion1", 'T01')
+    trabajo.titulo = 'Cancion'
+    trabajo.ruta_origen = str(tmp_path / 'conversion1.m4a')
+    trabajo.ruta_destino = str(tmp_path / 'salida' / 'Cancion.m4a')
+    trabajo.copiar = True
+    with open(trabajo.ruta_origen, 'wb') as f:
+        f.write(b'audio')
+    return trabajo
+
+
+def test_fallo_del_indice_no_anula_la_conversion(tmp_path, trabajo_descargado):
+    """El archivo ya publicado cuenta como exito, tambien en el diario, aunque no se pueda indexar"""
+    diario = DiarioLote(str(tmp_path / 'diario.jsonl'))
+    contexto = ContextoDescarga(str(tmp_path / 'salida'), indice=IndiceRoto(), diario=diario)
+    assert convertir_audio(trabajo_descargado, contexto)
+    diario.cerrar()
+    assert trabajo_descargado.exito and os.path.isfile(trabajo_descargado.archivo)
+    assert diario.estados[trabajo_descargado.url] == 'done'
+
+
+def test_fallo_del_diario_no_cuenta_como_exito(tmp_path, trabajo_descargado):
+    """Si el diario no registra el exito, el trabajo tampoco es un exito (--resume lo repetira)"""
+    diario = DiarioRoto()
+    contexto = ContextoDescarga(str(tmp_path / 'salida'), diario=diario)
+    assert not convertir_audio(trabajo_descargado, contexto)
+    assert not trabajo_descargado.exito
+    assert diario.estados[trabajo_descargado.url] == 'failed'
+
+
+def test_sin_transcodificar_no_deja_el_original_en_staging(monkeypatch, tmp_path):
+    """Si el audio no se puede guardar sin recodificar, el original descargado no queda en staging"""
+    salida = tmp_path / 'salida'
+    politica = descargar_audio.PoliticaSalida('best', transcodificar=False)
+    # Codec no reconocido tras la descarga: --no-transcode no puede guardarlo
+    monkeypatch.setattr(politica, 'codec_de_audio', lambda info: None)
+    with ServidorMedios(tamano=16 * 1024) as servidor, extractor_falso(servidor):
+        archivo = descargar_audio.descargar_audio_mp3(
+            "https://www.youtube.com/watch?v=notranscode", str(salida), show_animation=False, politica=politica,
+        )
+    assert archivo is None
+    staging = salida / '.staging'
+    assert not staging.exists() or not any(staging.iterdir())
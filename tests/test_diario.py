@@ -0,0 +1,45 @@
+"""Diario del lote (--journal / --resume)"""
+import json
+
+import descargar_audio
+from descargar_audio import DiarioLote
+
+
+def test_diario_reanudado_descarta_la_linea_a_medias(tmp_path):
+    """Gana el ultimo estado de cada URL; una linea cortada por una caida no estropea los registros nuevos"""
+    ruta = tmp_path / 'diario.jsonl'
+    diario = DiarioLote(str(ruta))
+    diario.marcar('a', 'downloading')
+    diario.marcar('a', 'done', archivo='a.mp3')
+    diario.marcar('b', 'failed', error='HTTP Error 404')
+    diario.cerrar()
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write('{"url": "c", "esta')
+    
+    diario = DiarioLote(str(ruta), reanudar=True)
+    assert diario.estados == {'a': 'done', 'b': 'failed'}
+    diario.marcar('c', 'done')
+    diario.cerrar()
+    diario = DiarioLote(str(ruta), reanudar=True)
+    diario.cerrar()
+    assert diario.estados == {'a': 'done', 'b': 'failed', 'c': 'done'}
+
+
+def test_resume_omite_las_completadas_y_repite_las_demas(monkeypatch, tmp_path, escribir_csv, ejecutar_main):
+    """--resume no vuelve a descargar lo que el diario da por terminado, pero si lo fallido o interrumpido"""
+    urls = [f"https://www.youtube.com/watch?v=diario{i:05d}" for i in range(4)]
+    salida = tmp_path / 'salida'
+    salida.mkdir()
+    with open(salida / DiarioLote.NOMBRE_ARCHIVO, 'w', encoding='utf-8') as f:
+        for url, estado in [(urls[0], 'downloading'), (urls[0], 'done'), (urls[1], 'failed'),
+                            (urls[2], 'downloading')]:
+            f.write(json.dumps({'url': url, 'estado': estado}) + '\n')
+    procesadas = []
+    
+    async def procesar(urls, *args, **kwargs):
+        procesadas.extend(urls)
+        return len(procesadas), 0, []
+    
+    monkeypatch.setattr(descargar_audio, 'procesar_urls_async', procesar)
+    assert ejecutar_main(escribir_csv(urls), '-o', salida, '--resume') == 0
+    assert procesadas == urls[1:]
@@ -0,0 +1,31 @@
+"""Indice de descargas completadas (--skip-existing)"""
+from descargar_audio import IndiceDescargas
+
+
+def test_indice_se_conserva_entre_ejecuciones(tmp_path):
+    """Una ejecucion nueva lee el indice del disco; las lineas corruptas se ignoran"""
+    archivo = tmp_path / 'Cancion.mp3'
+    archivo.write_bytes(b'a' * 1000)
+    IndiceDescargas(str(tmp_path)).registrar('indice00001', str(archivo), 180)
+    with open(tmp_path / IndiceDescargas.NOMBRE_ARCHIVO, 'a', encoding='utf-8') as f:
+        f.write('{"video_id": "cortada\n')
+    
+    indice = IndiceDescargas(str(tmp_path))
+    assert indice.verificar('indice00001') == str(archivo)
+    assert indice.verificar('indice00002') is None
+
+
+def test_indice_detecta_archivos_cambiados(tmp_path):
+    """Un archivo borrado, truncado o con otro contenido se vuelve a descargar"""
+    archivo = tmp_path / 'Cancion.mp3'
+    archivo.write_bytes(b'a' * 1000)
+    indice = IndiceDescargas(str(tmp_path))
+    indice.registrar('indice00001', str(archivo))
+    
+    # Mismo tamano y otro contenido: lo detecta el checksum
+    archivo.write_bytes(b'b' * 1000)
+    assert indice.verificar('indice00001', checksum_completo=True) is None
+    archivo.write_bytes(b'a' * 10)
+    assert indice.verificar('indice00001') is None
+    archivo.unlink()
+    assert indice.verificar('indice00001') is None
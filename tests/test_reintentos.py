@@ -0,0 +1,81 @@
+"""Reintentos de errores transitorios y circuit breaker por host"""
+import asyncio
+import time
+
+from fake_media import ServidorMedios, extractor_falso
+
+import descargar_audio
+from descargar_audio import DisyuntorHosts, PlanificadorDescargas, PoliticaReintentos, TrabajoDescarga
+
+HOST = 'www.youtube.com'
+
+
+def despachar(disyuntor, *resultados):
+    """Despacha una descarga por resultado, cada una con su permiso"""
+    for resultado in resultados:
+        espera, permiso = disyuntor.permiso(HOST)
+        assert espera == 0
+        disyuntor.registrar(HOST, permiso, resultado)
+
+
+def test_fallos_permanentes_no_abren_ni_cierran_el_circuito():
+    """Un 404 no reinicia la cuenta de 429 seguidos ni cierra un circuito semiabierto"""
+    disyuntor = DisyuntorHosts(umbral=3, enfriamiento=0.05)
+    despachar(disyuntor, 'limitado', 'limitado', 'fallo', 'limitado')
+    assert disyuntor.espera(HOST) > 0
+    time.sleep(0.1)
+    despachar(disyuntor, 'fallo')
+    # Sigue semiabierto: la siguiente descarga de prueba recibe otro 429 y la pausa se duplica
+    despachar(disyuntor, 'limitado')
+    assert 0.05 < disyuntor.espera(HOST) <= 0.1
+
+
+def test_resultados_anteriores_a_la_apertura_se_ignoran():
+    """Lo que termina despues de abrirse el circuito pero se despacho antes no lo cierra"""
+    disyuntor = DisyuntorHosts(umbral=3, enfriamiento=60)
+    _, anterior = disyuntor.permiso(HOST)
+    despachar(disyuntor, 'limitado', 'limitado', 'limitado')
+    disyuntor.registrar(HOST, anterior, 'exito')
+    assert disyuntor.permiso(HOST)[0] > 0
+
+
+def test_semiabierto_deja_pasar_una_sola_descarga_de_prueba():
+    disyuntor = DisyuntorHosts(umbral=1, enfriamiento=0.05)
+    despachar(disyuntor, 'limitado')
+    time.sleep(0.1)
+    espera, sonda = disyuntor.permiso(HOST)
+    assert espera == 0
+    assert all(disyuntor.permiso(HOST)[0] > 0 for _ in range(3))
+    disyuntor.registrar(HOST, sonda, 'exito')
+    despachar(disyuntor, 'exito', 'exito')
+
+
+def test_host_en_pausa_no_retiene_trabajadores():
+    """Con el circuito de un host abierto, los elementos de otros hosts siguen despachandose"""
+    disyuntor = DisyuntorHosts(umbral=1, enfriamiento=0.3)
+    despachar(disyuntor, 'limitado')
+    urls = ["https://www.youtube.com/watch?v=enpausa0001", "https://medios.example.com/audio.mp3"]
+    
+    async def descargar(url, numero, trabajo=None):
+        return TrabajoDescarga(url, f"P{numero:02d}")
+    
+    async def ejecutar():
+        planificador = PlanificadorDescargas(1, reintentos=PoliticaReintentos(0, disyuntor=disyuntor))
+        return [trabajo.url async for trabajo in planificador.ejecutar(urls, descargar)]
+    
+    assert asyncio.run(asyncio.wait_for(ejecutar(), timeout=10)) == urls[::-1]
+    assert disyuntor.espera(HOST) == 0
+
+
+def test_duplicado_con_429_no_bloquea_el_lote(tmp_path):
+    """Una URL repetida espera al lider sin quitarle el hueco que necesita para reintentar tras un 429"""
+    url = "https://www.youtube.com/watch?v=dup00000001"
+    reintentos = PoliticaReintentos(3, base=0.1, disyuntor=DisyuntorHosts(enfriamiento=0.1))
+    # Sin conexiones admitidas: todas las descargas reciben 429
+    with ServidorMedios(max_simultaneas=0) as servidor, extractor_falso(servidor):
+        exitosos, fallidos, _ = asyncio.run(asyncio.wait_for(descargar_audio.procesar_urls_async(
+            [url, url], str(tmp_path), max_concurrent=2, min_concurrent=1, reintentos=reintentos,
+            politica=descargar_audio.PoliticaSalida('best', transcodificar=False),
+        ), timeout=30))
+    assert (exitosos, fallidos) == (0, 2)
+    assert servidor.rechazos_429 == 4
@@ -0,0 +1,24 @@
+"""Descarga de secciones (columnas start/end del CSV, --start/--end)"""
+import pytest
+
+import descargar_audio
+from descargar_audio import seccion_de_url
+
+
+def test_enlace_compartido_con_t_no_es_una_seccion(escribir_csv):
+    """'#t=' de los enlaces compartidos no pide seccion; solo las columnas start/end o --start/--end"""
+    csv_urls = escribir_csv(["https://www.youtube.com/watch?v=tcompartido#t=90,",
+                             "https://www.youtube.com/watch?v=tcolumnas00,1:30,2:00"], encabezado='url,start,end')
+    urls = list(descargar_audio.iterar_urls_csv(str(csv_urls), seccion=(10.0, None)))
+    assert [seccion_de_url(url) for url in urls] == [(10.0, None), (90.0, 120.0)]
+    assert seccion_de_url(descargar_audio.normalizar_url("https://www.youtube.com/watch?v=tcompartido#t=90")) is None
+
+
+def test_servidor_aplica_la_seccion_del_lote(escribir_csv, tmp_path):
+    """--start/--end del cliente llegan al servidor en el POST /jobs"""
+    csv_urls = escribir_csv(["https://www.youtube.com/watch?v=servidor001"])
+    servidor = descargar_audio.ServidorDescargas(str(tmp_path))
+    lote = servidor.enviar(archivo_csv=str(csv_urls), seccion=[30, 45.5])
+    assert [seccion_de_url(url) for url in lote.urls] == [(30.0, 45.5)]
+    with pytest.raises(ValueError):
+        servidor.enviar(urls=["https://www.youtube.com/watch?v=servidor001"], seccion=[30, 10])